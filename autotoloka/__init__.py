@@ -1,7 +1,36 @@
 from __future__ import absolute_import
 
-from autotoloka.handler import TolokaProjectHandler
-from autotoloka.create_task import TaskCreator, TaskSuiteCreator
-from autotoloka.create_pool import PoolCreator
-from autotoloka.pipeline import pipeline_new_pool_with_tasks, pipeline_new_pool_with_tasks_from_yadisk_proxy, pipeline_for_new_project
-from autotoloka.json_data import json_data
+import importlib
+import logging
+
+# The application decides where the messages go, see autotoloka.log.configure_logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# Submodules are imported on first access, so that e.g. a worker which only reviews assignments
+# does not pay for Ya.Disk, NumPy and Pillow imports
+_LAZY_ATTRIBUTES = {
+    'TolokaProjectHandler': 'autotoloka.handler',
+    'AsyncTolokaProjectHandler': 'autotoloka.async_handler',
+    'TaskCreator': 'autotoloka.create_task',
+    'TaskSuiteCreator': 'autotoloka.create_task',
+    'PoolCreator': 'autotoloka.create_pool',
+    'pipeline_new_pool_with_tasks': 'autotoloka.pipeline',
+    'pipeline_new_pool_with_tasks_from_yadisk_proxy': 'autotoloka.pipeline',
+    'pipeline_for_new_project': 'autotoloka.pipeline',
+    'json_data': 'autotoloka.json_data',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
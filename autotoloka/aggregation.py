@@ -0,0 +1,227 @@
+import json
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+MAJORITY_VOTE = 'majority_vote'
+WEIGHTED_MAJORITY = 'weighted_majority'
+DAWID_SKENE = 'dawid_skene'
+
+Answers = namedtuple('Answers', ['task_codes', 'worker_codes', 'label_codes', 'tasks', 'workers', 'labels'])
+Answers.__doc__ = """
+Answers encoded as integer arrays: the i-th answer is labels[label_codes[i]] given by workers[worker_codes[i]]
+to tasks[task_codes[i]]
+"""
+Aggregation = namedtuple('Aggregation', ['tasks', 'labels', 'confidence', 'workers', 'skills', 'posteriors'])
+Aggregation.__doc__ = """
+Aggregated answers: the label of tasks[i] is labels[i] with the probability confidence[i],
+the estimated accuracy of workers[j] is skills[j]; posteriors is the tasks x labels probability matrix
+"""
+
+
+def _hashable(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+
+def encode(tasks, workers, labels):
+    """
+    Encodes answers into integer arrays. Labels are sorted, so the codes do not depend on the order of the answers
+
+    :param tasks: a sequence of task IDs, one per answer
+    :param workers: a sequence of worker IDs, one per answer
+    :param labels: a sequence of answers' labels
+    :return: Answers
+    """
+    import pandas as pd
+
+    if len(labels) == 0:
+        raise ValueError('There are no answers to encode')
+    task_codes, task_values = pd.factorize(np.asarray(tasks, dtype=object))
+    worker_codes, worker_values = pd.factorize(np.asarray(workers, dtype=object))
+    label_codes, label_values = pd.factorize(np.asarray(labels, dtype=object), sort=True)
+    if (task_codes < 0).any() or (worker_codes < 0).any() or (label_codes < 0).any():
+        raise ValueError('Answers must not contain missing task IDs, worker IDs or labels')
+    return Answers(task_codes, worker_codes, label_codes, np.asarray(task_values, dtype=object),
+                   np.asarray(worker_values, dtype=object), np.asarray(label_values, dtype=object))
+
+
+def answers_from_assignments(assignments, field):
+    """
+    Encodes the answers of raw assignments, e.g. of TolokaProjectHandler.iter_assignments.
+    Tasks of overlapping assignments share IDs; missing answers are skipped, json values are compared as strings
+
+    :param assignments: an iterable of json-like assignments
+    :param field: name of the output value to aggregate
+    :return: Answers
+    """
+    tasks, workers, labels = [], [], []
+    for assignment in assignments:
+        for task, solution in zip(assignment.get('tasks') or [], assignment.get('solutions') or []):
+            label = (solution.get('output_values') or {}).get(field)
+            if label is not None:
+                tasks.append(task['id'])
+                workers.append(assignment['user_id'])
+                labels.append(_hashable(label))
+    return encode(tasks, workers, labels)
+
+
+def answers_from_frame(frame, field, task_column='task_id', worker_column='user_id'):
+    """
+    Encodes the answers of a table, e.g. of TolokaProjectHandler.export_answers. Rows without an answer are skipped
+
+    :param frame: a pandas DataFrame with a row per answer
+    :param field: the column of the answers, an output value name is looked up as OUTPUT:<name> too
+    :param task_column: the column of task IDs
+    :param worker_column: the column of worker IDs
+    :return: Answers
+    """
+    if field not in frame.columns and f'OUTPUT:{field}' in frame.columns:
+        field = f'OUTPUT:{field}'
+    frame = frame[[task_column, worker_column, field]].dropna()
+    return encode(frame[task_column].to_numpy(), frame[worker_column].to_numpy(), frame[field].to_numpy())
+
+
+def vote_matrix(answers, weights=None):
+    """
+    Returns the tasks x labels matrix of the (weighted) number of votes
+    """
+    n_tasks, n_labels = len(answers.tasks), len(answers.labels)
+    cells = answers.task_codes * n_labels + answers.label_codes
+    votes = np.bincount(cells, weights=weights, minlength=n_tasks * n_labels)
+    return votes.reshape(n_tasks, n_labels).astype(float)
+
+
+def _normalize_rows(matrix):
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.full_like(matrix, 1.0 / matrix.shape[1]), where=totals > 0)
+
+
+def _agreement(answers, labels):
+    """
+    Returns the share of every worker's answers which agree with the labels of the tasks
+    """
+    agreed = (answers.label_codes == labels[answers.task_codes]).astype(float)
+    n_workers = len(answers.workers)
+    total = np.bincount(answers.worker_codes, minlength=n_workers)
+    return np.bincount(answers.worker_codes, weights=agreed, minlength=n_workers) / np.maximum(total, 1)
+
+
+def _result(answers, posteriors, skills):
+    codes = posteriors.argmax(axis=1)
+    return Aggregation(answers.tasks, answers.labels[codes], posteriors[np.arange(len(codes)), codes],
+                       answers.workers, skills, posteriors)
+
+
+def majority_vote(answers):
+    """
+    Labels every task with its most frequent answer, ties are broken in favour of the smallest label.
+    The confidence is the share of the votes, the skill of a worker - the share of answers agreeing with the majority
+
+    :param answers: Answers
+    :return: Aggregation
+    """
+    posteriors = _normalize_rows(vote_matrix(answers))
+    return _result(answers, posteriors, _agreement(answers, posteriors.argmax(axis=1)))
+
+
+def weighted_majority(answers, skills=None, n_iter=5, smoothing=1.0):
+    """
+    Labels every task by the votes weighted with the log-odds of the workers' skills, which is optimal when a worker
+    errs uniformly at random. Unless given, the skills are estimated as the agreement with the current labels,
+    starting from the majority vote
+
+    :param answers: Answers
+    :param skills: an array of the workers' accuracies in the order of answers.workers, if None - estimated
+    :param n_iter: the number of re-estimations of the skills
+    :param smoothing: additive smoothing of the estimated skills, in answers
+    :return: Aggregation
+    """
+    n_labels = max(len(answers.labels), 2)
+    n_answers = np.bincount(answers.worker_codes, minlength=len(answers.workers))
+    fixed = skills is not None
+    labels = majority_vote(answers).posteriors.argmax(axis=1)
+    for _ in range(1 if fixed else max(n_iter, 1)):
+        if not fixed:
+            agreed = _agreement(answers, labels) * n_answers
+            skills = (agreed + smoothing / n_labels) / (n_answers + smoothing)
+        clipped = np.clip(np.asarray(skills, dtype=float), 1e-6, 1 - 1e-6)
+        weights = np.log((n_labels - 1) * clipped / (1 - clipped))
+        scores = vote_matrix(answers, weights[answers.worker_codes])
+        labels = scores.argmax(axis=1)
+    posteriors = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return _result(answers, _normalize_rows(posteriors), np.asarray(skills, dtype=float))
+
+
+def dawid_skene(answers, n_iter=100, tol=1e-6, smoothing=0.01):
+    """
+    Estimates the true labels and a confusion matrix of every worker with the EM algorithm of Dawid and Skene,
+    starting from the majority vote
+
+    :param answers: Answers
+    :param n_iter: the maximum number of EM iterations, at least one
+    :param tol: the iterations stop when the log-likelihood per answer grows by less than tol
+    :param smoothing: additive smoothing of the confusion matrices
+    :return: Aggregation with the skills computed as the workers' expected accuracies
+    """
+    n_tasks, n_workers, n_labels = len(answers.tasks), len(answers.workers), len(answers.labels)
+    tasks, labels = answers.task_codes, answers.label_codes
+    cells = answers.worker_codes * n_labels + labels
+    # Flat position of confusion[worker, 0, label], true label k is k * n_labels further
+    confusion_cells = answers.worker_codes * n_labels * n_labels + labels
+    posteriors = _normalize_rows(vote_matrix(answers))
+    confusion = np.empty((n_workers, n_labels, n_labels))
+    log_posteriors = np.empty((n_labels, n_tasks))
+    likelihood = -np.inf
+    for iteration in range(max(n_iter, 1)):
+        # M-step: class priors and confusion[worker, true label, given label]
+        priors = posteriors.mean(axis=0)
+        columns = np.ascontiguousarray(posteriors.T)
+        for true_label in range(n_labels):
+            counts = np.bincount(cells, weights=columns[true_label].take(tasks), minlength=n_workers * n_labels)
+            confusion[:, true_label, :] = counts.reshape(n_workers, n_labels) + smoothing
+        confusion /= confusion.sum(axis=2, keepdims=True)
+        # E-step: log-posteriors of the tasks summed over their answers
+        log_confusion = np.log(confusion).ravel()
+        for true_label in range(n_labels):
+            log_posteriors[true_label] = np.bincount(tasks, weights=log_confusion.take(confusion_cells
+                                                                                       + true_label * n_labels),
+                                                     minlength=n_tasks)
+        log_posteriors += np.log(np.maximum(priors, 1e-12))[:, None]
+        top = log_posteriors.max(axis=0)
+        updated = np.exp(log_posteriors - top)
+        totals = updated.sum(axis=0)
+        posteriors = (updated / totals).T
+        previous, likelihood = likelihood, (top + np.log(totals)).sum() / max(len(tasks), 1)
+        if likelihood - previous < tol:
+            break
+    logger.debug('Dawid-Skene stopped after %s iterations, log-likelihood per answer %.6f', iteration + 1,
+                 likelihood)
+    skills = np.einsum('k,wkk->w', posteriors.mean(axis=0), confusion)
+    return _result(answers, posteriors, skills)
+
+
+METHODS = {MAJORITY_VOTE: majority_vote, WEIGHTED_MAJORITY: weighted_majority, DAWID_SKENE: dawid_skene}
+
+
+def aggregate(answers, method=DAWID_SKENE, **kwargs):
+    """
+    Aggregates the answers with one of the methods: 'majority_vote', 'weighted_majority' or 'dawid_skene'
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown aggregation method {method!r}, expected one of {", ".join(METHODS)}')
+    return METHODS[method](answers, **kwargs)
+
+
+def to_frames(result):
+    """
+    Returns a pair of pandas DataFrames: the tasks' labels with confidence and the workers' skills
+    """
+    import pandas as pd
+
+    tasks = pd.DataFrame({'task_id': result.tasks, 'label': result.labels, 'confidence': result.confidence})
+    workers = pd.DataFrame({'user_id': result.workers, 'skill': result.skills})
+    return tasks, workers
@@ -0,0 +1,307 @@
+import asyncio
+import functools
+import os
+import tempfile
+
+import aiohttp
+
+from autotoloka.create_pool import PoolCreator
+from autotoloka.create_task import TaskSuiteCreator
+from autotoloka.ratelimit import shared_limiter
+from autotoloka.review import (ReviewResult, ASSIGNMENT_STATUSES, DEFAULT_COMMENT,
+                               OK, ALREADY_PROCESSED, FAILED)
+from autotoloka.transport import RETRY_STATUSES, IDEMPOTENT_METHODS, backoff_delay, retry_after_delay
+
+
+class AsyncTolokaProjectHandler:
+    """
+    Creates a class to handle Toloka operations from asyncio code.
+    All the requests share one connection pool, and the number of requests in flight is bounded by a semaphore
+    and by the rate limiter shared with the other handlers of the token
+    """
+    def __init__(self, oauth_token, project_id=None, is_sandbox=True, api_url=None, max_concurrency=100,
+                 timeout=60, max_retries=5, backoff_factor=0.5, max_backoff=60, rate_limiter=None):
+        """
+        Instantiates an AsyncTolokaProjectHandler class
+
+        :param oauth_token: Yandex.Toloka token for connecting with the API
+        :param project_id: ID of the project the handler is needed for
+        :param is_sandbox: if set to True, then all the operations will be performed in Sandbox Toloka
+        :param api_url: root URL of the API, overrides is_sandbox (e.g. a local stand-in server)
+        :param max_concurrency: the maximum number of requests in flight, also the size of the connection pool
+        :param timeout: total timeout of a request in seconds
+        :param max_retries: how many times a request is repeated on connection errors, 429 and 5xx responses
+        :param backoff_factor: base delay in seconds, the n-th retry waits up to backoff_factor * 2 ** n
+        :param max_backoff: upper bound of a single delay in seconds
+        :param rate_limiter: RateLimiter every attempt goes through, by default the one shared by all the handlers
+                             with the same token, synchronous ones included (see shared_limiter);
+                             False disables the limiting
+        """
+        self.sandbox = is_sandbox
+        self.project_id = project_id
+        if api_url is None:
+            api_url = 'https://sandbox.toloka.yandex.ru/api/v1/' if is_sandbox else 'https://toloka.yandex.ru/api/v1/'
+        self.url = api_url if api_url.endswith('/') else api_url + '/'
+        self.headers = {'Authorization': 'OAuth ' + oauth_token}
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.limiter = shared_limiter(oauth_token) if rate_limiter is None else (rate_limiter or None)
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _ensure_session(self):
+        # The session and the semaphore have to be created inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        """
+        Closes the connection pool
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method, path, handle=None, **kwargs):
+        """
+        Sends a request, retrying connection errors and retryable statuses like TolokaSession does
+
+        :param method: HTTP method
+        :param path: path relative to the API root
+        :param handle: coroutine function receiving the response, by default the parsed JSON body is returned
+                       and error statuses raise aiohttp.ClientResponseError
+        :param kwargs: keyword arguments for aiohttp.ClientSession.request
+        """
+        session = self._ensure_session()
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else {429}
+        retry_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError) if idempotent \
+            else aiohttp.ClientConnectorError
+        attempt = 0
+        while True:
+            delay, status = None, None
+            budget = await self.limiter.acquire_async(method, path) if self.limiter is not None else None
+            try:
+                async with self._semaphore:
+                    async with session.request(method, self.url + path, **kwargs) as response:
+                        status = response.status
+                        if response.status not in retry_statuses or attempt >= self.max_retries:
+                            if handle is not None:
+                                return await handle(response)
+                            response.raise_for_status()
+                            if response.content_length == 0:
+                                return None
+                            return await response.json(content_type=None)
+                        delay = retry_after_delay(response.headers)
+            except retry_errors:
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                # Like in TolokaSession, a request without a response is released as an overload
+                if budget is not None:
+                    self.limiter.release(budget, status, delay)
+            if delay is None:
+                delay = backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+            await asyncio.sleep(min(delay, self.max_backoff))
+            attempt += 1
+
+    async def _iter_items(self, path, params, page_size=1000):
+        query = {k: (','.join(str(item) for item in v) if isinstance(v, (list, tuple, set)) else v)
+                 for k, v in params.items() if v is not None}
+        query.update(sort='id', limit=page_size)
+        while True:
+            page = await self._request('GET', path, params=query)
+            items = page.get('items', [])
+            for item in items:
+                yield item
+            if not page.get('has_more') or not items:
+                return
+            query['id_gt'] = items[-1]['id']
+
+    # Projects
+
+    async def create_project(self, project_params_data):
+        project = await self._request('POST', 'projects', json=project_params_data)
+        if self.project_id is None:
+            self.project_id = project['id']
+        return project
+
+    async def get_project(self, project_id=None):
+        return await self._request('GET', f'projects/{project_id or self.project_id}')
+
+    async def update_project(self, project_params_data, project_id=None):
+        return await self._request('PUT', f'projects/{project_id or self.project_id}', json=project_params_data)
+
+    def iter_projects(self, status=None, page_size=300):
+        return self._iter_items('projects', {'status': status}, page_size=page_size)
+
+    # Pools
+
+    async def create_pool(self, pool_from_json_data=None, **kwargs):
+        """
+        Creates Toloka pool by dictionary-stored configurations or by PoolCreator keyword arguments
+
+        :param pool_from_json_data: a json-like dictionary of pool configurations
+        :param kwargs: keyword arguments for PoolCreator class instance
+        :return: the created pool
+        """
+        if pool_from_json_data:
+            pool_params = dict(pool_from_json_data, project_id=self.project_id)
+            if 'private_name' in kwargs:
+                pool_params['private_name'] = kwargs['private_name']
+        else:
+            pool_params = PoolCreator(self.project_id, **kwargs).pool
+        return await self._request('POST', 'pools', json=pool_params)
+
+    async def get_pool(self, pool_id):
+        return await self._request('GET', f'pools/{pool_id}')
+
+    async def update_pool(self, pool_id, pool_params):
+        return await self._request('PUT', f'pools/{pool_id}', json=pool_params)
+
+    async def open_pool(self, pool_id):
+        return await self._request('POST', f'pools/{pool_id}/open')
+
+    async def close_pool(self, pool_id):
+        return await self._request('POST', f'pools/{pool_id}/close')
+
+    def iter_pools(self, project_id=None, status=None, page_size=300):
+        return self._iter_items('pools', {'project_id': project_id, 'status': status}, page_size=page_size)
+
+    async def archive_object(self, object_type, object_id):
+        """
+        Archives the given object by its ID and type
+
+        :param object_type: 'project', 'pool' or 'task-suite'
+        :param object_id: ID of the object
+        """
+        return await self._request('POST', f'{object_type}s/{object_id}/archive')
+
+    # Task-suites
+
+    async def create_task_suite(self, pool_id, input_values, tasks_on_suite=10):
+        """
+        Creates task-suites of tasks_on_suite tasks each by dictionary-stored input values
+
+        :param pool_id: ID of the pool
+        :param input_values: a list of dictionaries with a certain key-value structure
+        :param tasks_on_suite: the number of tasks on one suite
+        :return: a json-like response of the API
+        """
+        suites = [TaskSuiteCreator(pool_id, input_values[i:i + tasks_on_suite]).task_suite
+                  for i in range(0, len(input_values), tasks_on_suite)]
+        return await self._request('POST', 'task-suites', params={'allow_defaults': 'true'}, json=suites)
+
+    async def change_task_suite_overlap(self, task_suite_id, overlap):
+        return await self._request('PATCH', f'task-suites/{task_suite_id}',
+                                   json={'overlap': overlap, 'infinite_overlap': False})
+
+    def iter_task_suites(self, pool_id, page_size=1000, **filters):
+        return self._iter_items('task-suites', dict(filters, pool_id=pool_id), page_size=page_size)
+
+    # Assignments
+
+    async def get_assignment(self, assignment_id):
+        return await self._request('GET', f'assignments/{assignment_id}')
+
+    def iter_assignments(self, pool_id, status=None, page_size=1000, **filters):
+        return self._iter_items('assignments', dict(filters, pool_id=pool_id, status=status), page_size=page_size)
+
+    async def review_assignment(self, assignment_id, action='accept', public_comment=DEFAULT_COMMENT):
+        """
+        Accepts or rejects the assignment by its ID
+
+        :return: ReviewResult with the status 'ok', 'already_processed' or 'failed'
+        """
+        if action not in ASSIGNMENT_STATUSES:
+            raise ValueError(f'Unknown action {action!r}, expected one of {sorted(ASSIGNMENT_STATUSES)}')
+
+        async def handle(response):
+            if response.status < 400:
+                return ReviewResult(assignment_id, action, OK, response.status, None)
+            error = await response.json(content_type=None)
+            if response.status == 409 and error.get('code') == 'INAPPROPRIATE_STATUS':
+                return ReviewResult(assignment_id, action, ALREADY_PROCESSED, response.status, error)
+            return ReviewResult(assignment_id, action, FAILED, response.status, error)
+
+        patch_params = {'status': ASSIGNMENT_STATUSES[action], 'public_comment': public_comment}
+        try:
+            return await self._request('PATCH', f'assignments/{assignment_id}', handle=handle, json=patch_params)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            return ReviewResult(assignment_id, action, FAILED, None, str(error))
+
+    async def review_assignments(self, items, max_workers=None):
+        """
+        Accepts or rejects many assignments concurrently. A fixed number of workers take the items one by one,
+        so the items are consumed lazily and only the reviews in flight are held besides the results
+
+        :param items: an iterable of (assignment ID, action, public comment) tuples, the comment may be omitted
+        :param max_workers: the number of concurrent reviews, max_concurrency if None
+        :return: a list of ReviewResult in the order of the items
+        """
+        numbered = enumerate(items)
+        results = {}
+
+        async def worker():
+            # The iterator is shared: the event loop runs one worker at a time between the awaits
+            for index, item in numbered:
+                try:
+                    results[index] = await self.review_assignment(item[0], item[1], *item[2:3])
+                except ValueError as error:
+                    results[index] = ReviewResult(item[0], item[1], FAILED, None, str(error))
+
+        await asyncio.gather(*(worker() for _ in range(max_workers or self.max_concurrency)))
+        return [results[index] for index in range(len(results))]
+
+    # Attachments
+
+    async def get_attachment(self, attachment_id):
+        return await self._request('GET', f'attachments/{attachment_id}')
+
+    def iter_attachments(self, pool_id=None, page_size=1000, **filters):
+        return self._iter_items('attachments', dict(filters, pool_id=pool_id), page_size=page_size)
+
+    async def download_attachment(self, attachment_id, path, chunk_size=64 * 1024):
+        """
+        Streams the attachment into a temporary file next to the path and atomically renames it
+
+        :param attachment_id: ID of the attachment
+        :param path: destination path of the file, skipped if it already exists
+        :param chunk_size: size of the chunks the body is written in, in bytes
+        :return: the number of bytes written
+        """
+        if os.path.exists(path):
+            return 0
+
+        async def handle(response):
+            response.raise_for_status()
+            # The file operations run in the default executor, so a slow disk does not stall the other requests
+            loop = asyncio.get_running_loop()
+            fd, tmp_path = await loop.run_in_executor(None, functools.partial(
+                tempfile.mkstemp, dir=os.path.dirname(path) or '.', suffix='.part'))
+            size = 0
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        await loop.run_in_executor(None, file.write, chunk)
+                        size += len(chunk)
+                await loop.run_in_executor(None, os.replace, tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return size
+
+        return await self._request('GET', f'attachments/{attachment_id}/download', handle=handle)
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'expires'])
+
+
+class ResponseCache:
+    """
+    Creates a thread-safe TTL cache of parsed GET responses with LRU eviction.
+    Expired entries with an ETag are kept, so they can be revalidated with a conditional request
+    """
+    def __init__(self, ttl=60, max_entries=1024):
+        """
+        Instantiates a ResponseCache class
+
+        :param ttl: seconds an entry is served without asking the API
+        :param max_entries: the maximum number of entries, the least recently used ones are evicted
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def lookup(self, key):
+        """
+        Returns the entry of the key (fresh or expired) or None, marking it as recently used
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def get(self, key):
+        """
+        Returns the cached body if it has not expired yet, otherwise None
+        """
+        entry = self.lookup(key)
+        fresh = entry is not None and entry.expires > time.monotonic()
+        with self.lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry.body if fresh else None
+
+    def put(self, key, body, etag=None):
+        with self.lock:
+            self.entries[key] = CacheEntry(body, etag, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def refresh(self, key):
+        """
+        Extends the life of an entry confirmed by a 304 Not Modified response
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = entry._replace(expires=time.monotonic() + self.ttl)
+                self.revalidated += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'revalidated': self.revalidated}
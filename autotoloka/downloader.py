@@ -0,0 +1,283 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from autotoloka.ratelimit import DOWNLOAD, worker_count
+
+
+DownloadResult = namedtuple('DownloadResult', ['attachment_id', 'file_name', 'status', 'bytes', 'error',
+                                               'duplicate_of'])
+DownloadResult.__new__.__defaults__ = (None,)
+DownloadReport = namedtuple('DownloadReport', ['results', 'downloaded', 'skipped', 'failed', 'bytes', 'seconds',
+                                               'duplicates'])
+DownloadReport.__new__.__defaults__ = (0,)
+
+DOWNLOADED = 'downloaded'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+DUPLICATE = 'duplicate'
+
+# Sidecar file of a download folder mapping the file names to the IDs of the attachments they were downloaded from
+MANIFEST_NAME = '.attachments.json'
+MANIFEST_SAVE_EVERY = 100
+
+
+def describe_report(report):
+    """
+    Returns a one-line summary of a DownloadReport with aggregate throughput
+    """
+    seconds = max(report.seconds, 1e-9)
+    duplicates = f'{report.duplicates} duplicates, ' if report.duplicates else ''
+    return (f'{report.downloaded} downloaded, {duplicates}{report.skipped} skipped, {report.failed} failed | '
+            f'{report.bytes / 2 ** 20:.1f} MiB in {report.seconds:.1f} s '
+            f'({report.bytes / 2 ** 20 / seconds:.2f} MiB/s, {report.downloaded / seconds:.1f} files/s)')
+
+
+def load_manifest(download_path):
+    """
+    Returns the {file name: attachment ID} dictionary of the folder's downloads, empty if there is none
+    """
+    try:
+        with open(os.path.join(download_path, MANIFEST_NAME), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(download_path, manifest):
+    path = os.path.join(download_path, MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(f'{path}.tmp', path)
+
+
+class AttachmentDownloader:
+    """
+    Creates a class to download Toloka attachments concurrently, streaming them to disk
+    """
+    def __init__(self, session, max_workers=None, chunk_size=64 * 1024, retries=2, journal=None):
+        """
+        Instantiates an AttachmentDownloader class
+
+        :param session: TolokaSession the requests are sent through
+        :param max_workers: the number of concurrent downloads; by default the download concurrency bound
+                            of the session's RateLimiter, which then adapts the concurrency, or 8 without one
+        :param chunk_size: size of the chunks the bodies are written in, in bytes
+        :param retries: how many times a download interrupted in the middle of the body is repeated
+        :param journal: RunJournal the finished downloads are recorded in; attachments recorded there
+                        are not requested again
+        """
+        self.session = session
+        self.max_workers = max_workers or worker_count(session, DOWNLOAD)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.journal = journal
+
+    def download_one(self, attachment_id, path):
+        """
+        Streams the attachment into a temporary file next to the path and atomically renames it,
+        replacing an existing file
+
+        :param attachment_id: ID of the attachment
+        :param path: destination path of the file
+        :return: DownloadResult
+        """
+        file_name = os.path.basename(path)
+        error = None
+        for _ in range(self.retries + 1):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{file_name}.', suffix='.part')
+            size = 0
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    with self.session.get(f'attachments/{attachment_id}/download', stream=True) as response:
+                        response.raise_for_status()
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            file.write(chunk)
+                            size += len(chunk)
+                os.replace(tmp_path, path)
+                return DownloadResult(attachment_id, file_name, DOWNLOADED, size, None)
+            except requests.HTTPError as http_error:
+                error = str(http_error)
+                break
+            except (requests.RequestException, OSError) as io_error:
+                error = str(io_error)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return DownloadResult(attachment_id, file_name, FAILED, 0, error)
+
+    def download_checked(self, attachment_id, path, hash_index, max_distance=10):
+        """
+        Downloads the attachment into memory, hashing it in flight, and writes it to disk only if it is not
+        a duplicate of an image in the index. Unique images are added to the index
+
+        :param attachment_id: ID of the attachment
+        :param path: destination path of the file
+        :param hash_index: HashIndex the image is checked against
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: DownloadResult with the status 'downloaded', 'duplicate', 'skipped' or 'failed'
+        """
+        file_name = os.path.basename(path)
+        error = None
+        for _ in range(self.retries + 1):
+            buffer, digest = io.BytesIO(), hashlib.sha256()
+            try:
+                with self.session.get(f'attachments/{attachment_id}/download', stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        buffer.write(chunk)
+                        digest.update(chunk)
+                break
+            except requests.HTTPError as http_error:
+                return DownloadResult(attachment_id, file_name, FAILED, 0, str(http_error))
+            except requests.RequestException as io_error:
+                error = str(io_error)
+        else:
+            return DownloadResult(attachment_id, file_name, FAILED, 0, error)
+
+        from autotoloka.hashing import phash_bytes
+
+        data, digest, source = buffer.getvalue(), digest.hexdigest(), os.path.abspath(path)
+        value = None if hash_index.contains(digest) else phash_bytes(data)
+        if value is None and not hash_index.contains(digest):
+            earlier = None
+        else:
+            earlier = hash_index.check(digest, value, source, max_distance)
+        if earlier is not None:
+            return DownloadResult(attachment_id, file_name, DUPLICATE, len(data), None, earlier)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{file_name}.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except OSError as os_error:
+            return DownloadResult(attachment_id, file_name, FAILED, 0, str(os_error))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return DownloadResult(attachment_id, file_name, DOWNLOADED, len(data), None)
+
+    def _split_recorded(self, jobs, download_path):
+        """
+        Separates the jobs whose downloads are recorded in the journal (and whose files, unless they are duplicates,
+        are still on disk) from the ones still to be made
+        """
+        pending, recorded = [], []
+        for attachment_id, file_name in jobs:
+            result = self.journal.download_result(attachment_id)
+            if result is not None and (result.status == DUPLICATE
+                                       or os.path.exists(os.path.join(download_path, file_name))):
+                recorded.append(result)
+            else:
+                pending.append((attachment_id, file_name))
+        return pending, recorded
+
+    @staticmethod
+    def _split_downloaded(jobs, download_path, manifest):
+        """
+        Separates the jobs whose files were downloaded from the same attachments earlier (according to
+        the folder's manifest) from the ones still to be made; files of other attachments are overwritten
+        """
+        pending, skipped = [], []
+        for attachment_id, file_name in jobs:
+            if manifest.get(file_name) == str(attachment_id) and os.path.exists(os.path.join(download_path,
+                                                                                              file_name)):
+                skipped.append(DownloadResult(attachment_id, file_name, SKIPPED, 0, None))
+            else:
+                pending.append((attachment_id, file_name))
+        return pending, skipped
+
+    def iter_download(self, jobs, download_path, progress=True, desc='Files downloaded', hash_index=None,
+                      max_distance=10):
+        """
+        Downloads the attachments into a folder, yielding the results as soon as they are ready.
+        The folder's manifest records which attachment every file comes from, so files downloaded
+        by an earlier run are skipped, while files of the same name from other attachments are replaced
+
+        :param jobs: an iterable of (attachment ID, file name) pairs
+        :param download_path: path of the directory to download the files into, created if missing
+        :param progress: if set to True, shows a tqdm progress bar
+        :param desc: description of the progress bar
+        :param hash_index: if set, every image is checked against this HashIndex while it is downloaded,
+                           and duplicates are never written to disk
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: a generator of DownloadResult
+        """
+        from tqdm import tqdm
+
+        os.makedirs(download_path, exist_ok=True)
+        jobs, recorded = list(jobs), []
+        if self.journal is not None:
+            jobs, recorded = self._split_recorded(jobs, download_path)
+        manifest = load_manifest(download_path)
+        jobs, skipped = self._split_downloaded(jobs, download_path, manifest)
+        recorded += skipped
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if hash_index is None:
+                futures = [executor.submit(self.download_one, attachment_id,
+                                           os.path.join(download_path, file_name))
+                           for attachment_id, file_name in jobs]
+            else:
+                futures = [executor.submit(self.download_checked, attachment_id,
+                                           os.path.join(download_path, file_name), hash_index, max_distance)
+                           for attachment_id, file_name in jobs]
+            bar = tqdm(total=len(futures) + len(recorded), ncols=100, colour='green', desc=desc,
+                       disable=not progress)
+            with bar:
+                for result in recorded:
+                    bar.update(1)
+                    yield result
+                try:
+                    for count, future in enumerate(as_completed(futures), 1):
+                        bar.update(1)
+                        result = future.result()
+                        if self.journal is not None:
+                            self.journal.record_download(result)
+                        if result.status == DOWNLOADED:
+                            manifest[result.file_name] = str(result.attachment_id)
+                            if count % MANIFEST_SAVE_EVERY == 0:
+                                save_manifest(download_path, manifest)
+                        yield result
+                finally:
+                    save_manifest(download_path, manifest)
+        if hash_index is not None:
+            hash_index.commit()
+
+    def download(self, jobs, download_path, progress=True, desc='Files downloaded', hash_index=None,
+                 max_distance=10):
+        """
+        Downloads the attachments into a folder
+
+        :param jobs: an iterable of (attachment ID, file name) pairs
+        :param download_path: path of the directory to download the files into, created if missing
+        :param progress: if set to True, shows a tqdm progress bar
+        :param desc: description of the progress bar
+        :param hash_index: if set, duplicates of the images in this HashIndex are not written to disk
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: DownloadReport with the results of every job and aggregate counters
+        """
+        started = time.monotonic()
+        results = list(self.iter_download(jobs, download_path, progress=progress, desc=desc,
+                                          hash_index=hash_index, max_distance=max_distance))
+        return summarize(results, time.monotonic() - started)
+
+
+def summarize(results, seconds):
+    """
+    Returns a DownloadReport for the list of DownloadResult
+    """
+    return DownloadReport(results=results,
+                          downloaded=sum(result.status == DOWNLOADED for result in results),
+                          skipped=sum(result.status == SKIPPED for result in results),
+                          failed=sum(result.status == FAILED for result in results),
+                          bytes=sum(result.bytes for result in results),
+                          seconds=seconds,
+                          duplicates=sum(result.status == DUPLICATE for result in results))
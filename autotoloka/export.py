@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+from collections import namedtuple
+
+import requests
+
+from autotoloka.utils import iter_chunks
+
+
+logger = logging.getLogger(__name__)
+
+STRING = 'string'
+INTEGER = 'integer'
+FLOAT = 'float'
+BOOLEAN = 'boolean'
+DATETIME = 'datetime'
+JSON = 'json'
+
+# Columns of every row: one row is one task of an assignment
+BASE_COLUMNS = {'assignment_id': STRING, 'task_suite_id': STRING, 'pool_id': STRING, 'user_id': STRING,
+                'status': STRING, 'reward': FLOAT, 'created': DATETIME, 'submitted': DATETIME,
+                'accepted': DATETIME, 'rejected': DATETIME, 'task_id': STRING, 'task_index': INTEGER}
+INPUT_PREFIX = 'INPUT:'
+OUTPUT_PREFIX = 'OUTPUT:'
+
+# Field types of the project's task specification
+SPEC_TYPES = {'string': STRING, 'url': STRING, 'file': STRING, 'coordinates': STRING,
+              'integer': INTEGER, 'float': FLOAT, 'boolean': BOOLEAN, 'json': JSON}
+
+# Fields recording when an assignment got the status; an assignment gets it after its ID has been exported,
+# so exports filtered by status continue from these fields instead of the ID
+TRANSITION_FIELDS = {'SUBMITTED': 'submitted', 'ACCEPTED': 'accepted', 'REJECTED': 'rejected',
+                     'SKIPPED': 'skipped', 'EXPIRED': 'expired'}
+SUBMITTED_STATUSES = {'SUBMITTED', 'ACCEPTED', 'REJECTED'}
+
+ExportReport = namedtuple('ExportReport', ['assignments', 'rows', 'cursor', 'file'])
+
+
+def default_cursor_field(status=None):
+    """
+    Returns the field an export of the statuses can be continued from without missing assignments which get
+    one of the statuses later: 'id' for all the assignments, the transition field for one status,
+    'submitted' for submitted statuses including SUBMITTED; None if there is no such field
+    """
+    if status is None:
+        return 'id'
+    statuses = {status} if isinstance(status, str) else set(status)
+    fields = {TRANSITION_FIELDS.get(item) for item in statuses}
+    if len(fields) == 1 and None not in fields:
+        return fields.pop()
+    if 'SUBMITTED' in statuses and statuses <= SUBMITTED_STATUSES:
+        return 'submitted'
+    return None
+
+
+def flatten_assignment(assignment):
+    """
+    Returns the rows of an assignment, one per task: the assignment's fields with the task's input values
+    as INPUT:<name> and the solution's output values as OUTPUT:<name>
+    """
+    solutions = assignment.get('solutions') or []
+    rows = []
+    for index, task in enumerate(assignment.get('tasks') or [{}]):
+        row = {column: assignment.get(column) for column in BASE_COLUMNS if column in assignment}
+        row['assignment_id'] = assignment.get('id')
+        row['task_id'] = task.get('id')
+        row['task_index'] = index
+        for key, value in (task.get('input_values') or {}).items():
+            row[INPUT_PREFIX + key] = value
+        solution = solutions[index] if index < len(solutions) else {}
+        for key, value in (solution.get('output_values') or {}).items():
+            row[OUTPUT_PREFIX + key] = value
+        rows.append(row)
+    return rows
+
+
+def spec_column_kinds(task_spec):
+    """
+    Returns the column types given by the project's task specification, arrays and unknown types are kept as JSON
+    """
+    kinds = dict(BASE_COLUMNS)
+    for prefix, spec_name in ((INPUT_PREFIX, 'input_spec'), (OUTPUT_PREFIX, 'output_spec')):
+        for key, field in (task_spec.get(spec_name) or {}).items():
+            kinds[prefix + key] = SPEC_TYPES.get(field.get('type'), JSON)
+    return kinds
+
+
+def infer_column_kinds(rows):
+    """
+    Returns the column types guessed from the first non-empty value of every column
+    """
+    kinds = dict(BASE_COLUMNS)
+    for row in rows:
+        for key, value in row.items():
+            if key in kinds or value is None:
+                continue
+            if isinstance(value, bool):
+                kinds[key] = BOOLEAN
+            elif isinstance(value, int):
+                kinds[key] = INTEGER
+            elif isinstance(value, float):
+                kinds[key] = FLOAT
+            elif isinstance(value, (dict, list)):
+                kinds[key] = JSON
+            else:
+                kinds[key] = STRING
+    return kinds
+
+
+def _column(values, kind):
+    import pandas as pd
+
+    if kind == JSON:
+        values = [None if value is None else json.dumps(value, ensure_ascii=False) for value in values]
+        return pd.Series(values, dtype='object')
+    if kind == STRING:
+        return pd.Series([None if value is None else str(value) for value in values], dtype='object')
+    if kind == DATETIME:
+        return pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce')
+    numbers = pd.to_numeric(pd.Series(values, dtype='object'), errors='coerce')
+    if kind == FLOAT:
+        return numbers.astype('float64')
+    return numbers.astype('Int64' if kind == INTEGER else 'boolean')
+
+
+def rows_to_frame(rows, kinds):
+    """
+    Returns a DataFrame of the rows with a column of the given type for every key of kinds
+    """
+    import pandas as pd
+
+    return pd.DataFrame({column: _column([row.get(column) for row in rows], kind)
+                         for column, kind in kinds.items()})
+
+
+def arrow_schema(kinds):
+    import pyarrow as pa
+
+    types = {STRING: pa.string(), JSON: pa.string(), INTEGER: pa.int64(), FLOAT: pa.float64(),
+             BOOLEAN: pa.bool_(), DATETIME: pa.timestamp('ms')}
+    return pa.schema([(column, types[kind]) for column, kind in kinds.items()])
+
+
+class AssignmentExporter:
+    """
+    Creates a class to export the assignments of a pool as typed tables: the assignments are requested
+    page by page and converted in chunks, so pools of any size are exported in constant memory
+    """
+    def __init__(self, handler, pool_id, status=None, chunk_size=10000, page_size=1000, prefetch=True,
+                 cursor_field=None, kinds=None):
+        """
+        Instantiates an AssignmentExporter class
+
+        :param handler: TolokaProjectHandler the assignments are requested through
+        :param pool_id: ID of the pool
+        :param status: status or a list of statuses to export, e.g. 'ACCEPTED', if None - all the assignments
+        :param chunk_size: the number of rows converted at once, also the size of Parquet row groups
+        :param page_size: the number of assignments requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is converted
+        :param cursor_field: the field the assignments are sorted by and continued from by incremental exports,
+                             if None - the one given by default_cursor_field for the status
+        :param kinds: a dictionary {column: type}, if None - the types are taken from the project's specification
+        """
+        self.handler = handler
+        self.pool_id = pool_id
+        self.status = status
+        self.chunk_size = chunk_size
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.cursor_field = cursor_field or default_cursor_field(status) or 'id'
+        self.kinds = kinds
+        self.cursor = None
+        self.cursor_ids = set()
+        self.assignments = 0
+
+    def spec_kinds(self):
+        """
+        Returns the column types of the pool's project specification, or None if it is not available
+        """
+        try:
+            project = self.handler.get_project(self.handler.get_pool(self.pool_id)['project_id'])
+        except (requests.RequestException, ValueError, KeyError) as error:
+            logger.warning('Task specification of pool %s is not available (%s), column types are inferred',
+                           self.pool_id, error)
+            return None
+        task_spec = project.get('task_spec') or {}
+        if not task_spec.get('input_spec') and not task_spec.get('output_spec'):
+            logger.warning('Project of pool %s has no task specification, column types are inferred', self.pool_id)
+            return None
+        return spec_column_kinds(task_spec)
+
+    def iter_rows(self, after=None, seen=None):
+        """
+        Lazily yields the rows of the assignments which come after the cursor.
+        Cursor fields other than id are not unique, so the export continues from the cursor value (*_gte) and leaves
+        out the assignments of that value which were exported; self.cursor and self.cursor_ids follow the last value
+
+        :param after: the cursor field's value of the last exported assignment, None to export all of them
+        :param seen: IDs of the exported assignments with the value after, if None - the ones with it are left out
+        """
+        if after is None:
+            filters = {}
+        elif seen is None:
+            filters = {f'{self.cursor_field}_gt': after}
+        else:
+            filters = {f'{self.cursor_field}_gte': after}
+        seen = set(seen or ())
+        self.cursor, self.cursor_ids, self.assignments = after, set(seen), 0
+        for assignment in self.handler.iter_assignments(self.pool_id, status=self.status, page_size=self.page_size,
+                                                        prefetch=self.prefetch, cursor_field=self.cursor_field,
+                                                        **filters):
+            value = assignment[self.cursor_field]
+            if value == after and assignment['id'] in seen:
+                continue
+            yield from flatten_assignment(assignment)
+            if value != self.cursor:
+                self.cursor, self.cursor_ids = value, set()
+            self.cursor_ids.add(assignment['id'])
+            self.assignments += 1
+
+    def iter_frames(self, after=None, seen=None):
+        """
+        Yields DataFrames of at most chunk_size rows with the same typed columns.
+        Columns which are not in the specification (or, without it, not in the first chunk) are left out
+
+        :param after: the cursor field's value of the last exported assignment, None to export all of them
+        :param seen: IDs of the exported assignments with the value after (see iter_rows)
+        """
+        dropped = set()
+        for rows in iter_chunks(self.iter_rows(after, seen), self.chunk_size):
+            if self.kinds is None:
+                self.kinds = self.spec_kinds() or infer_column_kinds(rows)
+            unknown = {key for row in rows for key in row} - set(self.kinds) - dropped
+            if unknown:
+                dropped |= unknown
+                logger.warning('Columns are not in the schema and are left out: %s', ', '.join(sorted(unknown)))
+            yield rows_to_frame(rows, self.kinds)
+
+    def to_dataframe(self, after=None, seen=None):
+        """
+        Returns all the rows as one DataFrame
+        """
+        import pandas as pd
+
+        frames = list(self.iter_frames(after, seen))
+        if not frames:
+            return rows_to_frame([], self.kinds or self.spec_kinds() or dict(BASE_COLUMNS))
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_record_batches(self, after=None, seen=None):
+        """
+        Yields the chunks as Arrow record batches
+        """
+        import pyarrow as pa
+
+        for frame in self.iter_frames(after, seen):
+            yield pa.RecordBatch.from_pandas(frame, schema=arrow_schema(self.kinds), preserve_index=False)
+
+    def to_parquet(self, path, state_path=None):
+        """
+        Writes the rows into a Parquet dataset directory, one row group per chunk.
+        Every export continues from the last assignment of the previous one, recorded in the state file as the cursor
+        value and the IDs of the exported assignments with it, and adds a new part file to the dataset; nothing is recorded if the export is interrupted,
+        so it is simply repeated. A new directory starts the export over.
+        An export filtered by status has to continue from the time the assignments got it (see default_cursor_field),
+        otherwise the assignments which get the status after the previous export would never be exported
+
+        :param path: the dataset directory, readable at once with pandas.read_parquet(path)
+        :param state_path: path of the JSON state file, by default _export_state.json inside the directory
+        :return: ExportReport with the name of the written file (None if there was nothing new)
+        """
+        import pyarrow.parquet as pq
+
+        if self.status is not None and self.cursor_field == 'id':
+            raise ValueError(f'An incremental export of {self.status} assignments by id misses the assignments '
+                             f'which get the status later, export them by the time of the status instead')
+        os.makedirs(path, exist_ok=True)
+        state_path = state_path or os.path.join(path, '_export_state.json')
+        state = {'pool_id': str(self.pool_id), 'cursor_field': self.cursor_field, 'cursor': None, 'cursor_ids': None,
+                 'parts': []}
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as file:
+                state = json.load(file)
+            if state['pool_id'] != str(self.pool_id) or state['cursor_field'] != self.cursor_field:
+                raise ValueError(f'{state_path} is the state of an export of pool {state["pool_id"]} '
+                                 f'by {state["cursor_field"]}')
+        # The id is unique and continued after, states written before cursor_ids were continued after the value too
+        after, seen = state['cursor'], state.get('cursor_ids')
+
+        name = f'part-{len(state["parts"]):05d}.parquet'
+        temporary_path = os.path.join(path, f'_{name}.tmp')
+        writer, rows = None, 0
+        try:
+            for batch in self.iter_record_batches(after, seen):
+                if writer is None:
+                    writer = pq.ParquetWriter(temporary_path, batch.schema)
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            logger.info('No new assignments in pool %s', self.pool_id)
+            return ExportReport(0, 0, after, None)
+
+        os.replace(temporary_path, os.path.join(path, name))
+        state['parts'].append(name)
+        state['cursor'] = self.cursor
+        state['cursor_ids'] = None if self.cursor_field == 'id' else sorted(self.cursor_ids)
+        with open(f'{state_path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=4)
+        os.replace(f'{state_path}.tmp', state_path)
+        logger.info('%s assignments (%s rows) of pool %s exported into %s', self.assignments, rows, self.pool_id,
+                    os.path.join(path, name))
+        return ExportReport(self.assignments, rows, self.cursor, os.path.join(path, name))
@@ -0,0 +1,475 @@
+import hashlib
+import io
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+from autotoloka.ratelimit import TokenBucket
+
+
+API_PREFIX = '/api/v1/'
+
+
+class FakeApiError(Exception):
+    def __init__(self, status, code, message=''):
+        super().__init__(message or code)
+        self.status = status
+        self.code = code
+        self.message = message or code
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+
+
+def _matches(item, filters):
+    """
+    Applies the Toloka list filters: plain equality, comma-separated status lists and *_gt/_gte/_lt/_lte ranges
+    """
+    for key, value in filters.items():
+        field, _, operator = key.rpartition('_')
+        if operator in ('gt', 'gte', 'lt', 'lte') and field:
+            item_value = item.get(field)
+            if item_value is None:
+                return False
+            # Numeric IDs are compared as numbers, other IDs and dates as strings
+            item_value, value = _sort_key(item_value), _sort_key(value)
+            if operator == 'gt' and not item_value > value or operator == 'gte' and not item_value >= value \
+                    or operator == 'lt' and not item_value < value or operator == 'lte' and not item_value <= value:
+                return False
+        elif key == 'status':
+            if item.get('status') not in value.split(','):
+                return False
+        elif str(item.get(key)) != value:
+            return False
+    return True
+
+
+def _sort_key(value):
+    # Unpadded numeric IDs (projects, pools) compare as numbers, zero-padded hex IDs (assignments) as strings
+    value = '' if value is None else str(value)
+    numeric = value.isdigit() and not (value.startswith('0') and len(value) > 1)
+    return (0, int(value), '') if numeric else (1, 0, value)
+
+
+def default_solution(task, worker_number, rng):
+    """
+    Returns output values of a collecting-images assignment: every worker uploads a random small JPEG,
+    with 10% of them reusing an image of a previous worker
+
+    :return: a pair of output values and the attachment's (name, bytes), or None for no attachment
+    """
+    from PIL import Image
+
+    seed = rng.randrange(worker_number) if worker_number and rng.random() < 0.1 else worker_number
+    pixel_rng = random.Random(seed)
+    pixels = bytes(pixel_rng.getrandbits(8) for _ in range(8 * 8 * 3))
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (8, 8), pixels).resize((320, 240)).save(buffer, 'JPEG')
+    return {'image': None, 'no_image': False}, ('photo.jpg', buffer.getvalue())
+
+
+class FakeToloka:
+    """
+    Creates an in-memory model of the Toloka objects the handler works with, including the state transitions
+    of pools and assignments
+    """
+    def __init__(self, solution_factory=default_solution, submit_interval=0.0, seed=0):
+        """
+        Instantiates a FakeToloka class
+
+        :param solution_factory: function (task, worker number, random.Random) returning output values and
+                                 an optional attachment (name, bytes); the attachment's ID is put into the
+                                 'image' output value
+        :param submit_interval: seconds between simulated submissions in an open pool, 0 submits everything at once
+        :param seed: seed of the random generator
+        """
+        self.solution_factory = solution_factory
+        self.submit_interval = submit_interval
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.projects, self.pools, self.task_suites = {}, {}, {}
+        self.assignments, self.attachments, self.attachment_data, self.operations = {}, {}, {}, {}
+        self.operation_logs = {}
+        self.workers = {}
+
+    def _new_id(self, prefix=''):
+        number = next(self.ids)
+        return f'{prefix}{number:012x}' if prefix else str(number)
+
+    def _get(self, collection, object_id, name):
+        try:
+            return collection[str(object_id)]
+        except KeyError:
+            raise FakeApiError(404, 'DOES_NOT_EXIST', f'{name} {object_id} does not exist')
+
+    @staticmethod
+    def _list(collection, query):
+        query = dict(query)
+        sort = [field.lstrip('-') for field in query.pop('sort', 'id').split(',')]
+        limit = int(query.pop('limit', 50))
+        items = [item for item in collection.values() if _matches(item, query)]
+        items.sort(key=lambda item: tuple(_sort_key(item.get(field)) for field in sort) + (_sort_key(item['id']),))
+        return {'items': items[:limit], 'has_more': len(items) > limit}
+
+    # Projects
+
+    def create_project(self, body):
+        project = dict(body, id=self._new_id(), status='ACTIVE', created=_now())
+        self.projects[project['id']] = project
+        return 201, project
+
+    def archive_project(self, project_id):
+        project = self._get(self.projects, project_id, 'Project')
+        if any(pool['project_id'] == project['id'] and pool['status'] != 'ARCHIVED' for pool in self.pools.values()):
+            raise FakeApiError(409, 'UNARCHIVED_POOLS_CONFLICT')
+        project['status'] = 'ARCHIVED'
+        return 202, self._operation('PROJECT.ARCHIVE', {'project_id': project['id']})
+
+    # Pools
+
+    def create_pool(self, body):
+        self._get(self.projects, body.get('project_id'), 'Project')
+        pool = dict(body, id=self._new_id(), project_id=str(body['project_id']), status='CLOSED',
+                    last_close_reason='NOT_STARTED', created=_now())
+        self.pools[pool['id']] = pool
+        return 201, pool
+
+    def update_pool(self, pool_id, body):
+        pool = self._get(self.pools, pool_id, 'Pool')
+        pool.update({k: v for k, v in body.items() if k not in ('id', 'status', 'created', 'last_close_reason')})
+        return 200, pool
+
+    def open_pool(self, pool_id):
+        pool = self._get(self.pools, pool_id, 'Pool')
+        if pool['status'] == 'OPEN':
+            return 204, None
+        if pool['status'] == 'ARCHIVED':
+            raise FakeApiError(409, 'INAPPROPRIATE_STATUS')
+        pool.update(status='OPEN', last_started=_now())
+        pool.pop('last_close_reason', None)
+        threading.Thread(target=self._work, args=(pool['id'],), daemon=True).start()
+        return 202, self._operation('POOL.OPEN', {'pool_id': pool['id']})
+
+    def close_pool(self, pool_id, reason='MANUAL'):
+        pool = self._get(self.pools, pool_id, 'Pool')
+        if pool['status'] != 'OPEN':
+            return 204, None
+        pool.update(status='CLOSED', last_close_reason=reason)
+        return 202, self._operation('POOL.CLOSE', {'pool_id': pool['id']})
+
+    def archive_pool(self, pool_id):
+        pool = self._get(self.pools, pool_id, 'Pool')
+        if pool['status'] == 'OPEN':
+            raise FakeApiError(409, 'INAPPROPRIATE_STATUS')
+        if any(item['pool_id'] == pool['id'] and item['status'] == 'SUBMITTED' for item in self.assignments.values()):
+            raise FakeApiError(409, 'SUBMITTED_ASSIGNMENTS_CONFLICT')
+        pool['status'] = 'ARCHIVED'
+        return 202, self._operation('POOL.ARCHIVE', {'pool_id': pool['id']})
+
+    def _work(self, pool_id):
+        """
+        Simulates Tolokers: submits an assignment for every missing overlap of the pool's task-suites,
+        then closes the pool as completed
+        """
+        while True:
+            with self.lock:
+                pool = self.pools.get(pool_id)
+                if pool is None or pool['status'] != 'OPEN':
+                    return
+                todo = [suite for suite in self.task_suites.values()
+                        if suite['pool_id'] == pool_id and suite['remaining_overlap'] > 0]
+                if not todo:
+                    pool.update(status='CLOSED', last_close_reason='COMPLETED')
+                    return
+                batch = todo if not self.submit_interval else todo[:1]
+                for suite in batch:
+                    self._submit(pool, suite)
+            if self.submit_interval:
+                time.sleep(self.submit_interval)
+
+    def _submit(self, pool, suite):
+        worker_number = next(self.workers.setdefault(pool['id'], itertools.count()))
+        assignment_id = self._new_id('0000')
+        solutions = []
+        for task in suite['tasks']:
+            output_values, attachment = self.solution_factory(task, worker_number, self.rng)
+            output_values = dict(output_values)
+            if attachment is not None:
+                attachment_id = self._new_id('a')
+                name, data = attachment
+                self.attachments[attachment_id] = {'id': attachment_id, 'name': name,
+                                                   'attachment_type': 'ASSIGNMENT_ATTACHMENT',
+                                                   'media_type': 'image/jpeg', 'created': _now(),
+                                                   'details': {'pool_id': pool['id'], 'assignment_id': assignment_id,
+                                                               'user_id': f'worker{worker_number}'},
+                                                   'pool_id': pool['id'], 'assignment_id': assignment_id}
+                self.attachment_data[attachment_id] = data
+                output_values['image'] = attachment_id
+            solutions.append({'output_values': output_values})
+        now = _now()
+        self.assignments[assignment_id] = {
+            'id': assignment_id, 'task_suite_id': suite['id'], 'pool_id': pool['id'],
+            'user_id': f'worker{worker_number}', 'status': 'SUBMITTED', 'reward': pool.get('reward_per_assignment'),
+            'tasks': suite['tasks'], 'solutions': solutions, 'created': now, 'submitted': now,
+        }
+        suite['remaining_overlap'] -= 1
+
+    # Task-suites
+
+    def create_task_suites(self, body, query):
+        many = isinstance(body, list)
+        created, errors = {}, {}
+        for index, item in enumerate(body if many else [body]):
+            try:
+                pool = self._get(self.pools, item.get('pool_id'), 'Pool')
+            except FakeApiError as error:
+                errors[str(index)] = {'code': error.code, 'message': error.message}
+                continue
+            overlap = item.get('overlap') or pool.get('defaults', {}).get('default_overlap_for_new_task_suites', 1)
+            suite = dict(item, id=self._new_id('s'), pool_id=pool['id'], overlap=overlap, remaining_overlap=overlap,
+                         created=_now(),
+                         tasks=[dict(task, id=self._new_id('t'), pool_id=pool['id']) for task in item.get('tasks', [])])
+            self.task_suites[suite['id']] = suite
+            created[str(index)] = suite
+            if pool['status'] == 'OPEN':
+                threading.Thread(target=self._work, args=(pool['id'],), daemon=True).start()
+        if query.get('async_mode') == 'true':
+            log = [{'type': 'TASK_SUITE_CREATE', 'success': True, 'input': {'index': int(index)},
+                    'output': {'task_suite_id': suite['id']}} for index, suite in created.items()]
+            log += [{'type': 'TASK_SUITE_VALIDATE', 'success': False, 'input': {'index': int(index)},
+                     'output': error} for index, error in errors.items()]
+            operation = self._operation('TASK_SUITE.BATCH_CREATE', {'items_count': len(body)},
+                                        status='SUCCESS' if created or not errors else 'FAIL', log=log)
+            return 202, operation
+        if not many:
+            if errors:
+                raise FakeApiError(400, 'VALIDATION_ERROR', json.dumps(errors))
+            return 201, created['0']
+        return 201, {'items': created, 'validation_errors': errors}
+
+    def patch_task_suite(self, suite_id, body, set_overlap_or_min=False):
+        suite = self._get(self.task_suites, suite_id, 'Task-suite')
+        if 'overlap' in body and body['overlap'] not in (None, 'null'):
+            done = suite['overlap'] - suite['remaining_overlap']
+            overlap = max(int(body['overlap']), done) if set_overlap_or_min else int(body['overlap'])
+            suite.update(overlap=overlap, remaining_overlap=max(0, overlap - done))
+        if 'infinite_overlap' in body:
+            suite['infinite_overlap'] = body['infinite_overlap'] in (True, 'true')
+        return 200, suite
+
+    # Assignments
+
+    def patch_assignment(self, assignment_id, body):
+        assignment = self._get(self.assignments, assignment_id, 'Assignment')
+        status = body.get('status')
+        allowed = {'ACCEPTED': ('SUBMITTED', 'REJECTED'), 'REJECTED': ('SUBMITTED',)}
+        if status not in allowed:
+            raise FakeApiError(400, 'VALIDATION_ERROR', f'Unknown status {status}')
+        if assignment['status'] not in allowed[status]:
+            raise FakeApiError(409, 'INAPPROPRIATE_STATUS')
+        assignment.update(status=status, public_comment=body.get('public_comment'))
+        assignment['accepted' if status == 'ACCEPTED' else 'rejected'] = _now()
+        if status == 'REJECTED':
+            suite = self.task_suites.get(assignment['task_suite_id'])
+            if suite is not None:
+                suite['remaining_overlap'] += 1
+        return 200, assignment
+
+    # Operations
+
+    def _operation(self, operation_type, parameters, status='SUCCESS', log=None):
+        operation_id = self._new_id('op')
+        now = _now()
+        operation = {'id': operation_id, 'type': operation_type, 'status': status, 'parameters': parameters,
+                     'submitted': now, 'started': now, 'finished': now}
+        self.operations[operation_id] = operation
+        self.operation_logs[operation_id] = log or []
+        return operation
+
+    # Routing
+
+    def handle(self, method, path, query, body):
+        """
+        Handles a request to the API
+
+        :param method: HTTP method
+        :param path: path relative to the API root, e.g. 'pools/1/open'
+        :param query: a dictionary of query parameters
+        :param body: parsed json body or None
+        :return: a pair of the status code and a json-like body (bytes for downloads)
+        """
+        parts = [part for part in path.split('/') if part]
+        with self.lock:
+            route = (method, parts[0] if parts else '', len(parts))
+            resource = {'projects': self.projects, 'pools': self.pools, 'task-suites': self.task_suites,
+                        'assignments': self.assignments, 'attachments': self.attachments,
+                        'operations': self.operations}.get(route[1])
+            if resource is None:
+                raise FakeApiError(404, 'NOT_FOUND', path)
+            if method == 'GET' and len(parts) == 1:
+                return 200, self._list(resource, query)
+            if method == 'GET' and len(parts) == 2:
+                return 200, self._get(resource, parts[1], route[1])
+            if route == ('POST', 'projects', 1):
+                return self.create_project(body)
+            if route == ('PUT', 'projects', 2):
+                project = self._get(self.projects, parts[1], 'Project')
+                project.update({k: v for k, v in body.items() if k not in ('id', 'status', 'created')})
+                return 200, project
+            if route == ('POST', 'pools', 1):
+                return self.create_pool(body)
+            if route == ('PUT', 'pools', 2):
+                return self.update_pool(parts[1], body)
+            if route == ('POST', 'task-suites', 1):
+                return self.create_task_suites(body, query)
+            if route == ('PATCH', 'task-suites', 2):
+                return self.patch_task_suite(parts[1], body)
+            if route == ('PATCH', 'task-suites', 3) and parts[2] == 'set-overlap-or-min':
+                return self.patch_task_suite(parts[1], body, set_overlap_or_min=True)
+            if route == ('PATCH', 'assignments', 2):
+                return self.patch_assignment(parts[1], body)
+            if route == ('GET', 'attachments', 3) and parts[2] == 'download':
+                self._get(self.attachments, parts[1], 'Attachment')
+                return 200, self.attachment_data[parts[1]]
+            if route == ('GET', 'operations', 3) and parts[2] == 'log':
+                self._get(self.operations, parts[1], 'Operation')
+                return 200, self.operation_logs[parts[1]]
+            if method == 'POST' and len(parts) == 3:
+                action = (parts[0], parts[2])
+                if action == ('pools', 'open'):
+                    return self.open_pool(parts[1])
+                if action == ('pools', 'close'):
+                    return self.close_pool(parts[1])
+                if action == ('pools', 'archive'):
+                    return self.archive_pool(parts[1])
+                if action == ('projects', 'archive'):
+                    return self.archive_project(parts[1])
+                if action == ('task-suites', 'archive'):
+                    suite = self._get(self.task_suites, parts[1], 'Task-suite')
+                    suite['status'] = 'ARCHIVED'
+                    return 202, self._operation('TASK_SUITE.ARCHIVE', {'task_suite_id': suite['id']})
+        raise FakeApiError(404, 'NOT_FOUND', f'{method} {path}')
+
+
+class FakeTolokaServer:
+    """
+    Creates a local HTTP server speaking the subset of the Toloka API used by the handlers,
+    with configurable latency, random errors and 429 throttling
+    """
+    def __init__(self, toloka=None, host='127.0.0.1', port=0, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 requests_per_second=None, retry_after=1, seed=0):
+        """
+        Instantiates a FakeTolokaServer class
+
+        :param toloka: FakeToloka holding the state, a new one is created if None
+        :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free one
+        :param latency: seconds added to every response
+        :param latency_jitter: up to this many seconds are randomly added to the latency
+        :param error_rate: probability of answering a request with 500
+        :param requests_per_second: if set, requests above this rate are answered with 429 and Retry-After
+        :param retry_after: value of the Retry-After header of 429 responses, in seconds
+        :param seed: seed of the random generator used for the latency jitter and the errors
+        """
+        self.toloka = toloka or FakeToloka(seed=seed)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}{API_PREFIX}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _throttled(self):
+        return self.bucket is not None and not self.bucket.try_acquire()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, Nagle's algorithm would delay every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                if isinstance(body, bytes):
+                    data, content_type = body, 'application/octet-stream'
+                elif body is None:
+                    data, content_type = b'', 'application/json'
+                else:
+                    # The objects are shared with the simulated workers
+                    with fake.toloka.lock:
+                        data, content_type = json.dumps(body).encode('utf-8'), 'application/json'
+                headers = dict(headers or {})
+                if self.command == 'GET' and status == 200 and isinstance(body, dict) and 'id' in body:
+                    headers['ETag'] = f'"{hashlib.md5(data).hexdigest()}"'
+                    if self.headers.get('If-None-Match') == headers['ETag']:
+                        status, data = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                fake.requests += 1
+                if fake.latency or fake.latency_jitter:
+                    time.sleep(fake.latency + fake.rng.uniform(0, fake.latency_jitter))
+                if fake._throttled():
+                    return self._send(429, {'code': 'TOO_MANY_REQUESTS', 'message': 'Too many requests'},
+                                      {'Retry-After': str(fake.retry_after)})
+                if fake.error_rate and fake.rng.random() < fake.error_rate:
+                    return self._send(500, {'code': 'INTERNAL_ERROR', 'message': 'Injected error'})
+                parsed = urlparse(self.path)
+                if not parsed.path.startswith(API_PREFIX):
+                    return self._send(404, {'code': 'NOT_FOUND', 'message': parsed.path})
+                try:
+                    body = json.loads(raw) if raw else None
+                    status, response = fake.toloka.handle(self.command, parsed.path[len(API_PREFIX):],
+                                                          dict(parse_qsl(parsed.query)), body)
+                except FakeApiError as error:
+                    status, response = error.status, {'code': error.code, 'message': error.message}
+                except (ValueError, KeyError, TypeError) as error:
+                    status, response = 400, {'code': 'VALIDATION_ERROR', 'message': str(error)}
+                self._send(status, response)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+        return Handler
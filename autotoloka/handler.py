@@ -1,31 +1,61 @@
-import requests
-import json
+import logging
 import os
-from tqdm import tqdm
+import time
+from contextlib import nullcontext
 from autotoloka.create_pool import PoolCreator
 from autotoloka.create_task import TaskSuiteCreator
-from autotoloka.utils import get_chunks, print_json, check_for_duplicates
-from yadisk import YaDisk
-from autotoloka.json_data import json_data
+from autotoloka.utils import check_for_duplicates, unique_file_names
+from autotoloka.json_data import json_data, to_plain
+from autotoloka.log import LazyJson, LogSampler
+from autotoloka.cache import ResponseCache
+from autotoloka.metrics import Metrics
+from autotoloka.ratelimit import shared_limiter
+from autotoloka.transport import TolokaSession
+from autotoloka.pagination import iter_items
+from autotoloka.review import BulkReviewer, review_assignment, OK, ALREADY_PROCESSED
+from autotoloka.downloader import (AttachmentDownloader, DownloadResult, describe_report, summarize,
+                                  DUPLICATE, DOWNLOADED, SKIPPED)
+from autotoloka.upload import TaskSuiteUploader
+from autotoloka.ingest import ProxyManifest, YaDiskProxyIngestor, default_input_value, proxy_folder, CHECKSUM
+
+
+logger = logging.getLogger(__name__)
 
 
 class TolokaProjectHandler:
     """
     Creates a class to handle all Toloka operations
     """
-    def __init__(self, oauth_token=None, project_id=None, is_sandbox=True, verbose=True, project_params_data=None):
+    def __init__(self, oauth_token=None, project_id=None, is_sandbox=True, verbose=True, project_params_data=None,
+                 timeout=(5, 60), max_retries=5, pool_maxsize=64, session=None, api_url=None,
+                 metrics=None, rate_limiter=None, cache=None, journal=None):
         """
         Instantiates a TolokaProjectHandler class
 
         :param oauth_token: Yandex.Toloka token for connecting with the API
         :param project_id: ID of the project the handler is needed for, if None - various options will be given
         :param is_sandbox: if set to True, then all the operations will be performed in Sandbox Toloka
-        :param verbose: if set to True, all response logs will be printed out
+        :param verbose: whether the caller wants the responses logged; the handler leaves the logging configuration
+                        to the application or the entry points (see autotoloka.log.configure_logging)
         :param project_params_data: a json-like dictionary of project configurations, needed for creating new project
+        :param timeout: default (connect, read) timeout of every request in seconds
+        :param max_retries: how many times a request is repeated on connection errors, 429 and 5xx responses
+        :param pool_maxsize: number of keep-alive connections, should match the number of concurrent workers
+        :param session: a TolokaSession to share between handlers, if None - a new one is created
+        :param api_url: root URL of the API, overrides is_sandbox (e.g. a local FakeTolokaServer)
+        :param metrics: Metrics collecting request and stage measurements, by default the session's one or a new one
+        :param rate_limiter: RateLimiter of a new session, by default the one shared by all the handlers with
+                             the same token (see shared_limiter); False disables the limiting
+        :param cache: a ResponseCache (or True for one with the default TTL) serving repeated reads of projects,
+                      pools and task-suites; writes made through the handler update or invalidate it
+        :param journal: RunJournal the downloads and reviews are recorded in, so a repeated run skips
+                        the attachments and assignments already handled
         """
         self.sandbox = is_sandbox
         self.verbose = verbose
-        self.url = 'https://sandbox.toloka.yandex.ru/api/v1/' if is_sandbox else 'https://toloka.yandex.ru/api/v1/'
+        if api_url is None:
+            api_url = 'https://sandbox.toloka.yandex.ru/api/v1/' if is_sandbox else 'https://toloka.yandex.ru/api/v1/'
+        self.url = api_url if api_url.endswith('/') else api_url + '/'
 
         if oauth_token is None:
             input_oauth = input('Please, type in your Yandex.Toloka token: ')
@@ -33,15 +63,27 @@ class TolokaProjectHandler:
         else:
             self.oauth_token = oauth_token
         self.headers = {"Authorization": "OAuth " + self.oauth_token}
+        if session is None:
+            if rate_limiter is None:
+                rate_limiter = shared_limiter(self.oauth_token)
+            session = TolokaSession(self.url, headers=self.headers, timeout=timeout, max_retries=max_retries,
+                                    pool_maxsize=pool_maxsize, metrics=metrics, limiter=rate_limiter or None)
+        if metrics is None:
+            metrics = session.metrics if session.metrics is not None else Metrics()
+        if session.metrics is None:
+            session.metrics = metrics
+        self.session = session
+        self.metrics = metrics
+        self.cache = ResponseCache() if cache is True else (cache or None)
+        self.journal = journal
 
         if project_id is not None:
             self.project_id = project_id
         else:
-            ask_for_project_id = requests.get(self.url + 'projects?limit=300', headers=self.headers)
             available_proj_ids = [[item['id'],
                                    item['status'],
                                    item['public_name'],
-                                   item['created'].split('T')[0]] for item in ask_for_project_id.json()['items']]
+                                   item['created'].split('T')[0]] for item in self.iter_projects()]
             for proj in available_proj_ids:
                 if proj[1] != 'ARCHIVED':
                     print(proj)
@@ -55,22 +97,25 @@ class TolokaProjectHandler:
                     self.project_id = self.create_toloka_project(project_params_data)
                     flag = False
 
-    def create_toloka_project(self, project_params_data=json_data['validating_segmentation']):
+    def create_toloka_project(self, project_params_data=None):
         """
         Creates Toloka project by configuration in a given json-like data
 
-        :param project_params_data: a json-like dictionary of project configurations
+        :param project_params_data: a json-like dictionary of project configurations,
+                                    if None - the 'validating_segmentation' template is used
         :return: ID of a new project
         """
-        response = requests.post(self.url + 'projects', headers=self.headers, json=project_params_data)
+        if project_params_data is None:
+            project_params_data = json_data['validating_segmentation']
+        response = self.session.post('projects', json=project_params_data)
         assert response.ok
-        new_project_id = response.json()['id']
-        if self.verbose:
-            print_json(response.json())
-        print("New project was created. New project id: ", new_project_id)
+        project = response.json()
+        new_project_id = project['id']
+        logger.debug('%s', LazyJson(project))
         output_url = 'https://sandbox.toloka.yandex.ru/requester/project/{}' if self.sandbox \
             else 'https://toloka.yandex.ru/requester/project/{}'
-        print(output_url.format(new_project_id))
+        logger.info('New project was created. New project id: %s\n%s', new_project_id,
+                    output_url.format(new_project_id))
         return new_project_id
 
     def update_toloka_project(self, project_params_data=None):
@@ -80,23 +125,77 @@ class TolokaProjectHandler:
         :param project_params_data: a json-like dictionary of project configurations
         """
         if project_params_data is not None:
-            response = requests.put(self.url + f'projects/{self.project_id}', headers=self.headers,
-                                    json=project_params_data)
+            response = self.session.put(f'projects/{self.project_id}', json=project_params_data)
+            self._cache_written(f'projects/{self.project_id}', response)
             if response.ok:
-                print('The project was successfully updated')
+                logger.info('The project was successfully updated')
 
     def get_project_params(self):
         """
-        Prints out project parameters
+        Logs project parameters
 
         :return: response of the GET-request in a json-like structure
         """
-        response = requests.get(self.url + f'projects/{self.project_id}', headers=self.headers)
-        if self.verbose:
-            print(response)
-        if response.ok:
-            print_json(response.json())
-        return response.json()
+        project = self.get_project()
+        logger.info('%s', LazyJson(project))
+        return project
+
+    def get_project(self, project_id=None):
+        """
+        Returns the project, from the cache if it is enabled
+
+        :param project_id: ID of the project, the handler's project by default
+        """
+        return self._get_object(f'projects/{project_id or self.project_id}')
+
+    def get_pool(self, pool_id):
+        """
+        Returns the pool, from the cache if it is enabled
+        """
+        return self._get_object(f'pools/{pool_id}')
+
+    def get_task_suite(self, task_suite_id):
+        """
+        Returns the task-suite, from the cache if it is enabled
+        """
+        return self._get_object(f'task-suites/{task_suite_id}')
+
+    def _get_object(self, path):
+        """
+        Requests an object by its path. With the cache enabled, fresh entries are served without a request
+        and expired entries having an ETag are revalidated with If-None-Match
+
+        :return: a copy of the json-like object, which can be modified freely
+        """
+        if self.cache is None:
+            return self.session.get(path).json()
+        body = self.cache.get(path)
+        if body is None:
+            entry = self.cache.lookup(path)
+            headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else None
+            response = self.session.get(path, headers=headers)
+            if response.status_code == 304:
+                self.cache.refresh(path)
+                body = entry.body
+            else:
+                body = response.json()
+                if response.ok:
+                    self.cache.put(path, body, response.headers.get('ETag'))
+        return to_plain(body)
+
+    def _cache_written(self, path, response, body=None):
+        """
+        Updates the cache after a write: the object returned by the API replaces the entry,
+        otherwise (e.g. an operation was returned) the entry is dropped
+        """
+        if self.cache is None:
+            return
+        if body is None and response.ok and response.content and response.request.method in ('PUT', 'PATCH'):
+            body = response.json()
+        if isinstance(body, dict) and response.ok and 'id' in body:
+            self.cache.put(path, body, response.headers.get('ETag'))
+        else:
+            self.cache.invalidate(path)
 
     def create_toloka_pool(self, pool_from_json_data=None, **kwargs):
         """
@@ -107,21 +206,20 @@ class TolokaProjectHandler:
         :return: ID of a new pool
         """
         if pool_from_json_data:
-            pool_params = pool_from_json_data
+            pool_params = dict(pool_from_json_data)
             pool_params['project_id'] = self.project_id
             if 'private_name' in kwargs.keys():
                 pool_params['private_name'] = kwargs['private_name']
         else:
             pool_params = PoolCreator(self.project_id, **kwargs).pool
-        response = requests.post(self.url + 'pools', headers=self.headers, json=pool_params)
-        if self.verbose:
-            print(response)
-            print_json(response.json())
-        new_pool_id = response.json()['id']
-        print("New pool was created. New pool id: ", new_pool_id)
+        response = self.session.post('pools', json=pool_params)
+        pool = response.json()
+        logger.debug('%s\n%s', response, LazyJson(pool))
+        new_pool_id = pool['id']
+        self._cache_written(f'pools/{new_pool_id}', response, pool)
         output_url = 'https://sandbox.toloka.yandex.ru/requester/pool/{}' if self.sandbox \
             else 'https://toloka.yandex.ru/requester/pool/{}'
-        print(output_url.format(new_pool_id))
+        logger.info('New pool was created. New pool id: %s\n%s', new_pool_id, output_url.format(new_pool_id))
         if self.project_id is None:
             self.project_id = new_pool_id
         return new_pool_id
@@ -133,106 +231,120 @@ class TolokaProjectHandler:
         :param pool_id: ID of a Toloka pool
         :param pool_from_json_data: a json-like dictionary of pool configurations
         """
-        pool_ids = [int(item[0]) for item in self.get_pools_params()]
-        wanted_json = self.get_pools_params(less_info=False)[pool_ids.index(pool_id)]
+        wanted_json = self.get_pool(pool_id)
         for k, v in pool_from_json_data.items():
             wanted_json[k] = v
-        response = requests.put(self.url + f'pools/{pool_id}', headers=self.headers, json=wanted_json)
+        response = self.session.put(f'pools/{pool_id}', json=wanted_json)
+        self._cache_written(f'pools/{pool_id}', response)
         if response.ok:
-            print('The project was successfully updated')
+            logger.info('The pool was successfully updated')
 
     def get_pools_params(self, pool_id=None, less_info=True, only_current_project=True):
         """
-        Prints and returns either all available pools' parameters or certain pool's parameters (by its ID)
+        Logs and returns either all available pools' parameters or certain pool's parameters (by its ID)
 
-        :param pool_id: ID of the pool, if set than only given pool's parameters are printed and returned
-        :param less_info: if set to True, method prints out only pool's ID, status, name and creation date,
-                            otherwise method prints all the pool parameters
-        :param only_current_project: if set to True, prints out only pools from the current project
-        :return: information for printing
+        :param pool_id: ID of the pool, if set than only given pool's parameters are logged and returned
+        :param less_info: if set to True, method logs only pool's ID, status, name and creation date,
+                            otherwise method logs all the pool parameters
+        :param only_current_project: if set to True, logs only pools from the current project
+        :return: the logged information
         """
         if pool_id is not None:
-            response = requests.get(self.url + f'pools/{pool_id}', headers=self.headers)
-            if self.verbose:
-                print_json(response.json())
-            return response.json()
+            pool = self.get_pool(pool_id)
+            logger.debug('%s', LazyJson(pool))
+            return pool
         else:
-            if only_current_project:
-                response = requests.get(self.url + f'pools?limit=300&sort=id&project_id={self.project_id}',
-                                        headers=self.headers)
+            project_id = self.project_id if only_current_project else None
+            output = [item for item in self.iter_pools(project_id=project_id)
+                      if 'archive' not in item['status'].lower()]
+            if self.cache is not None:
+                for item in output:
+                    self.cache.put(f'pools/{item["id"]}', to_plain(item))
+            if less_info:
+                final_print = [{'Pool ID': item["id"],
+                                'Pool status': item["status"],
+                                'Pool name': item["private_name"],
+                                'Project ID': item["project_id"]} for item in output]
+                logger.info('%s', LazyJson(final_print))
+                return final_print
             else:
-                response = requests.get(self.url + 'pools?limit=300&sort=id', headers=self.headers)
-            if response.ok:
-                output = response.json()['items']
-                if less_info:
-                    to_print = [{'Pool ID': item["id"],
-                                 'Pool status': item["status"],
-                                 'Pool name': item["private_name"],
-                                 'Project ID': item["project_id"]} for item in output]
-                    final_print = []
-                    for item in to_print:
-                        if 'archive' not in item['Pool status'].lower():
-                            final_print.append(item)
-                    print_json(final_print)
-                    return final_print
-                else:
-                    to_print = []
-                    for item in output:
-                        if 'archive' not in item['status'].lower():
-                            to_print.append(item)
-                    print_json(to_print)
-                    return to_print
+                logger.info('%s', LazyJson(output))
+                return output
 
     def open_close_pool(self, pool_id):
         """
         Opens or closes the required pool
 
         :param pool_id: ID of the pool
+        :return: the response of the operation, None if the pool has already been completed
         """
-        pool_params = requests.get(self.url + f'pools/{pool_id}', headers=self.headers).json()
+        pool_params = self.get_pool(pool_id)
         status, reason = pool_params['status'], pool_params.get('last_close_reason')
         req_type = 'open' if status == 'CLOSED' else 'close'
         if reason == 'COMPLETED':
-            print(f'The pool-{pool_id} has already been closed due to completion')
+            logger.info('The pool-%s has already been closed due to completion', pool_id)
             return None
-        response = requests.post(self.url + f'pools/{pool_id}/{req_type}', headers=self.headers)
+        response = self.session.post(f'pools/{pool_id}/{req_type}')
+        self._cache_written(f'pools/{pool_id}', response)
         if response.ok:
-            print(f'Pool {pool_id} | Operation {req_type.upper()} successfully done')
-        try:
-            if self.verbose:
-                print_json(response.json())
-        except json.decoder.JSONDecodeError:
-            print(f'Most likely, operation {req_type.upper()} has already been performed')
+            logger.info('Pool %s | Operation %s successfully done', pool_id, req_type.upper())
+        if not response.content:
+            logger.info('Most likely, operation %s has already been performed', req_type.upper())
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s', LazyJson(response.json()))
+        return response
 
     def create_task_suite(self, pool_id, input_values=None, tasks_on_suite=10):
         """
-        Creates either a Toloka task or a Toloka task-suite by dictionary-stored input values
+        Creates either a Toloka task or a Toloka task-suite by dictionary-stored input values.
+        Many tasks are uploaded in batches, see upload_task_suites
 
         :param pool_id: ID of the pool
-        :param input_values: a list of dictionaries with a certain key-value structure,
+        :param input_values: a list (or any iterable) of dictionaries with a certain key-value structure,
                             check get_project_params method for reference
         :param tasks_on_suite: the number of tasks on one suite
-        :return: ID of a new task-suite
+        :return: ID of a new task-suite, or a list of IDs if several task-suites were created
         """
         if input_values is not None:
-            if len(input_values) <= tasks_on_suite:
+            if isinstance(input_values, (list, tuple)) and len(input_values) <= tasks_on_suite:
                 object_creator = TaskSuiteCreator(pool_id, input_values).task_suite
+                response = self.session.post('task-suites?allow_defaults=true', json=object_creator)
+                task_suite = response.json()
+                logger.debug('%s\n%s', response, LazyJson(task_suite))
+                if response.ok:
+                    logger.info('Task-suite %s successfully created', task_suite['id'])
+                    return task_suite['id']
             else:
-                object_creator = []
-                for chunk in get_chunks(input_values, by_length=True, chunk_length=tasks_on_suite):
-                    chunk_creator = TaskSuiteCreator(pool_id, chunk).task_suite
-                    object_creator.append(chunk_creator)
-            response = requests.post(self.url + f'task-suites?allow_defaults=true', headers=self.headers,
-                                     json=object_creator)
-            if self.verbose:
-                print(response)
-                print_json(response.json())
-            if response.ok:
-                try:
-                    print(f'Task-suite {response.json()["id"]} successfully created')
-                    return response.json()['id']
-                except KeyError:
-                    print('Task-suites successfully created')
+                results = self.upload_task_suites(pool_id, input_values, tasks_on_suite=tasks_on_suite)
+                return [task_suite_id for result in results for task_suite_id in result.task_suite_ids]
+
+    def upload_task_suites(self, pool_id, input_values, tasks_on_suite=10, suites_per_batch=500, max_in_flight=4,
+                           async_mode=True):
+        """
+        Uploads any number of tasks: the input values are consumed lazily and grouped into size-capped batches
+        of task-suites, which are created concurrently as asynchronous operations
+
+        :param pool_id: ID of the pool
+        :param input_values: an iterable (e.g. a generator) of dictionaries with a certain key-value structure
+        :param tasks_on_suite: the number of tasks on one suite
+        :param suites_per_batch: the number of task-suites sent in one request
+        :param max_in_flight: the number of batches uploaded at the same time
+        :param async_mode: if set to True, batches are created as asynchronous operations which are polled
+        :return: a list of BatchResult with the created task-suites' IDs of every batch
+        """
+        uploader = TaskSuiteUploader(self.session, tasks_on_suite=tasks_on_suite, suites_per_batch=suites_per_batch,
+                                     max_in_flight=max_in_flight, async_mode=async_mode)
+        results = []
+        for result in uploader.iter_upload(pool_id, input_values):
+            results.append(result)
+            level = logging.DEBUG if result.status == 'SUCCESS' else logging.WARNING
+            if logger.isEnabledFor(level):
+                logger.log(level, 'Batch %s | %s | %s/%s task-suites, %s tasks created%s', result.batch_number,
+                           result.status, len(result.task_suite_ids), result.suites, result.tasks,
+                           '' if result.error is None else f'\n{LazyJson(result.error)}')
+        logger.info('%s task-suites successfully created in %s batches',
+                    sum(len(result.task_suite_ids) for result in results), len(results))
+        return results
 
     def create_task_suite_from_yadisk_proxy(self, pool_id, yatoken, proxy_name, tasks_on_suite=10):
         """
@@ -244,34 +356,60 @@ class TolokaProjectHandler:
         :param tasks_on_suite: the number of tasks on one suite
         :return: ID of a new task-suite
         """
+        from yadisk import YaDisk
+
         y = YaDisk(token=yatoken)
 
         selection = [{"data": {"p1": {"x": 0.472, "y": 0.413}, "p2": {"x": 0.932, "y": 0.877}}, "type": "rectangle"},
                      {"data": [{"x": 0.143, "y": 0.807}, {"x": 0.317, "y": 0.87}, {"x": 0.511, "y": 0.145},
                                {"x": 0.328, "y": 0.096}, {"x": 0.096, "y": 0.554}], "type": "polygon"}]
 
-        photos = [file.name for file in list(y.listdir(f'Приложения/Toloka.Sandbox/{proxy_name}'))]
-        input_values = [{'image': f'/{proxy_name}/{photo}',
+        photos = [file.name for file in y.listdir(proxy_folder(proxy_name, self.sandbox)) if file.type == 'file']
+        input_values = [{'image': f'/{proxy_name.strip("/")}/{photo}',
                          'selection': selection
                          } for photo in photos]
-        if self.verbose:
-            print(f'Photos from {proxy_name} ({len(input_values)} items): ')
-            print_json(input_values)
+        logger.debug('Photos from %s (%s items):\n%s', proxy_name, len(input_values), LazyJson(input_values))
         task_id = self.create_task_suite(pool_id, input_values=input_values, tasks_on_suite=tasks_on_suite)
         return task_id
 
+    def ingest_yadisk_proxy(self, pool_id, yatoken, proxy_name, manifest_path, tasks_on_suite=10,
+                            compare=CHECKSUM, page_size=1000, input_value=None, root=None, dry_run=False):
+        """
+        Creates tasks only for the files of Ya.Disk proxy-folder which are new or changed since the last ingestion,
+        listing the folder page by page while the tasks of the listed files are uploaded
+
+        :param pool_id: ID of the pool
+        :param yatoken: yadisk token needed for connecting with Yandex.Disk API
+        :param proxy_name: name of proxy defined in Toloka Options
+        :param manifest_path: path of the SQLite manifest of the files already turned into tasks
+        :param tasks_on_suite: the number of tasks on one suite
+        :param compare: 'checksum' to detect changed files by MD5, 'modified' - by modification time and size
+        :param page_size: the number of files requested from Ya.Disk at once
+        :param input_value: function returning the input values of a task by the proxy path of an image,
+                            if None - {'image': path}
+        :param root: Ya.Disk folder of the Toloka application, by default the one of Sandbox or production Toloka
+        :param dry_run: if set to True, the files are only listed and counted
+        :return: IngestReport
+        """
+        from yadisk import YaDisk
+
+        with ProxyManifest(manifest_path) as manifest:
+            ingestor = YaDiskProxyIngestor(self.session, YaDisk(token=yatoken), proxy_name, manifest,
+                                           is_sandbox=self.sandbox, root=root, compare=compare, page_size=page_size,
+                                           input_value=input_value or default_input_value,
+                                           tasks_on_suite=tasks_on_suite)
+            return ingestor.ingest(pool_id, dry_run=dry_run)
+
     def get_toloka_tasks_suites(self, pool_id):
         """
-        Prints all available tasks or task-suites in the project
+        Logs all available tasks or task-suites in the project
 
         :param pool_id: ID of the pool
         :return: a JSON response of GET request, containing task-suites' data
         """
-        response = requests.get(self.url + f'task-suites?pool_id={pool_id}', headers=self.headers)
-        print(response)
-        if response.ok:
-            print_json(response.json())
-        return response.json()
+        task_suites = {'items': list(self.iter_task_suites(pool_id)), 'has_more': False}
+        logger.info('%s', LazyJson(task_suites))
+        return task_suites
 
     def archive_object(self, object_type, object_id):
         """
@@ -280,25 +418,26 @@ class TolokaProjectHandler:
         :param object_type: 'project', 'pool' or 'task-suite'
         :param object_id: ID of the object
         """
-        response = requests.post(self.url + f'{object_type}s/{object_id}/archive', headers=self.headers)
-        if self.verbose:
-            print(response)
-            print_json(response.json())
+        response = self.session.post(f'{object_type}s/{object_id}/archive')
+        self._cache_written(f'{object_type}s/{object_id}', response)
+        body = response.json() if response.content else None
+        logger.debug('%s\n%s', response, LazyJson(body))
         if response.ok:
-            print(f'Your object: {object_type}-{object_id} successfully archived')
+            logger.info('Your object: %s-%s successfully archived', object_type, object_id)
         elif response.status_code == 409:
-            if response.json()['code'] == 'UNARCHIVED_POOLS_CONFLICT':
-                pools = self.get_pools_params()
-                for pool in pools:
-                    if pool['Pool status'] == 'OPEN':
-                        self.open_close_pool(pool['Pool ID'])
-                    self.process_all_tasks(pool['Pool ID'], action='accept')
-                    self.archive_object('pool', pool['Pool ID'])
+            if body['code'] == 'UNARCHIVED_POOLS_CONFLICT':
+                # Only the project's own unarchived pools are listed, in one filtered request
+                for pool in list(self.iter_pools(project_id=object_id, status=['OPEN', 'CLOSED'])):
+                    if pool['status'] == 'OPEN':
+                        closed = self.session.post(f'pools/{pool["id"]}/close')
+                        self._cache_written(f'pools/{pool["id"]}', closed)
+                    self.process_all_tasks(pool['id'], action='accept')
+                    self.archive_object('pool', pool['id'])
                 self.archive_object(object_type, object_id)
-            elif response.json()['code'] == 'SUBMITTED_ASSIGNMENTS_CONFLICT':
+            elif body['code'] == 'SUBMITTED_ASSIGNMENTS_CONFLICT':
                 self.process_all_tasks(object_id, 'accept')
                 self.archive_object(object_type, object_id)
-            elif response.json()['code'] == 'THERE_IS_REJECTED_ASSIGNMENT':
+            elif body['code'] == 'THERE_IS_REJECTED_ASSIGNMENT':
                 self.process_all_tasks(object_id, 'accept')
                 self.archive_object(object_type, object_id)
 
@@ -314,11 +453,11 @@ class TolokaProjectHandler:
             js = {'overlap': overlap, 'infinite_overlap': 'false'}
         elif infinite_overlap:
             js = {'overlap': 'null', 'infinite_overlap': 'true'}
-        response = requests.patch(self.url + f'task-suites/{task_suite_id}', json=js, headers=self.headers)
-        if self.verbose:
-            print(response)
-            print_json(response.json())
-        print(f'Overlap in task-suite {task_suite_id} successfully changed')
+        response = self.session.patch(f'task-suites/{task_suite_id}', json=js)
+        self._cache_written(f'task-suites/{task_suite_id}', response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s\n%s', response, LazyJson(response.json()))
+        logger.info('Overlap in task-suite %s successfully changed', task_suite_id)
 
     def stop_showing_task_suite(self, task_suite_id):
         """
@@ -326,112 +465,311 @@ class TolokaProjectHandler:
 
         :param task_suite_id: ID of the task-suite
         """
-        response = requests.patch(self.url + f'task-suites/{task_suite_id}/set-overlap-or-min', headers=self.headers,
-                             json={'overlap': 0})
-        if self.verbose:
-            print(response)
-            print_json(response.json())
+        response = self.session.patch(f'task-suites/{task_suite_id}/set-overlap-or-min', json={'overlap': 0})
+        self._cache_written(f'task-suites/{task_suite_id}', response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s\n%s', response, LazyJson(response.json()))
         if response.ok:
-            print(f'Task-suite {task_suite_id} successfully stopped')
+            logger.info('Task-suite %s successfully stopped', task_suite_id)
 
     def get_answers(self, pool_id):
         """
-        Prints out all the answers of the given pool
+        Logs all the answers of the given pool
 
         :param pool_id: ID of the pool
         :return: a json-like response
         """
-        response = requests.get(self.url + f'assignments?pool_id={pool_id}', headers=self.headers)
-        if response.ok:
-            if self.verbose:
-                print(response)
-                print_json(response.json())
-            return response.json()
+        answers = {'items': list(self.iter_assignments(pool_id)), 'has_more': False}
+        logger.debug('%s', LazyJson(answers))
+        return answers
 
-    def get_files_from_pool(self, pool_id, download_folder_name, reject_errors=False):
+    def export_answers(self, pool_id, path=None, status=None, chunk_size=10000, state_path=None, cursor_field=None):
         """
-        Downloads all the files from the pool into a folder
+        Exports the answers of the pool as a table with a row per task: the assignment's fields,
+        INPUT:<name> and OUTPUT:<name> columns typed by the project's specification.
+        Assignments are requested page by page and converted in chunks
 
-        :param reject_errors: reject the task if no photo was uploaded
         :param pool_id: ID of the pool
-        :param download_folder_name: name of a directory to download all the files into
-        :return: photo data dictionary {assignment ID: {image ID: str, image name: str, is duplicate: bool}}
+        :param path: a Parquet dataset directory to append the assignments exported since the previous export to,
+                     if None - all the answers are returned as a pandas DataFrame
+        :param status: status or a list of statuses to export, e.g. 'ACCEPTED', if None - all the assignments
+        :param chunk_size: the number of rows converted at once, also the size of Parquet row groups
+        :param state_path: path of the JSON state file of the export, by default inside the dataset directory
+        :param cursor_field: the field incremental exports are continued from, if None - 'id' for all the assignments
+                             and the time of the status (e.g. 'accepted') for the filtered ones
+        :return: a DataFrame, or ExportReport if path is given
         """
-        response = requests.get(self.url + f'assignments?pool_id={pool_id}&limit=100', headers=self.headers)
-        if response.ok:
-            if self.verbose:
-                print(response)
-                print_json(response.json())
-            photo_data = {}
-            assignments = response.json()['items']
-            for assignment in assignments:
-                output_values = assignment['solutions'][0]['output_values']
-                if output_values['no_image']:
-                    photo_data[assignment['id']] = None
-                else:
-                    photo_data[assignment['id']] = {'image_id': output_values['image'],
-                                                    'image_name': None,
-                                                    'is_duplicate': False}
-
-            for key in photo_data:
-                if photo_data.get(key) is None:
-                    if reject_errors:
-                        self.process_task(key, 'reject', 'no photo uploaded')
-                else:
-                    image_response = requests.get(self.url + f'attachments/{photo_data[key]["image_id"]}',
-                                                  headers=self.headers)
-                    photo_data[key]['image_name'] = image_response.json()['name']
+        from autotoloka.export import AssignmentExporter
 
-            unique_file_names = {}
+        exporter = AssignmentExporter(self, pool_id, status=status, chunk_size=chunk_size, cursor_field=cursor_field)
+        if path is None:
+            return exporter.to_dataframe()
+        return exporter.to_parquet(path, state_path=state_path)
 
-            # Making sure that there will be no files with identical names
-            for key in photo_data:
-                if photo_data[key] is not None:
-                    file_name = photo_data[key]['image_name']
-                    if file_name[:-4] not in unique_file_names.keys():
-                        unique_file_names[file_name[:-4]] = 1
-                    else:
-                        new_file_name = f'{file_name[:-4]}_{unique_file_names[file_name[:-4]] + 1}.jpg'
-                        photo_data[key]['image_name'] = new_file_name
-                        unique_file_names[file_name[:-4]] += 1
+    def aggregate_answers(self, pool_id, field, method='dawid_skene', status=('SUBMITTED', 'ACCEPTED'), **kwargs):
+        """
+        Combines the overlapping answers of the pool's tasks into one label per task
 
-            download_path = os.path.join(os.getcwd(), download_folder_name)
+        :param pool_id: ID of the pool
+        :param field: name of the output value to aggregate
+        :param method: 'majority_vote', 'weighted_majority' or 'dawid_skene'
+        :param status: status or a list of statuses of the assignments to aggregate
+        :param kwargs: keyword arguments of the aggregation method
+        :return: Aggregation with the tasks' labels and confidence and the workers' skills
+        """
+        from autotoloka.aggregation import aggregate, answers_from_assignments
 
-            if download_folder_name not in os.listdir(os.getcwd()):
-                os.mkdir(download_folder_name)
-                print(f'Directory {download_folder_name} created')
+        status = [status] if isinstance(status, str) else list(status)
+        answers = answers_from_assignments(self.iter_assignments(pool_id, status=status, prefetch=True), field)
+        result = aggregate(answers, method, **kwargs)
+        logger.info('%s answers of %s workers aggregated into labels of %s tasks', len(answers.label_codes),
+                    len(result.workers), len(result.tasks))
+        return result
 
-            print('Downloading files ... ')
+    def iter_projects(self, status=None, page_size=300, prefetch=False):
+        """
+        Lazily iterates over all the projects, requesting them page by page
 
-            for key in tqdm(photo_data, ncols=100, colour='green', desc='Photo data processed'):
-                if photo_data[key] is not None:
-                    file_id = photo_data[key]['image_id']
-                    download = requests.get(self.url + f'attachments/{file_id}/download', headers=self.headers)
-                    with open(os.path.join(download_path, photo_data[key]["image_name"]), 'wb') as file:
-                        file.write(download.content)
+        :param status: status or a list of statuses to filter the projects by
+        :param page_size: the number of projects requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is consumed
+        :return: a generator of projects' json-like dictionaries
+        """
+        return iter_items(self.session, 'projects', {'status': status}, page_size=page_size, prefetch=prefetch)
 
+    def iter_pools(self, project_id=None, status=None, page_size=300, prefetch=False):
+        """
+        Lazily iterates over all the pools, requesting them page by page
 
-            print(f'All files from pool-{pool_id} successfully downloaded into {download_path}')
-            if self.verbose:
-                print_json(photo_data)
-            return photo_data
+        :param project_id: ID of the project to filter the pools by, if None - pools of all the projects are given
+        :param status: status or a list of statuses to filter the pools by
+        :param page_size: the number of pools requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is consumed
+        :return: a generator of pools' json-like dictionaries
+        """
+        params = {'project_id': project_id, 'status': status}
+        return iter_items(self.session, 'pools', params, page_size=page_size, prefetch=prefetch)
 
-    def process_all_tasks(self, pool_id, action='accept'):
+    def iter_task_suites(self, pool_id, page_size=1000, prefetch=False, **filters):
         """
-        Processes all the assignments in a given pool, accepting or rejecting them
+        Lazily iterates over all the task-suites of the pool, requesting them page by page
 
-        :param action: either 'accept' or 'reject'
         :param pool_id: ID of the pool
+        :param page_size: the number of task-suites requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is consumed
+        :param filters: additional filters of the API, e.g. created_gte='2021-01-01T00:00:00'
+        :return: a generator of task-suites' json-like dictionaries
+        """
+        params = dict(filters, pool_id=pool_id)
+        return iter_items(self.session, 'task-suites', params, page_size=page_size, prefetch=prefetch)
+
+    def iter_assignments(self, pool_id, status=None, page_size=1000, prefetch=False, cursor_field='id', **filters):
+        """
+        Lazily iterates over all the assignments of the pool, requesting them page by page
+
+        :param pool_id: ID of the pool
+        :param status: status or a list of statuses to filter the assignments by, e.g. ['SUBMITTED', 'REJECTED']
+        :param page_size: the number of assignments requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is consumed
+        :param cursor_field: the field the assignments are sorted by (then by id) and continued from, e.g. 'submitted'
+        :param filters: additional filters of the API, e.g. submitted_gte='2021-01-01T00:00:00'
+        :return: a generator of assignments' json-like dictionaries
+        """
+        params = dict(filters, pool_id=pool_id, status=status)
+        return iter_items(self.session, 'assignments', params, page_size=page_size, prefetch=prefetch,
+                          cursor_field=cursor_field)
+
+    def iter_attachments(self, pool_id=None, page_size=1000, prefetch=False, **filters):
+        """
+        Lazily iterates over the attachments' metadata, requesting them page by page
+
+        :param pool_id: ID of the pool to filter the attachments by
+        :param page_size: the number of attachments requested per page
+        :param prefetch: if set to True, the next page is requested while the current one is consumed
+        :param filters: additional filters of the API, e.g. assignment_id='...'
+        :return: a generator of attachments' json-like dictionaries
+        """
+        params = dict(filters, pool_id=pool_id)
+        return iter_items(self.session, 'attachments', params, page_size=page_size, prefetch=prefetch)
+
+    def get_files_from_pool(self, pool_id, download_folder_name, reject_errors=False, max_workers=None):
+        """
+        Downloads all the files from the pool into a folder.
+        Files already present in the folder are skipped, so an interrupted run can be repeated
+
+        :param reject_errors: reject the task if no photo was uploaded
+        :param pool_id: ID of the pool
+        :param download_folder_name: name of a directory to download all the files into
+        :param max_workers: the number of concurrent downloads,
+                            if None - the bound of the rate limiter's adaptive concurrency
+        :return: photo data dictionary {assignment ID: {image ID: str, image name: str, is duplicate: bool}}
         """
-        assignments = requests.get(self.url + f'assignments?pool_id={pool_id}', headers=self.headers).json()
-        assignment_ids = [item['id'] for item in assignments['items']]
-        assignment_statuses = [item['status'] for item in assignments['items']]
-        for i, assignment_id in enumerate(assignment_ids):
-            if assignment_statuses[i] == 'SUBMITTED':
-                self.process_task(assignment_id, action)
+        photo_data = self._get_photo_data(pool_id, reject_errors)
+        download_path = self._prepare_download_path(download_folder_name)
+
+        logger.info('Downloading files ... ')
+
+        downloader = AttachmentDownloader(self.session, max_workers=max_workers, journal=self.journal)
+        report = downloader.download(((item['image_id'], item['image_name'])
+                                      for item in photo_data.values() if item is not None),
+                                     download_path, desc='Photo data processed')
+        logger.info('Files from pool-%s downloaded into %s: %s', pool_id, download_path, describe_report(report))
+        if report.failed and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s', LazyJson([result._asdict() for result in report.results if result.error is not None]))
+        logger.debug('%s', LazyJson(photo_data))
+        return photo_data
+
+    def collect_files_from_pool(self, pool_id, download_folder_name, hash_index_path=None, max_distance=10,
+                                reject_duplicates=True, accept_uniques=True, reject_errors=False, max_workers=None,
+                                requests_per_second=None, progress=True, hash_index=None):
+        """
+        Downloads all the files from the pool, checking every image for duplicates while it is downloaded.
+        Duplicates are never written to disk, and the review of every assignment is sent as soon as
+        its image is checked, while the rest of the files are still downloading
+
+        :param pool_id: ID of the pool
+        :param download_folder_name: name of a directory to download the unique files into
+        :param hash_index_path: path of a persistent HashIndex, if None - images are only checked against each other
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :param reject_duplicates: if set to True, rejects tasks where duplicates were provided
+        :param accept_uniques: if set to True, accepts tasks with uniques
+        :param reject_errors: reject the task if no photo was uploaded
+        :param max_workers: the number of concurrent downloads and the number of concurrent review requests,
+                            if None - the bound of the rate limiter's adaptive concurrency
+        :param requests_per_second: the maximum rate of review requests, if None - the rate is not limited
+        :param progress: if set to True, shows a progress bar of the downloads
+        :param hash_index: an open HashIndex to check the images against, overrides hash_index_path;
+                           it is left open, so it can be shared by several collections
+        :return: a pair of the photo data dictionary (as in get_files_from_pool, with 'is_downloaded' telling
+                 whether the unique image is on disk) and a list of ReviewResult
+        """
+        from autotoloka.hash_index import HashIndex
+
+        photo_data = self._get_photo_data(pool_id, reject_errors)
+        download_path = self._prepare_download_path(download_folder_name)
+        assignment_ids = {item['image_id']: key for key, item in photo_data.items() if item is not None}
+        for item in photo_data.values():
+            if item is not None:
+                item['is_downloaded'] = False
+        downloaded = []
+
+        def decisions(results):
+            comment = "It seems that this image's duplicate has already been provided by someone else"
+            for result in results:
+                downloaded.append(result)
+                assignment_id = assignment_ids[result.attachment_id]
+                photo_data[assignment_id]['is_downloaded'] = result.status in (DOWNLOADED, SKIPPED)
+                if result.status == DUPLICATE:
+                    photo_data[assignment_id]['is_duplicate'] = True
+                    if reject_duplicates:
+                        yield assignment_id, 'reject', comment
+                elif result.status in (DOWNLOADED, SKIPPED) and accept_uniques:
+                    yield assignment_id, 'accept', 'Well done!'
+
+        logger.info('Downloading and checking files ... ')
+        started = time.monotonic()
+        with nullcontext(hash_index) if hash_index is not None else HashIndex(hash_index_path or ':memory:') as index:
+            downloader = AttachmentDownloader(self.session, max_workers=max_workers, journal=self.journal)
+            results = downloader.iter_download(((item['image_id'], item['image_name'])
+                                                for item in photo_data.values() if item is not None),
+                                               download_path, progress=progress, desc='Photo data processed',
+                                               hash_index=index, max_distance=max_distance)
+            reviewer = BulkReviewer(self.session, max_workers=max_workers, requests_per_second=requests_per_second,
+                                    journal=self.journal)
+            reviews = reviewer.review(decisions(results))
+        report = summarize(downloaded, time.monotonic() - started)
+        logger.info('Files from pool-%s downloaded into %s: %s', pool_id, download_path, describe_report(report))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s', LazyJson([result._asdict() for result in downloaded if result.status != DOWNLOADED]))
+        return photo_data, reviews
+
+    def _get_photo_data(self, pool_id, reject_errors=False):
+        """
+        Collects the uploaded images of the pool's assignments, giving them unique file names
+
+        :param pool_id: ID of the pool
+        :param reject_errors: reject the task if no photo was uploaded
+        :return: photo data dictionary {assignment ID: {image ID: str, image name: str, is duplicate: bool}}
+        """
+        photo_data = {}
+        for assignment in self.iter_assignments(pool_id, prefetch=True):
+            output_values = assignment['solutions'][0]['output_values']
+            if output_values['no_image']:
+                photo_data[assignment['id']] = None
             else:
-                if assignment_statuses[i] == 'REJECTED' and action == 'accept':
-                    self.process_task(assignment_id, action)
+                photo_data[assignment['id']] = {'image_id': output_values['image'],
+                                                'image_name': None,
+                                                'is_duplicate': False}
+
+        if reject_errors:
+            self.review_assignments((key, 'reject', 'no photo uploaded')
+                                    for key in photo_data if photo_data[key] is None)
+
+        # Attachments' names are listed for the whole pool at once and joined to the assignments in memory
+        wanted = {item['image_id']: item for item in photo_data.values() if item is not None}
+        for attachment in self.iter_attachments(pool_id, prefetch=True):
+            if attachment['id'] in wanted:
+                wanted[attachment['id']]['image_name'] = attachment['name']
+        for image_id, item in wanted.items():
+            if item['image_name'] is None:
+                item['image_name'] = self.session.get(f'attachments/{image_id}').json()['name']
+
+        # Making sure that there will be no files with identical names
+        named = [item for item in photo_data.values() if item is not None]
+        for item, file_name in zip(named, unique_file_names(item['image_name'] for item in named)):
+            item['image_name'] = file_name
+        return photo_data
+
+    @staticmethod
+    def _prepare_download_path(download_folder_name):
+        download_path = os.path.join(os.getcwd(), download_folder_name)
+        if not os.path.isdir(download_path):
+            os.makedirs(download_path)
+            logger.info('Directory %s created', download_folder_name)
+        return download_path
+
+    def process_all_tasks(self, pool_id, action='accept', max_workers=None, requests_per_second=None):
+        """
+        Processes all the assignments in a given pool, accepting or rejecting them
+
+        :param action: either 'accept' or 'reject'
+        :param pool_id: ID of the pool
+        :param max_workers: the number of concurrent requests,
+                            if None - the bound of the rate limiter's adaptive concurrency
+        :param requests_per_second: the maximum rate of requests, if None - the rate is not limited
+        :return: a list of ReviewResult, one per processed assignment
+        """
+        statuses = ['SUBMITTED', 'REJECTED'] if action == 'accept' else 'SUBMITTED'
+        items = ((assignment['id'], action)
+                 for assignment in self.iter_assignments(pool_id, status=statuses, prefetch=True))
+        results = self.review_assignments(items, max_workers=max_workers, requests_per_second=requests_per_second)
+        logger.info('Pool %s | %s assignments processed: %s %sed, %s already processed, %s failed',
+                    pool_id, len(results), sum(result.status == OK for result in results), action,
+                    sum(result.status == ALREADY_PROCESSED for result in results),
+                    sum(result.status not in (OK, ALREADY_PROCESSED) for result in results))
+        return results
+
+    def review_assignments(self, items, max_workers=None, requests_per_second=None):
+        """
+        Accepts or rejects many assignments concurrently
+
+        :param items: an iterable of (assignment ID, action, public comment) tuples, the comment may be omitted
+        :param max_workers: the number of concurrent requests,
+                            if None - the bound of the rate limiter's adaptive concurrency
+        :param requests_per_second: the maximum rate of requests, if None - the rate is not limited
+        :return: a list of ReviewResult with the status 'ok', 'already_processed' or 'failed' for every item
+        """
+        reviewer = BulkReviewer(self.session, max_workers=max_workers, requests_per_second=requests_per_second,
+                                journal=self.journal)
+        results = reviewer.review(items)
+        if logger.isEnabledFor(logging.WARNING):
+            sampler = LogSampler()
+            for result in results:
+                if result.status not in (OK, ALREADY_PROCESSED) and sampler():
+                    logger.warning('Review failed: %s', result)
+            if sampler.skipped:
+                logger.warning('%s more reviews failed', sampler.skipped)
+        return results
 
     def process_task(self, assignment_id, action='accept', public_comment='generic comment'):
         """
@@ -440,24 +778,22 @@ class TolokaProjectHandler:
         :param public_comment: public comment for the user whose task is accepted/rejected
         :param action: either 'accept' or 'reject'
         :param assignment_id: ID of the assignment
-        """
-        assignment_options = {'accept': {'status': 'ACCEPTED',
-                                         'public_comment': public_comment},
-                              'reject': {'status': 'REJECTED',
-                                         'public_comment': public_comment}}
-        patch_params = assignment_options[action]
-        response = requests.patch(self.url + f'assignments/{assignment_id}', headers=self.headers, json=patch_params)
-        if response.ok:
-            print(f'Assignment {assignment_id} successfully {action}ed with public comment: {public_comment}')
-        elif response.status_code == 409 and response.json()['code'] == 'INAPPROPRIATE_STATUS':
-            print(f'Probably, the assignment {assignment_id} has already been {action}ed')
+        :return: ReviewResult of the assignment
+        """
+        result = review_assignment(self.session, assignment_id, action, public_comment)
+        if result.status == OK:
+            logger.info('Assignment %s successfully %sed with public comment: %s', assignment_id, action,
+                        public_comment)
+        elif result.status == ALREADY_PROCESSED:
+            logger.info('Probably, the assignment %s has already been %sed', assignment_id, action)
         else:
-            if self.verbose:
-                print(response)
-                print_json(response.json())
+            logger.warning('Assignment %s was not %sed: %s\n%s', assignment_id, action, result.status_code,
+                           LazyJson(result.error))
+        return result
 
     def check_photos_for_duplicates(self, image_folder, reject_duplicates=False,
-                                    accept_uniques=False, photo_data=None):
+                                    accept_uniques=False, photo_data=None, max_workers=None,
+                                    requests_per_second=None, hash_index_path=None):
         """
         Checks uploaded photos for duplicates and processes tasks based on the CNN results
 
@@ -465,23 +801,44 @@ class TolokaProjectHandler:
         :param reject_duplicates: if set to True, rejects tasks where duplicates were provided
         :param accept_uniques: if set to True, accepts tasks with uniques
         :param photo_data: photo data dictionary from get_files_from_pool function
-        """
-        print('Checking for duplicates ...')
-        images_to_reject = check_for_duplicates(image_folder)
-        if self.verbose:
-            print_json(images_to_reject)
+        :param max_workers: the number of concurrent review requests,
+                            if None - the bound of the rate limiter's adaptive concurrency
+        :param requests_per_second: the maximum rate of review requests, if None - the rate is not limited
+        :param hash_index_path: path of a persistent HashIndex, if set - images are also checked against
+                                the images collected in earlier runs
+        :return: a list of ReviewResult of the processed assignments
+        """
+        logger.info('Checking for duplicates ...')
+        with self.metrics.stage('dedup'):
+            images_to_reject = set(check_for_duplicates(image_folder, hash_index_path=hash_index_path))
+        if self.journal is not None:
+            # The duplicates are deleted: they are recorded as such, so a resumed run neither downloads them again
+            # nor takes them for uniques
+            for item in photo_data.values():
+                if item is None:
+                    continue
+                if item['image_name'] in images_to_reject:
+                    self.journal.record_download(DownloadResult(item['image_id'], item['image_name'], DUPLICATE, 0,
+                                                                None))
+                else:
+                    recorded = self.journal.download_result(item['image_id'])
+                    if recorded is not None and recorded.status == DUPLICATE:
+                        images_to_reject.add(item['image_name'])
+        logger.debug('%s', LazyJson(sorted(images_to_reject)))
+        items = []
         for key in photo_data:
             if photo_data[key] is not None:
                 if photo_data[key]['image_name'] in images_to_reject:
                     if reject_duplicates:
                         photo_data[key]['is_duplicate'] = True
                         comment = "It seems that this image's duplicate has already been provided by someone else"
-                        self.process_task(key, action='reject', public_comment=comment)
+                        items.append((key, 'reject', comment))
                 else:
                     if accept_uniques:
-                        self.process_task(key, 'accept', 'Well done!')
-            if self.verbose:
-                print_json(photo_data)
+                        items.append((key, 'accept', 'Well done!'))
+        logger.debug('%s', LazyJson(photo_data))
+        with self.metrics.stage('review'):
+            return self.review_assignments(items, max_workers=max_workers, requests_per_second=requests_per_second)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from autotoloka.hashing import hash_images
+
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp'})
+HASH_BITS = 64
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    Returns the SHA-256 hex digest of a file's content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class BKTree:
+    """
+    Creates a Burkhard-Keller tree over integer hashes, answering Hamming-radius queries
+    without comparing the query against every stored hash
+    """
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, key):
+        """
+        Adds a hash to the tree
+
+        :param value: integer hash
+        :param key: identifier returned by queries for the hash
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def query(self, value, max_distance):
+        """
+        Returns all the stored hashes within the radius
+
+        :param value: integer hash
+        :param max_distance: the maximum Hamming distance
+        :return: a list of (distance, key) pairs
+        """
+        found = []
+        if self.root is None:
+            return found
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, key) for key in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+class HashIndex:
+    """
+    Creates a persistent index of perceptual hashes, keyed by the digest of the files' content.
+    Only images which were never seen before are encoded, and near-duplicate queries use a BK-tree.
+    Exact-content lookups are answered by SQLite, the tree is built on the first near-duplicate query,
+    so opening the index and checking already indexed images do not read the whole corpus.
+    One instance may be shared by threads, e.g. by concurrent collections using the same index file
+    """
+    def __init__(self, path=':memory:', encoder=None, max_workers=None):
+        """
+        Instantiates a HashIndex class
+
+        :param path: path of the SQLite file the index is kept in, ':memory:' for a temporary index
+        :param encoder: function returning the integer hash of an image file, or None for undecodable files;
+                        by default hashing.phash_file is used on a process pool
+        :param max_workers: the number of processes encoding images, by default the number of CPUs
+        """
+        self.path = path
+        self.encoder = encoder
+        self.max_workers = max_workers
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS images (
+                digest TEXT PRIMARY KEY,
+                hash INTEGER NOT NULL,
+                source TEXT,
+                added REAL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                digest TEXT
+            );
+        ''')
+        self._tree = None
+
+    @property
+    def tree(self):
+        """
+        BKTree of all the indexed hashes with (digest, source) keys, read from the database on first access
+        """
+        with self.lock:
+            if self._tree is None:
+                tree = BKTree()
+                for digest, value, source in self.connection.execute('SELECT digest, hash, source FROM images'):
+                    tree.add(_to_unsigned(value), (digest, source))
+                self._tree = tree
+            return self._tree
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def digest_of(self, path):
+        """
+        Returns the content digest of a file, reusing the stored one if the file's size and mtime didn't change
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, digest FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = file_digest(path)
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime, digest))
+        return digest
+
+    def _lookup(self, digest):
+        # Returns a 1-tuple (source,) of an indexed digest, or None
+        with self.lock:
+            return self.connection.execute('SELECT source FROM images WHERE digest = ?', (digest,)).fetchone()
+
+    def contains(self, digest):
+        return self._lookup(digest) is not None
+
+    def add(self, digest, value, source=None):
+        """
+        Adds a hash to the index, nothing is done if the digest is already there
+
+        :param digest: content digest of the image
+        :param value: integer perceptual hash
+        :param source: description of where the image came from (e.g. its path)
+        """
+        with self.lock:
+            cursor = self.connection.execute('INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?)',
+                                             (digest, _to_signed(value), source, time.time()))
+            if cursor.rowcount and self._tree is not None:
+                self._tree.add(value, (digest, source))
+
+    def find(self, value, max_distance=10):
+        """
+        Finds the indexed images within the Hamming radius of the hash
+
+        :param value: integer perceptual hash
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: a list of (distance, digest, source) sorted by distance
+        """
+        with self.lock:
+            found = self.tree.query(value, max_distance)
+            return sorted((distance, digest, source) for distance, (digest, source) in found)
+
+    def check(self, digest, value, source=None, max_distance=10):
+        """
+        Checks an image against the index and adds it if it is unique
+
+        :param digest: content digest of the image
+        :param value: integer perceptual hash
+        :param source: description of where the image came from
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: source of the earlier image it duplicates, or None if the image is unique
+        """
+        with self.lock:
+            row = self._lookup(digest)
+            if row is not None:
+                earlier = row[0]
+                return None if earlier == source else earlier
+            found = self.find(value, max_distance)
+            if found:
+                return found[0][2]
+            self.add(digest, value, source)
+            return None
+
+    def encode(self, paths):
+        """
+        Returns the perceptual hashes of the image files, None for the files which can't be decoded
+        """
+        if self.encoder is not None:
+            return [self.encoder(path) for path in paths]
+        hashes, valid = hash_images(paths, max_workers=self.max_workers)
+        return [int(value) if ok else None for value, ok in zip(hashes, valid)]
+
+    def check_folder(self, image_folder, max_distance=10):
+        """
+        Checks the images of a folder against everything indexed before and against each other.
+        Only images with unseen content are encoded, the unique ones are added to the index
+
+        :param image_folder: folder with the images
+        :param max_distance: the maximum Hamming distance for images to be considered duplicates
+        :return: a dictionary {file name: source of the earlier image} of the duplicates found
+        """
+        files = []
+        for file_name in sorted(os.listdir(image_folder)):
+            path = os.path.join(image_folder, file_name)
+            if os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(path):
+                files.append((file_name, os.path.abspath(path), self.digest_of(path)))
+
+        # Files with the same content are encoded once
+        new_files = {}
+        for _, source, digest in files:
+            if not self.contains(digest):
+                new_files.setdefault(digest, source)
+        values = dict(zip(new_files, self.encode(list(new_files.values()))))
+
+        duplicates = {}
+        for file_name, source, digest in files:
+            value = values.get(digest)
+            if value is None and not self.contains(digest):
+                continue
+            earlier = self.check(digest, value, source, max_distance)
+            if earlier is not None:
+                duplicates[file_name] = earlier
+        self.commit()
+        return duplicates
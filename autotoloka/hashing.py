@@ -0,0 +1,87 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+HASH_SIZE = 8
+IMAGE_SIZE = 32
+
+
+def _dct_matrix(n):
+    """
+    Returns the matrix of the (unnormalized) DCT-II, so that dct(x) == matrix @ x
+    """
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    return 2 * np.cos(np.pi * k * (2 * i + 1) / (2 * n))
+
+
+DCT_MATRIX = _dct_matrix(IMAGE_SIZE)
+BIT_WEIGHTS = np.left_shift(np.uint64(1), np.arange(HASH_SIZE * HASH_SIZE - 1, -1, -1, dtype=np.uint64))
+
+
+def phash_image(image):
+    """
+    Returns the 64-bit perceptual hash of a PIL image, computed the same way as imagededup's PHash:
+    a 32x32 grayscale thumbnail, its 2D DCT, and the low 8x8 frequencies compared against their median.
+    Because of the reduced JPEG decoding, a few bits may differ from imagededup's hash of the same file,
+    so a HashIndex should be filled by one encoder only
+
+    :param image: PIL.Image
+    :return: integer hash
+    """
+    # For JPEGs the decoder is asked for the smallest scale (1/2, 1/4 or 1/8) which is still bigger
+    # than the thumbnail, so full-resolution photos are never fully decoded
+    image.draft('RGB', (IMAGE_SIZE * 2, IMAGE_SIZE * 2))
+    if image.mode != 'RGB':
+        image = image.convert('RGBA').convert('RGB')
+    thumbnail = image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS).convert('L')
+    pixels = np.asarray(thumbnail, dtype=np.float64)
+    dct = DCT_MATRIX @ pixels @ DCT_MATRIX.T
+    low = dct[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low >= np.median(low[1:])
+    return int(BIT_WEIGHTS[bits].sum(dtype=np.uint64))
+
+
+def phash_file(path):
+    """
+    Returns the perceptual hash of an image file, or None if the file can't be decoded
+    """
+    try:
+        with Image.open(path) as image:
+            return phash_image(image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def phash_bytes(data):
+    """
+    Returns the perceptual hash of an encoded image held in memory, or None if it can't be decoded
+    """
+    return phash_file(io.BytesIO(data))
+
+
+def hash_images(paths, max_workers=None, chunksize=32, min_parallel=64):
+    """
+    Computes perceptual hashes of many image files, spreading the decoding across a process pool
+
+    :param paths: a list of paths of image files
+    :param max_workers: the number of processes, by default the number of CPUs
+    :param chunksize: the number of files sent to a process at once
+    :param min_parallel: fewer files than this are hashed in the current process
+    :return: a pair of NumPy arrays: uint64 hashes and a boolean mask of the files which were decoded
+    """
+    paths = list(paths)
+    if len(paths) < min_parallel or max_workers == 1:
+        values = [phash_file(path) for path in paths]
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, min(chunksize, len(paths) // max_workers))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            values = list(executor.map(phash_file, paths, chunksize=chunksize))
+    valid = np.array([value is not None for value in values], dtype=bool)
+    hashes = np.array([value or 0 for value in values], dtype=np.uint64)
+    return hashes, valid
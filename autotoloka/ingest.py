@@ -0,0 +1,199 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+from autotoloka.upload import TaskSuiteUploader, SUCCESS
+
+
+logger = logging.getLogger(__name__)
+
+# Ya.Disk folders of the Toloka applications, proxies are defined relative to them
+PROXY_ROOTS = {True: 'Приложения/Toloka.Sandbox', False: 'Приложения/Toloka'}
+
+CHECKSUM = 'checksum'
+MODIFIED = 'modified'
+
+NEW = 'new'
+CHANGED = 'changed'
+
+ProxyFile = namedtuple('ProxyFile', ['name', 'image', 'fingerprint', 'kind'])
+IngestReport = namedtuple('IngestReport', ['listed', 'new', 'changed', 'unchanged', 'uploaded', 'failed', 'batches'])
+
+
+def proxy_folder(proxy_name, is_sandbox=True, root=None):
+    """
+    Returns the Ya.Disk path of the proxy's folder
+
+    :param proxy_name: name of proxy defined in Toloka Options, possibly with a subfolder
+    :param is_sandbox: if set to True, the folder of Sandbox Toloka is used
+    :param root: Ya.Disk folder of the Toloka application, overrides is_sandbox
+    """
+    root = PROXY_ROOTS[bool(is_sandbox)] if root is None else root
+    return f'{root.rstrip("/")}/{proxy_name.strip("/")}'
+
+
+def fingerprint(resource, compare=CHECKSUM):
+    """
+    Returns the string identifying the version of a Ya.Disk file: its MD5 checksum,
+    or its modification time and size (also used when the checksum is not given)
+    """
+    if compare == CHECKSUM and getattr(resource, 'md5', None):
+        return resource.md5
+    modified = resource.modified.isoformat() if hasattr(resource.modified, 'isoformat') else resource.modified
+    return f'{modified}|{resource.size}'
+
+
+def default_input_value(image):
+    return {'image': image}
+
+
+class ProxyManifest:
+    """
+    Creates a persistent manifest of the proxy files already turned into tasks, kept in SQLite
+    """
+    def __init__(self, path=':memory:'):
+        """
+        Instantiates a ProxyManifest class
+
+        :param path: path of the SQLite file the manifest is kept in, ':memory:' for a temporary manifest
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                image TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                pool_id TEXT,
+                uploaded REAL
+            );
+        ''')
+        self.fingerprints = dict(self.connection.execute('SELECT image, fingerprint FROM files'))
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def state_of(self, image, version):
+        """
+        Returns NEW or CHANGED for a file which has to be uploaded, None if it has already been uploaded
+        """
+        known = self.fingerprints.get(image)
+        if known is None:
+            return NEW
+        return CHANGED if known != version else None
+
+    def mark(self, files, pool_id):
+        """
+        Records the files as uploaded into the pool and commits, so an interrupted ingestion loses nothing
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                        [(file.image, file.fingerprint, str(pool_id), now) for file in files])
+            self.connection.commit()
+            self.fingerprints.update((file.image, file.fingerprint) for file in files)
+
+
+class YaDiskProxyIngestor:
+    """
+    Creates a class to turn the files of a Ya.Disk proxy-folder into tasks incrementally: the folder is listed
+    page by page, only new and changed files become tasks, and the upload of a batch starts
+    while the next pages are still being listed
+    """
+    def __init__(self, session, disk, proxy_name, manifest, is_sandbox=True, root=None, compare=CHECKSUM,
+                 page_size=1000, input_value=default_input_value, tasks_on_suite=10, suites_per_batch=500,
+                 max_in_flight=4):
+        """
+        Instantiates a YaDiskProxyIngestor class
+
+        :param session: TolokaSession the requests are sent through
+        :param disk: yadisk.YaDisk client
+        :param proxy_name: name of proxy defined in Toloka Options, possibly with a subfolder
+        :param manifest: ProxyManifest or a path of its SQLite file
+        :param is_sandbox: if set to True, the folder of Sandbox Toloka is listed
+        :param root: Ya.Disk folder of the Toloka application, overrides is_sandbox
+        :param compare: CHECKSUM to detect changed files by MD5, MODIFIED - by modification time and size
+        :param page_size: the number of files requested from Ya.Disk at once
+        :param input_value: function returning the input values of a task by the proxy path of an image
+        :param tasks_on_suite: the number of tasks on one suite
+        :param suites_per_batch: the number of task-suites sent in one request
+        :param max_in_flight: the number of batches uploaded at the same time
+        """
+        self.session = session
+        self.disk = disk
+        self.proxy_name = proxy_name.strip('/')
+        self.manifest = manifest if isinstance(manifest, ProxyManifest) else ProxyManifest(manifest)
+        self.folder = proxy_folder(proxy_name, is_sandbox, root)
+        self.compare = compare
+        self.page_size = page_size
+        self.input_value = input_value
+        self.uploader = TaskSuiteUploader(session, tasks_on_suite=tasks_on_suite, suites_per_batch=suites_per_batch,
+                                          max_in_flight=max_in_flight)
+        self.counts = {}
+
+    def iter_files(self):
+        """
+        Lists the proxy-folder lazily, one page per request, yielding the files which have to be uploaded
+        """
+        self.counts = {'listed': 0, NEW: 0, CHANGED: 0}
+        for resource in self.disk.listdir(self.folder, limit=self.page_size):
+            if resource.type != 'file':
+                continue
+            self.counts['listed'] += 1
+            image = f'/{self.proxy_name}/{resource.name}'
+            version = fingerprint(resource, self.compare)
+            kind = self.manifest.state_of(image, version)
+            if kind is not None:
+                self.counts[kind] += 1
+                yield ProxyFile(resource.name, image, version, kind)
+
+    def ingest(self, pool_id, dry_run=False):
+        """
+        Creates tasks for the new and changed files of the proxy-folder. The files of every successful batch
+        are recorded in the manifest at once, files of failed batches are retried by the next ingestion
+
+        :param pool_id: ID of the pool
+        :param dry_run: if set to True, the files are only listed and counted
+        :return: IngestReport
+        """
+        uploaded = failed = batches = 0
+        if dry_run:
+            for _ in self.iter_files():
+                pass
+        else:
+            pending = deque()
+
+            def input_values():
+                for file in self.iter_files():
+                    pending.append(file)
+                    yield self.input_value(file.image)
+
+            for result in self.uploader.iter_upload(pool_id, input_values()):
+                batch = [pending.popleft() for _ in range(result.tasks)]
+                batches += 1
+                if result.status == SUCCESS:
+                    self.manifest.mark(batch, pool_id)
+                    uploaded += len(batch)
+                else:
+                    failed += len(batch)
+                    logger.warning('Batch %s of %s files failed: %s', result.batch_number, len(batch), result.error)
+        counts = self.counts
+        report = IngestReport(counts['listed'], counts[NEW], counts[CHANGED],
+                              counts['listed'] - counts[NEW] - counts[CHANGED], uploaded, failed, batches)
+        logger.info('Proxy %s: %s files listed, %s new, %s changed, %s tasks created in %s batches, %s failed',
+                    self.folder, report.listed, report.new, report.changed, report.uploaded, report.batches,
+                    report.failed)
+        return report
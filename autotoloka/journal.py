@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import threading
+import time
+
+from autotoloka.downloader import DownloadResult, DOWNLOADED, DUPLICATE, SKIPPED
+from autotoloka.review import ReviewResult, OK, ALREADY_PROCESSED
+
+
+class RunJournal:
+    """
+    Creates a persistent journal of a pipeline run, kept in SQLite: the IDs of the created objects,
+    the finished steps, the downloaded attachments and the review decisions sent.
+    Every record is committed at once, so a rerun with the same journal resumes where the run stopped
+    """
+    def __init__(self, path=':memory:'):
+        """
+        Instantiates a RunJournal class
+
+        :param path: path of the SQLite file the journal is kept in, ':memory:' for a temporary journal
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS steps (
+                name TEXT PRIMARY KEY,
+                value TEXT,
+                done REAL
+            );
+            CREATE TABLE IF NOT EXISTS downloads (
+                attachment_id TEXT PRIMARY KEY,
+                file_name TEXT,
+                status TEXT NOT NULL,
+                duplicate_of TEXT,
+                done REAL
+            );
+            CREATE TABLE IF NOT EXISTS reviews (
+                assignment_id TEXT PRIMARY KEY,
+                action TEXT NOT NULL,
+                status TEXT NOT NULL,
+                done REAL
+            );
+        ''')
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write(self, statement, parameters):
+        with self.lock:
+            self.connection.execute(statement, parameters)
+            self.connection.commit()
+
+    def _read(self, statement, parameters):
+        with self.lock:
+            return self.connection.execute(statement, parameters).fetchone()
+
+    def get(self, name, default=None):
+        """
+        Returns the recorded json-like value of a step, or the default if the step is not recorded
+        """
+        row = self._read('SELECT value FROM steps WHERE name = ?', (name,))
+        return default if row is None else json.loads(row[0])
+
+    def set(self, name, value=True):
+        self._write('INSERT OR REPLACE INTO steps VALUES (?, ?, ?)', (name, json.dumps(value), time.time()))
+
+    def once(self, name, function):
+        """
+        Returns the recorded value of the step; if there is none, calls the function and records its result.
+        Steps whose function fails are not recorded, so they are repeated by the next run
+        """
+        row = self._read('SELECT value FROM steps WHERE name = ?', (name,))
+        if row is not None:
+            return json.loads(row[0])
+        value = function()
+        self.set(name, value)
+        return value
+
+    def download_result(self, attachment_id):
+        """
+        Returns the recorded result of the attachment's download as DownloadResult, or None.
+        A downloaded file is reported as skipped, a duplicate keeps its status
+        """
+        row = self._read('SELECT file_name, status, duplicate_of FROM downloads WHERE attachment_id = ?',
+                         (str(attachment_id),))
+        if row is None:
+            return None
+        file_name, status, duplicate_of = row
+        return DownloadResult(attachment_id, file_name, SKIPPED if status != DUPLICATE else DUPLICATE, 0, None,
+                              duplicate_of)
+
+    def record_download(self, result):
+        """
+        Records a finished download, failed ones are left to be repeated
+        """
+        if result.status in (DOWNLOADED, SKIPPED, DUPLICATE):
+            self._write('INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)',
+                        (str(result.attachment_id), result.file_name, result.status, result.duplicate_of,
+                         time.time()))
+
+    def review_result(self, assignment_id, action=None):
+        """
+        Returns the recorded review of the assignment as ReviewResult, or None.
+        A review recorded with another action than the given one is not reported, so the new decision is sent
+        """
+        row = self._read('SELECT action, status FROM reviews WHERE assignment_id = ?', (str(assignment_id),))
+        if row is None or action is not None and row[0] != action:
+            return None
+        return ReviewResult(assignment_id, row[0], row[1], None, None)
+
+    def record_review(self, result):
+        """
+        Records a review which was sent or turned out to be already made, failed ones are left to be repeated
+        """
+        if result.status in (OK, ALREADY_PROCESSED):
+            self._write('INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?)',
+                        (str(result.assignment_id), result.action, result.status, time.time()))
+
+    def counts(self):
+        """
+        Returns the numbers of the recorded steps, downloads and reviews
+        """
+        with self.lock:
+            return {table: self.connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    for table in ('steps', 'downloads', 'reviews')}
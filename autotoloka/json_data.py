@@ -1,18 +1,102 @@
+import copy
 import os
 import json
 import pathlib
+from collections.abc import Mapping
+
+
+def to_plain(value):
+    """
+    Returns a deep copy of a json-like value with all the mappings turned into dictionaries
+    """
+    if isinstance(value, Mapping):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+class ConfigRegistry(Mapping):
+    """
+    Creates a registry of json configuration templates. A template is parsed on first access and cached
+    until its file changes; every access returns a separate plain dictionary, a deep copy of the cached one
+    """
+    def __init__(self, directories=None):
+        """
+        Instantiates a ConfigRegistry class
+
+        :param directories: directories with *.json templates; templates of later directories
+                            override the ones with the same name in earlier directories
+        """
+        self.directories = [pathlib.Path(directory) for directory in directories or []]
+        self._cache = {}
+
+    def add_directory(self, directory):
+        """
+        Adds a directory with templates, its templates take precedence over the already known ones
+        """
+        self.directories.append(pathlib.Path(directory))
+
+    def _path_for(self, name):
+        for directory in reversed(self.directories):
+            path = directory / f'{name}.json'
+            if path.is_file():
+                return path
+        return None
+
+    def load(self, name):
+        """
+        Returns the shared parsed template, re-reading the file only if its modification time changed.
+        The result must not be modified, use get or [] for a copy
+
+        :param name: name of the template file without the format
+        """
+        path = self._path_for(name)
+        if path is None:
+            self._cache.pop(name, None)
+            raise KeyError(name)
+        mtime = path.stat().st_mtime_ns
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != path or cached[1] != mtime:
+            with open(path, 'r', encoding='utf-8') as file:
+                cached = self._cache[name] = (path, mtime, json.load(file))
+        return cached[2]
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __getitem__(self, name):
+        return copy.deepcopy(self.load(name))
+
+    def __contains__(self, name):
+        return self._path_for(name) is not None
+
+    def __iter__(self):
+        names = {}
+        for directory in self.directories:
+            if directory.is_dir():
+                for item in os.listdir(directory):
+                    if item[-5:] == '.json':
+                        names[item[:-5]] = None
+        return iter(names)
+
+    def __len__(self):
+        return sum(1 for _ in self)
 
 
 def get_json_data():
-    json_data = {}
-    for item in os.listdir(os.path.join(json_data_path, 'json_files')):
-        if item[-5:] == '.json':
-            key = item[:-5]
-            with open(os.path.join(json_data_path, 'json_files', item), 'r', encoding='utf-8') as file:
-                value = json.load(file)
-            json_data[key] = value
-    return json_data
+    """
+    Parses all the known templates at once
+
+    :return: a dictionary {template name: plain json-like dictionary}
+    """
+    return {name: json_data[name] for name in json_data}
 
 
 json_data_path = pathlib.Path(__file__).parent
-json_data = get_json_data()
+# Extra template directories can be given in the AUTOTOLOKA_CONFIG_PATH variable, separated by os.pathsep
+json_data = ConfigRegistry([json_data_path / 'json_files'] +
+                           [path for path in os.environ.get('AUTOTOLOKA_CONFIG_PATH', '').split(os.pathsep) if path])
@@ -0,0 +1,137 @@
+import itertools
+import json
+import logging
+import sys
+import threading
+
+
+LOGGER_NAME = 'autotoloka'
+MAX_ITEMS = 20
+MAX_CHARS = 4000
+
+# Set once the package logger is configured by configure_logging rather than by the application
+_configured = False
+_lock = threading.Lock()
+
+
+def _sample(item, max_items, depth=3):
+    """
+    Returns the json-like item with every long list cut to its first max_items elements.
+    Dictionaries are keyed collections more often than lists are, so they are cut at five times as many keys
+    """
+    if depth == 0:
+        return item
+    if isinstance(item, dict):
+        max_keys = max_items * 5
+        sampled = {key: _sample(value, max_items, depth - 1)
+                   for key, value in itertools.islice(item.items(), max_keys)}
+        if len(item) > max_keys:
+            sampled['...'] = f'{len(item) - max_keys} more keys'
+        return sampled
+    if isinstance(item, (list, tuple)):
+        sampled = [_sample(value, max_items, depth - 1) for value in item[:max_items]]
+        if len(item) > max_items:
+            sampled.append(f'... {len(item) - max_items} more items')
+        return sampled
+    return item
+
+
+class LazyJson:
+    """
+    Creates a wrapper of a json-like item which is serialized only when a log record is actually formatted,
+    so disabled debug messages cost nothing. Long lists are sampled and long outputs are truncated
+
+        logger.debug('Created pool: %s', LazyJson(pool))
+    """
+    __slots__ = ('item', 'max_items', 'max_chars', 'indent')
+
+    def __init__(self, item, max_items=MAX_ITEMS, max_chars=MAX_CHARS, indent=4):
+        """
+        Instantiates a LazyJson class
+
+        :param item: a json-like item, e.g. a parsed response
+        :param max_items: lists are cut to this many elements, None keeps them whole
+        :param max_chars: the output is truncated to this many characters, None keeps it whole
+        :param indent: indentation of the output
+        """
+        self.item = item
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.indent = indent
+
+    def __str__(self):
+        item = self.item if self.max_items is None else _sample(self.item, self.max_items)
+        text = json.dumps(item, indent=self.indent, ensure_ascii=False, default=str)
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text = f'{text[:self.max_chars]}... ({len(text) - self.max_chars} more characters)'
+        return text
+
+
+class LogSampler:
+    """
+    Creates a thread-safe sampler for messages repeated per item (e.g. per assignment):
+    the first messages are let through, then only every n-th one
+    """
+    def __init__(self, first=10, every=100):
+        """
+        Instantiates a LogSampler class
+
+        :param first: the number of the first calls which are always sampled
+        :param every: after that, one of this many calls is sampled
+        """
+        self.first = first
+        self.every = every
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+            return self.count <= self.first or (self.count - self.first) % self.every == 0
+
+    @property
+    def skipped(self):
+        """
+        The number of calls which were not sampled so far
+        """
+        sampled = min(self.count, self.first) + max(0, self.count - self.first) // self.every
+        return self.count - sampled
+
+
+class _StdoutHandler(logging.StreamHandler):
+    # Writes to the current sys.stdout, so redirections made after the configuration are respected
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def configure_logging(verbose=False, stream=None, force=False):
+    """
+    Sets the level of the package logger: DEBUG (responses included) if verbose, INFO otherwise,
+    and writes the messages to stdout as plain lines.
+    Nothing is changed if the application has configured logging itself (a level or a handler of the package
+    logger, or a handler of the root logger), unless force is set
+
+    :param verbose: if set to True, the debug messages are enabled
+    :param stream: stream of the default handler, sys.stdout if None
+    :param force: if set to True, the package logger is configured in any case
+    :return: the package logger
+    """
+    global _configured
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, logging.NullHandler)]
+        if not force and not _configured and (logger.level != logging.NOTSET or handlers
+                                               or logging.getLogger().handlers):
+            return logger
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        if not handlers:
+            handler = logging.StreamHandler(stream) if stream is not None else _StdoutHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        _configured = True
+    return logger
@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+# Upper bounds of the latency buckets in seconds, the last bucket is unbounded
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def endpoint_name(path, base_url=''):
+    """
+    Returns the endpoint of a request path with the object IDs replaced, e.g. 'pools/{id}/open'
+
+    :param path: path relative to the API root or an absolute URL
+    :param base_url: root URL of the API, stripped from absolute URLs
+    """
+    if base_url and path.startswith(base_url):
+        path = path[len(base_url):]
+    elif '://' in path:
+        path = urlparse(path).path
+        path = path.split('/api/v1/', 1)[-1]
+    parts = [part for part in path.split('?', 1)[0].split('/') if part]
+    # The API paths are 'collection', 'collection/id' and 'collection/id/action'
+    if len(parts) > 1:
+        parts[1] = '{id}'
+    return '/'.join(parts)
+
+
+class Histogram:
+    """
+    Creates a cumulative histogram with fixed buckets, like the ones of Prometheus
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Returns an upper bound of the q-quantile, i.e. the bucket bound it falls into
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = seen
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': cumulative,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+class RequestStats:
+    def __init__(self, buckets):
+        self.latency = Histogram(buckets)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+    def to_dict(self):
+        return {'count': self.latency.count, 'latency': self.latency.to_dict(), 'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received, 'retries': self.retries}
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.last = None
+        self.running = 0
+
+    def to_dict(self):
+        return {'count': self.count, 'seconds': round(self.seconds, 6),
+                'last': None if self.last is None else round(self.last, 6), 'running': self.running}
+
+
+class Metrics:
+    """
+    Creates a thread-safe collector of request and stage metrics.
+    Every observation is also passed to the sinks, so the metrics can be exported to StatsD, Prometheus, etc.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS, sinks=None):
+        """
+        Instantiates a Metrics class
+
+        :param buckets: upper bounds of the latency histogram buckets in seconds
+        :param sinks: callables receiving every observation as a dictionary, see add_sink
+        """
+        self.buckets = tuple(buckets)
+        self.sinks = list(sinks or [])
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.stages = {}
+
+    def add_sink(self, sink):
+        """
+        Adds a callable which is called with every observation:
+        {'type': 'request', 'method', 'endpoint', 'status', 'seconds', 'bytes_sent', 'bytes_received', 'retries'}
+        or {'type': 'stage', 'stage', 'seconds'}.
+        Sinks are called in the thread of the request, so they should be fast and must not raise
+        """
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def _emit(self, event):
+        for sink in self.sinks:
+            sink(event)
+
+    def record_request(self, method, endpoint, status, seconds, bytes_sent=0, bytes_received=0, retries=0):
+        """
+        Records a finished request
+
+        :param method: HTTP method
+        :param endpoint: endpoint name, see endpoint_name
+        :param status: status code of the last response, or 'error' if no response was received
+        :param seconds: time spent on the request including the retries
+        :param bytes_sent: size of the request body
+        :param bytes_received: size of the response body
+        :param retries: how many times the request was repeated
+        """
+        key = (method.upper(), endpoint, str(status))
+        with self.lock:
+            stats = self.requests.get(key)
+            if stats is None:
+                stats = self.requests[key] = RequestStats(self.buckets)
+            stats.latency.observe(seconds)
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.retries += retries
+        if self.sinks:
+            self._emit({'type': 'request', 'method': key[0], 'endpoint': endpoint, 'status': key[2],
+                        'seconds': seconds, 'bytes_sent': bytes_sent, 'bytes_received': bytes_received,
+                        'retries': retries})
+
+    def record_stage(self, stage, seconds):
+        with self.lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.count += 1
+            stats.seconds += seconds
+            stats.last = seconds
+        if self.sinks:
+            self._emit({'type': 'stage', 'stage': stage, 'seconds': seconds})
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Times the enclosed block as a pipeline stage
+
+            with handler.metrics.stage('download'):
+                handler.get_files_from_pool(pool_id, 'photos')
+        """
+        with self.lock:
+            self.stages.setdefault(stage, StageStats()).running += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[stage].running -= 1
+            self.record_stage(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        """
+        Returns the current metrics as a json-serializable dictionary:
+        {'uptime': seconds, 'requests': {'METHOD endpoint': {status: stats}}, 'totals': {...}, 'stages': {...}}
+        """
+        with self.lock:
+            requests = {}
+            totals = {'count': 0, 'bytes_sent': 0, 'bytes_received': 0, 'retries': 0, 'seconds': 0.0}
+            for (method, endpoint, status), stats in sorted(self.requests.items()):
+                requests.setdefault(f'{method} {endpoint}', {})[status] = stats.to_dict()
+                totals['count'] += stats.latency.count
+                totals['bytes_sent'] += stats.bytes_sent
+                totals['bytes_received'] += stats.bytes_received
+                totals['retries'] += stats.retries
+                totals['seconds'] += stats.latency.sum
+            totals['seconds'] = round(totals['seconds'], 6)
+            stages = {stage: stats.to_dict() for stage, stats in self.stages.items()}
+        return {'uptime': round(time.time() - self.started, 3), 'requests': requests, 'totals': totals,
+                'stages': stages}
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests.clear()
+            self.stages.clear()
+
+    def to_prometheus(self, prefix='autotoloka'):
+        """
+        Returns the metrics in the Prometheus text exposition format, e.g. to be served from a /metrics handler
+        """
+        lines = [f'# TYPE {prefix}_request_duration_seconds histogram']
+        counters = {'bytes_sent': [], 'bytes_received': [], 'retries': []}
+        with self.lock:
+            for (method, endpoint, status), stats in sorted(self.requests.items()):
+                labels = f'method="{method}",endpoint="{endpoint}",status="{status}"'
+                seen = 0
+                for bound, count in zip(stats.latency.buckets + (float('inf'),), stats.latency.counts):
+                    seen += count
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="{le}"}} {seen}')
+                lines.append(f'{prefix}_request_duration_seconds_sum{{{labels}}} {stats.latency.sum}')
+                lines.append(f'{prefix}_request_duration_seconds_count{{{labels}}} {stats.latency.count}')
+                for name in counters:
+                    counters[name].append(f'{prefix}_request_{name}_total{{{labels}}} {getattr(stats, name)}')
+            stages = [(stage, stats.seconds, stats.count) for stage, stats in sorted(self.stages.items())]
+        for name, samples in counters.items():
+            lines.append(f'# TYPE {prefix}_request_{name}_total counter')
+            lines.extend(samples)
+        lines.append(f'# TYPE {prefix}_stage_seconds_total counter')
+        lines.extend(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds}' for stage, seconds, _ in stages)
+        lines.append(f'# TYPE {prefix}_stage_runs_total counter')
+        lines.extend(f'{prefix}_stage_runs_total{{stage="{stage}"}} {count}' for stage, _, count in stages)
+        return '\n'.join(lines) + '\n'
+
+
+def statsd_sink(client, prefix='autotoloka'):
+    """
+    Returns a sink sending the observations to a StatsD client with timing(name, milliseconds)
+    and incr(name, count) methods (e.g. the one of the statsd package)
+
+    :param client: StatsD client
+    :param prefix: prefix of the metric names
+    """
+    def sink(event):
+        if event['type'] == 'request':
+            name = f'{prefix}.request.{event["method"]}.{event["endpoint"].replace("/", ".")}.{event["status"]}'
+            name = name.replace('{id}', 'id')
+            client.timing(name, event['seconds'] * 1000)
+            if event['bytes_received']:
+                client.incr(f'{prefix}.bytes_received', event['bytes_received'])
+            if event['retries']:
+                client.incr(f'{prefix}.retries', event['retries'])
+        else:
+            client.timing(f'{prefix}.stage.{event["stage"]}', event['seconds'] * 1000)
+    return sink
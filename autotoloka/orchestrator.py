@@ -0,0 +1,262 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.hash_index import HashIndex
+from autotoloka.metrics import Metrics
+from autotoloka.ratelimit import shared_limiter
+from autotoloka.review import OK
+from autotoloka.transport import TolokaSession
+from autotoloka.watcher import PoolWatcher
+
+
+logger = logging.getLogger(__name__)
+
+Campaign = namedtuple('Campaign', ['name', 'project_id', 'input_values', 'download_folder_name', 'pool_config',
+                                   'tasks_on_suite', 'hash_index_path', 'max_distance', 'reject_duplicates',
+                                   'accept_uniques', 'reject_errors'],
+                      defaults=(None, 1, None, 10, True, True, False))
+Campaign.__doc__ = """
+A collection campaign: a pool created in the project (by the json-like pool_config or by PoolCreator defaults,
+named after the campaign), filled with the input values, watched until completion, then downloaded,
+deduplicated and reviewed
+"""
+
+CREATE = 'create'
+WAIT = 'wait'
+COLLECT = 'collect'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class CampaignState:
+    """
+    Creates the progress record of a campaign
+    """
+    def __init__(self, campaign):
+        self.campaign = campaign
+        self.stage = CREATE
+        self.pool_id = None
+        self.tasks = 0
+        self.submitted = 0
+        self.downloaded = 0
+        self.duplicates = 0
+        self.reviewed = 0
+        self.error = None
+        self.stage_seconds = {}
+        self.stage_started = time.monotonic()
+        self.watcher = None
+        self.due = 0.0
+        self.photo_data = None
+        self.reviews = None
+
+    def enter(self, stage, metrics=None):
+        now = time.monotonic()
+        seconds = now - self.stage_started
+        self.stage_seconds[self.stage] = self.stage_seconds.get(self.stage, 0.0) + seconds
+        if metrics is not None:
+            metrics.record_stage(f'campaign_{self.stage}', seconds)
+        self.stage, self.stage_started = stage, now
+
+    @property
+    def finished(self):
+        return self.stage in (DONE, FAILED)
+
+    def to_dict(self):
+        return {'name': self.campaign.name, 'project_id': self.campaign.project_id, 'pool_id': self.pool_id,
+                'stage': self.stage, 'tasks': self.tasks, 'submitted': self.submitted,
+                'downloaded': self.downloaded, 'duplicates': self.duplicates, 'reviewed': self.reviewed,
+                'error': self.error, 'stage_seconds': {k: round(v, 3) for k, v in self.stage_seconds.items()}}
+
+    def __str__(self):
+        line = f'Campaign {self.campaign.name!r} | pool {self.pool_id} | {self.stage}'
+        if self.stage == WAIT:
+            line += f' | {self.submitted}/{self.tasks} submitted'
+        elif self.stage == DONE:
+            line += f' | {self.downloaded} downloaded, {self.duplicates} duplicates, {self.reviewed} reviewed'
+        elif self.stage == FAILED:
+            line += f' | {self.error}'
+        return line
+
+
+class CollectionOrchestrator:
+    """
+    Creates a class to run many collection campaigns, possibly of different projects, from one process.
+    All the campaigns share one connection pool, rate limiter and metrics, and campaigns with the same
+    hash_index_path share one open HashIndex; their stages are scheduled on a common pool of workers,
+    and waiting pools are polled instead of holding a thread each
+    """
+    def __init__(self, oauth_token, is_sandbox=True, api_url=None, max_workers=4, collect_workers=8,
+                 min_interval=1, max_interval=30, on_progress=None, session=None, metrics=None, pool_maxsize=64):
+        """
+        Instantiates a CollectionOrchestrator class
+
+        :param oauth_token: Yandex.Toloka token for connecting with the API
+        :param is_sandbox: if set to True, then all the operations will be performed in Sandbox Toloka
+        :param api_url: root URL of the API, overrides is_sandbox
+        :param max_workers: the number of stages (creations, polls, collections) running at the same time
+        :param collect_workers: the number of concurrent downloads and reviews inside one collection
+        :param min_interval: delay between polls of a pool in seconds right after new submissions
+        :param max_interval: the longest delay between polls of a pool in seconds
+        :param on_progress: function called with the CampaignState after every change of a campaign
+        :param session: a TolokaSession to use, if None - a new one is created
+        :param metrics: Metrics to collect the measurements into, if None - the session's one or a new one
+        :param pool_maxsize: number of keep-alive connections of a new session
+        """
+        self.oauth_token = oauth_token
+        self.max_workers = max_workers
+        self.collect_workers = collect_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.on_progress = on_progress
+        if api_url is None:
+            api_url = 'https://sandbox.toloka.yandex.ru/api/v1/' if is_sandbox else 'https://toloka.yandex.ru/api/v1/'
+        if session is None:
+            session = TolokaSession(api_url if api_url.endswith('/') else api_url + '/',
+                                    headers={'Authorization': 'OAuth ' + oauth_token}, pool_maxsize=pool_maxsize,
+                                    metrics=metrics, limiter=shared_limiter(oauth_token))
+        if metrics is None:
+            metrics = session.metrics if session.metrics is not None else Metrics()
+        if session.metrics is None:
+            session.metrics = metrics
+        self.session = session
+        self.metrics = metrics
+        self.is_sandbox = is_sandbox
+        self.api_url = api_url
+        self.handlers = {}
+        self.hash_indexes = {}
+        self.lock = threading.Lock()
+        self.states = []
+
+    def handler_for(self, project_id):
+        """
+        Returns the handler of the project, sharing the orchestrator's session; the stages of several campaigns
+        of the project may ask for it at the same time, so it is created under the lock
+        """
+        with self.lock:
+            if project_id not in self.handlers:
+                self.handlers[project_id] = TolokaProjectHandler(self.oauth_token, project_id=project_id,
+                                                                 is_sandbox=self.is_sandbox, api_url=self.api_url,
+                                                                 verbose=False, session=self.session,
+                                                                 metrics=self.metrics)
+            return self.handlers[project_id]
+
+    def hash_index_for(self, path):
+        """
+        Returns the open HashIndex of the path, shared by all the campaigns of the run which use it;
+        campaigns without a path get an index of their own
+        """
+        if path is None:
+            return HashIndex()
+        with self.lock:
+            if path not in self.hash_indexes:
+                self.hash_indexes[path] = HashIndex(path)
+            return self.hash_indexes[path]
+
+    def _report(self, state):
+        logger.info('%s', state)
+        if self.on_progress is not None:
+            self.on_progress(state)
+
+    def _create(self, state):
+        campaign = state.campaign
+        handler = self.handler_for(campaign.project_id)
+        state.pool_id = handler.create_toloka_pool(campaign.pool_config, private_name=campaign.name)
+        results = handler.upload_task_suites(state.pool_id, campaign.input_values,
+                                             tasks_on_suite=campaign.tasks_on_suite)
+        state.tasks = sum(result.tasks for result in results if result.task_suite_ids)
+        response = handler.open_close_pool(state.pool_id)
+        if response is None:
+            raise RuntimeError(f'Pool {state.pool_id} is already completed')
+        response.raise_for_status()
+        state.watcher = PoolWatcher(handler, state.pool_id, min_interval=self.min_interval,
+                                    max_interval=self.max_interval)
+
+    def _poll(self, state):
+        state.watcher.poll()
+        state.submitted = state.watcher.submitted
+
+    def _collect(self, state):
+        campaign = state.campaign
+        handler = self.handler_for(campaign.project_id)
+        index = self.hash_index_for(campaign.hash_index_path)
+        try:
+            state.photo_data, state.reviews = handler.collect_files_from_pool(
+                state.pool_id, campaign.download_folder_name, hash_index=index, max_distance=campaign.max_distance,
+                reject_duplicates=campaign.reject_duplicates, accept_uniques=campaign.accept_uniques,
+                reject_errors=campaign.reject_errors, max_workers=self.collect_workers, progress=False)
+        finally:
+            if campaign.hash_index_path is None:
+                index.close()
+        items = [item for item in state.photo_data.values() if item is not None]
+        state.duplicates = sum(item['is_duplicate'] for item in items)
+        state.downloaded = sum(item['is_downloaded'] for item in items)
+        state.reviewed = sum(result.status == OK for result in state.reviews)
+
+    def _next_stage(self, state, job):
+        """
+        Moves the campaign on after a finished job and returns the next job to run now, if any
+        """
+        if state.stage == CREATE:
+            state.enter(WAIT, self.metrics)
+            state.due = time.monotonic()
+        elif state.stage == WAIT and job == self._poll:
+            if state.watcher.finished:
+                state.enter(COLLECT, self.metrics)
+                self._report(state)
+                return self._collect
+            state.due = time.monotonic() + state.watcher.interval
+        elif state.stage == COLLECT:
+            state.enter(DONE, self.metrics)
+        self._report(state)
+        return None
+
+    def run(self, campaigns):
+        """
+        Runs the campaigns until all of them are collected or failed.
+        A failure of one campaign does not stop the others
+
+        :param campaigns: an iterable of Campaign
+        :return: a list of CampaignState in the order of the campaigns
+        """
+        states = [CampaignState(campaign) for campaign in campaigns]
+        self.states = states
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for state in states:
+                    running[executor.submit(self._create, state)] = (state, self._create)
+                while not all(state.finished for state in states):
+                    now = time.monotonic()
+                    busy = {id(state) for state, _ in running.values()}
+                    for state in states:
+                        if state.stage == WAIT and id(state) not in busy and state.due <= now:
+                            running[executor.submit(self._poll, state)] = (state, self._poll)
+                    waiting = [state.due for state in states if state.stage == WAIT and id(state) not in busy]
+                    timeout = max(0.0, min(waiting) - time.monotonic()) if waiting else None
+                    done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        state, job = running.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            state.error = f'{type(error).__name__}: {error}'
+                            state.enter(FAILED, self.metrics)
+                            self._report(state)
+                            continue
+                        next_job = self._next_stage(state, job)
+                        if next_job is not None:
+                            running[executor.submit(next_job, state)] = (state, next_job)
+        finally:
+            for index in self.hash_indexes.values():
+                index.close()
+            self.hash_indexes = {}
+        return states
+
+    def progress(self):
+        """
+        Returns the progress of every campaign of the current or the last run as json-like dictionaries
+        """
+        return [state.to_dict() for state in self.states]
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_items(session, path, params=None, page_size=500, prefetch=False, cursor_field='id'):
+    """
+    Lazily iterates over all the items of a Toloka list endpoint, following the cursor until has_more is false
+
+    The id cursor is continued with id_gt. Other cursor fields (e.g. 'submitted') need not be unique, so the results
+    are sorted by the field and then the id, the next page starts at the last value (*_gte) without the items already
+    yielded, and a page holding nothing but that value is followed by paging its items by id.
+
+    :param session: TolokaSession the requests are sent through
+    :param path: path of the list endpoint, e.g. 'assignments'
+    :param params: filters of the list request, None values are dropped, lists are joined with commas
+    :param page_size: the number of items requested per page
+    :param prefetch: if set to True, the next page is requested in the background while the current one is consumed
+    :param cursor_field: the field the results are sorted by and continued from
+    :return: a generator of items (json-like dictionaries)
+    """
+    query = {}
+    for k, v in (params or {}).items():
+        if v is None:
+            continue
+        if isinstance(v, (list, tuple, set)):
+            v = ','.join(str(item) for item in v)
+        query[k] = v
+    query['sort'] = 'id' if cursor_field == 'id' else f'{cursor_field},id'
+    query['limit'] = page_size
+
+    # A cursor is (value, ids of the items with the value that were yielded, id the items of the value are paged from):
+    # (value, None, None) continues after the value, (value, ids, None) from the value, (value, None, id) within it
+    def fetch(cursor):
+        page_query = dict(query)
+        if cursor is not None:
+            value, seen, after = cursor
+            if after is not None:
+                page_query.update({f'{cursor_field}_gte': value, f'{cursor_field}_lte': value, 'id_gt': after,
+                                   'sort': 'id'})
+            else:
+                page_query[f'{cursor_field}_gte' if seen else f'{cursor_field}_gt'] = value
+        response = session.get(path, params=page_query)
+        response.raise_for_status()
+        return response.json()
+
+    def advance(page, cursor):
+        """
+        Returns the items of the page that were not yielded yet and the cursor of the next page, None after the last
+        """
+        items = page.get('items', [])
+        new_items = items
+        if cursor is not None and cursor[1]:
+            value, seen, _ = cursor
+            new_items = [item for item in items if item[cursor_field] != value or item['id'] not in seen]
+        if cursor is not None and cursor[2] is not None:
+            # Within a value: continue by id, then after the value once its items are over
+            if page.get('has_more') and items:
+                return new_items, (cursor[0], None, items[-1]['id'])
+            return new_items, (cursor[0], None, None)
+        if not page.get('has_more') or not items:
+            return new_items, None
+        last = items[-1]
+        value = last[cursor_field]
+        if cursor_field == 'id':
+            return new_items, (value, None, None)
+        if items[0][cursor_field] == value:
+            # The whole page has one value, the rest of its items are paged by id
+            return new_items, (value, None, last['id'])
+        return new_items, (value, {item['id'] for item in items if item[cursor_field] == value}, None)
+
+    if not prefetch:
+        cursor = None
+        while True:
+            items, cursor = advance(fetch(cursor), cursor)
+            yield from items
+            if cursor is None:
+                return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        cursor = None
+        future = executor.submit(fetch, cursor)
+        while future is not None:
+            items, cursor = advance(future.result(), cursor)
+            future = None if cursor is None else executor.submit(fetch, cursor)
+            yield from items
@@ -1,9 +1,18 @@
+import logging
+from contextlib import nullcontext
+
 from autotoloka.handler import TolokaProjectHandler
+from autotoloka.journal import RunJournal
+from autotoloka.log import configure_logging
 from autotoloka.json_data import json_data
-import time
+from autotoloka.metrics import Metrics
+from autotoloka.watcher import PoolWatcher
 from sys import stdout
 
 
+logger = logging.getLogger(__name__)
+
+
 def pipeline_new_pool_with_tasks(oauth_token, pool_name, overlap=None, verbose=True, project_params_path=None):
     """
     Rough pipeline for creating a new pool (possibly with a new project) with task-suites
@@ -14,6 +23,7 @@ def pipeline_new_pool_with_tasks(oauth_token, pool_name, overlap=None, verbose=T
     :param verbose:
     :param project_params_path:
     """
+    configure_logging(verbose)
     handler = TolokaProjectHandler(oauth_token, verbose=verbose, project_params_data=project_params_path)
     new_pool_id = handler.create_toloka_pool(private_name=pool_name)
     input_values = [{'image': '/segm-photos/bears.jpg',
@@ -38,6 +48,7 @@ def pipeline_new_pool_with_tasks_from_yadisk_proxy(oauth_token, pool_name, proxy
     :param verbose:
     :param project_params_path:
     """
+    configure_logging(verbose)
     handler = TolokaProjectHandler(oauth_token, verbose=verbose, project_params_data=project_params_path)
     new_pool_id = handler.create_toloka_pool(private_name=pool_name)
     new_suite_id = handler.create_task_suite_from_yadisk_proxy(new_pool_id, proxy_name)
@@ -51,6 +62,7 @@ def pipeline_for_new_project(oauth_token, project_params_path, verbose=True):
     :param project_params_path:
     :param verbose:
     """
+    configure_logging(verbose)
     handler = TolokaProjectHandler(oauth_token, verbose=verbose, project_params_data=project_params_path)
 
 
@@ -60,7 +72,8 @@ def pipeline_for_collecting_images(connect_to_existing_project=False, project_id
                                    general_title='Photo to choose', progress_bar_length=60,
                                    oauth_token=None, download_folder_name='photos', verbose=False,
                                    check_for_duplicates=True, accept_and_reject_after_dedup=False,
-                                   reject_errors=False):
+                                   reject_errors=False, hash_index_path=None, streaming_dedup=False, metrics=None,
+                                   journal_path=None):
     """
     Pipeline for collecting photos by Tolokers
 
@@ -74,47 +87,104 @@ def pipeline_for_collecting_images(connect_to_existing_project=False, project_id
     :param progress_bar_length: length of a progress bar
     :param oauth_token: token for connecting to Toloka API
     :param download_folder_name: name of a directory to download images to
-    :param verbose: if set to True, prints out all the possible logs into the console
+    :param verbose: if set to True, the responses are logged as well (the DEBUG level); the package logger is
+                    configured by configure_logging, so an application which configures logging keeps its settings
     :param check_for_duplicates: checks downloaded photos for duplicates
     :param accept_and_reject_after_dedup: processes tasks based on the results of deduplication
     :param reject_errors: if set to True, rejects task if a photo wasn't uploaded by the user
+    :param hash_index_path: path of a persistent hash index to check the photos against earlier collections
+    :param streaming_dedup: if set to True, photos are checked for duplicates while they are downloaded,
+                            duplicates are never written to disk and tasks are processed right away
+    :param metrics: Metrics to collect the request and stage measurements into, e.g. one with export sinks
+    :param journal_path: path of a RunJournal; a run with the journal of an interrupted one resumes it: the recorded
+                         project and pool are reused, and recorded downloads and reviews are not repeated.
+                         With streaming_dedup the hashes are kept next to the journal unless hash_index_path is set
+    :return: the metrics snapshot of the run, see Metrics.snapshot
     """
-    if connect_to_existing_project:
-        handler = TolokaProjectHandler(oauth_token=oauth_token, project_id=project_id)
-    else:
-        collect_photos_config = json_data['collecting_images']
-        collect_photos_config['public_name'] = project_name
-        handler = TolokaProjectHandler(oauth_token=oauth_token, verbose=verbose,
-                                       project_params_data=collect_photos_config)
-
-    pool_id = handler.create_toloka_pool(private_name=pool_name)
-    input_values = [{'product_title': general_title,
-                     'description': general_description} for _ in range(number_of_images)]
-    handler.create_task_suite(pool_id, input_values, tasks_on_suite=1)
-    closed = handler.get_pools_params(pool_id).get('last_close_reason')
-    handler.open_close_pool(pool_id)
-
-    # Progress bar parameters
-    bar, bar_length = '█', progress_bar_length
-    bar_step = int(bar_length / len(input_values))
-
-    while closed != 'COMPLETED':
-        time.sleep(1)
-        closed = handler.get_pools_params(pool_id).get('last_close_reason')
-        active_tasks = handler.get_answers(pool_id)['items']
-        statuses = [task['status'] for task in active_tasks]
-        counter = statuses.count('SUBMITTED') if statuses else 0
-        stdout.write('\rPhotos uploaded: {}/{} |{}{}|'.format(counter, len(input_values),
-                                                              bar * bar_step * counter,
-                                                              '-' * bar_step * (len(input_values) - counter)))
-        stdout.flush()
-    print('')
-    photo_data = handler.get_files_from_pool(pool_id, download_folder_name, reject_errors=reject_errors)
-    if check_for_duplicates:
-        handler.check_photos_for_duplicates(download_folder_name,
-                                            reject_duplicates=accept_and_reject_after_dedup,
-                                            photo_data=photo_data,
-                                            accept_uniques=accept_and_reject_after_dedup)
+    configure_logging(verbose)
+    metrics = metrics if metrics is not None else Metrics()
+    with RunJournal(journal_path) if journal_path is not None else nullcontext() as journal:
+        if journal is not None:
+            if journal.get('collected'):
+                logger.info('The run recorded in %s has already been completed', journal_path)
+                return metrics.snapshot()
+            if journal.get('project_id') is not None:
+                connect_to_existing_project, project_id = True, journal.get('project_id')
+            if streaming_dedup and hash_index_path is None:
+                hash_index_path = f'{journal_path}.hashes'
+
+        def once(name, function):
+            return function() if journal is None else journal.once(name, function)
+
+        with metrics.stage('project'):
+            if connect_to_existing_project:
+                handler = TolokaProjectHandler(oauth_token=oauth_token, project_id=project_id, metrics=metrics,
+                                               journal=journal)
+            else:
+                collect_photos_config = json_data['collecting_images']
+                collect_photos_config['public_name'] = project_name
+                handler = TolokaProjectHandler(oauth_token=oauth_token, verbose=verbose,
+                                               project_params_data=collect_photos_config, metrics=metrics,
+                                               journal=journal)
+            once('project_id', lambda: handler.project_id)
+
+        with metrics.stage('pool'):
+            pool_id = once('pool_id', lambda: handler.create_toloka_pool(private_name=pool_name))
+        input_values = [{'product_title': general_title,
+                         'description': general_description} for _ in range(number_of_images)]
+
+        def upload():
+            # An interrupted run may have uploaded some of the batches without recording the step: only the missing
+            # task suites are created (all of them have the same input values)
+            missing = len(input_values)
+            if journal is not None:
+                missing -= sum(1 for _ in handler.iter_task_suites(pool_id))
+            if missing > 0:
+                handler.create_task_suite(pool_id, input_values[:missing], tasks_on_suite=1)
+            return True
+
+        def open_pool():
+            if journal is None or handler.get_pool(pool_id)['status'] != 'OPEN':
+                handler.open_close_pool(pool_id)
+            return True
+
+        with metrics.stage('upload'):
+            once('uploaded', upload)
+            once('opened', open_pool)
+
+        # Progress bar parameters
+        bar, bar_length = '█', progress_bar_length
+        bar_step = int(bar_length / len(input_values))
+
+        def draw_progress(watcher):
+            counter = min(watcher.submitted, len(input_values))
+            stdout.write('\rPhotos uploaded: {}/{} |{}{}|'.format(counter, len(input_values),
+                                                                  bar * bar_step * counter,
+                                                                  '-' * bar_step * (len(input_values) - counter)))
+            stdout.flush()
+
+        with metrics.stage('wait'):
+            PoolWatcher(handler, pool_id).watch(on_tick=draw_progress)
+        print('')
+        if check_for_duplicates and streaming_dedup:
+            with metrics.stage('download_dedup_review'):
+                handler.collect_files_from_pool(pool_id, download_folder_name, hash_index_path=hash_index_path,
+                                                reject_duplicates=accept_and_reject_after_dedup,
+                                                accept_uniques=accept_and_reject_after_dedup,
+                                                reject_errors=reject_errors)
+            once('collected', lambda: True)
+            return metrics.snapshot()
+        with metrics.stage('download'):
+            photo_data = handler.get_files_from_pool(pool_id, download_folder_name, reject_errors=reject_errors)
+        if check_for_duplicates:
+            # check_photos_for_duplicates times its 'dedup' and 'review' stages itself
+            handler.check_photos_for_duplicates(download_folder_name,
+                                                reject_duplicates=accept_and_reject_after_dedup,
+                                                photo_data=photo_data,
+                                                accept_uniques=accept_and_reject_after_dedup,
+                                                hash_index_path=hash_index_path)
+        once('collected', lambda: True)
+        return metrics.snapshot()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Creates a thread-safe token bucket, limiting the rate of operations
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Instantiates a TokenBucket class
+
+        :param rate: the number of tokens added per second
+        :param capacity: the maximum number of tokens stored, i.e. the allowed burst; defaults to the rate
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self, tokens):
+        """
+        Takes the tokens if they are available, returns 0 then or the seconds until they are
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes the tokens if they are available without waiting
+
+        :param tokens: the number of tokens to take
+        :return: True if the tokens were taken
+        """
+        return self._take(tokens) == 0
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until the required number of tokens is available and takes them
+
+        :param tokens: the number of tokens to take
+        """
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """
+        Waits like acquire without blocking the event loop
+
+        :param tokens: the number of tokens to take
+        """
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+READ = 'read'
+WRITE = 'write'
+DOWNLOAD = 'download'
+# Responses telling that the service is overloaded, the concurrency is cut on them
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+
+def endpoint_class(method, path):
+    """
+    Returns the budget class of a request: 'download' for attachment downloads, 'read' for other GET requests
+    and 'write' for everything else
+    """
+    path = path.split('?', 1)[0].rstrip('/')
+    if path.endswith('/download'):
+        return DOWNLOAD
+    if method.upper() in ('GET', 'HEAD', 'OPTIONS'):
+        return READ
+    return WRITE
+
+
+class AIMDLimiter:
+    """
+    Creates a thread-safe concurrency limit adjusted like TCP congestion control: the limit grows
+    by about one for every limit-worth of healthy responses and is multiplied by a factor on overload
+    """
+    def __init__(self, initial=8, min_limit=1, max_limit=64, decrease_factor=0.5, cooldown=0.2):
+        """
+        Instantiates an AIMDLimiter class
+
+        :param initial: the starting number of requests allowed in flight
+        :param min_limit: the limit never goes below this
+        :param max_limit: the limit never goes above this
+        :param decrease_factor: the limit is multiplied by this on an overload response
+        :param cooldown: seconds after a decrease during which further overloads do not decrease the limit again,
+                         so a burst of 429s caused by one window of requests counts once
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.decreased = float('-inf')
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Blocks until the limiter is not paused and the number of requests in flight is below the limit,
+        then takes a slot
+        """
+        with self.condition:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(wait if wait > 0 else None)
+            self.in_flight += 1
+
+    async def acquire_async(self, poll_interval=0.01):
+        """
+        Waits like acquire without blocking the event loop. The releases only wake up waiting threads,
+        so a waiting coroutine checks the limit again every poll_interval seconds
+        """
+        while True:
+            with self.condition:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+            await asyncio.sleep(wait if wait > 0 else poll_interval)
+
+    def release(self, overloaded=False, pause=None):
+        """
+        Frees a slot and adjusts the limit
+
+        :param overloaded: True if the request got an overload response (429, 503) or no response at all
+        :param pause: seconds no new request may start for, e.g. the Retry-After of the response
+        """
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if pause:
+                self.paused_until = max(self.paused_until, now + pause)
+            if overloaded:
+                if now - self.decreased >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.decreased = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class Budget:
+    """
+    Creates the budget of one endpoint class: an optional token bucket for the rate
+    and an AIMD limit for the concurrency
+    """
+    def __init__(self, requests_per_second=None, burst=None, initial_concurrency=8, max_concurrency=64):
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.concurrency = AIMDLimiter(min(initial_concurrency, max_concurrency), max_limit=max_concurrency)
+
+
+# Only the concurrency is limited by default; rates are opt-in, e.g. {'write': {'requests_per_second': 20}}
+DEFAULT_BUDGETS = {
+    READ: {'initial_concurrency': 8, 'max_concurrency': 64},
+    WRITE: {'initial_concurrency': 8, 'max_concurrency': 64},
+    DOWNLOAD: {'initial_concurrency': 16, 'max_concurrency': 64},
+}
+
+
+class RateLimiter:
+    """
+    Creates a client-side limiter with separate budgets for reads, writes and downloads.
+    A request takes a token of its class (if the class is rate-limited) and a concurrency slot,
+    the concurrency backs off on 429/503 and ramps up while the responses stay healthy
+    """
+    def __init__(self, budgets=None):
+        """
+        Instantiates a RateLimiter class
+
+        :param budgets: a dictionary {'read'|'write'|'download': Budget keyword arguments},
+                        merged into DEFAULT_BUDGETS, e.g. {'write': {'requests_per_second': 20}};
+                        the classes are not rate-limited unless a requests_per_second is given
+        """
+        budgets = budgets or {}
+        self.budgets = {name: Budget(**dict(DEFAULT_BUDGETS[name], **budgets.get(name, {})))
+                        for name in DEFAULT_BUDGETS}
+
+    def max_concurrency(self, name):
+        """
+        Returns the upper bound of the concurrency of the class, a sensible number of workers for it
+        """
+        return self.budgets[name].concurrency.max_limit
+
+    def acquire(self, method, path):
+        """
+        Blocks until the request may be sent
+
+        :return: the budget which has to be given to release
+        """
+        budget = self.budgets[endpoint_class(method, path)]
+        if budget.bucket is not None:
+            budget.bucket.acquire()
+        budget.concurrency.acquire()
+        return budget
+
+    async def acquire_async(self, method, path):
+        """
+        Waits like acquire without blocking the event loop, so asyncio code shares the budgets with threads
+
+        :return: the budget which has to be given to release
+        """
+        budget = self.budgets[endpoint_class(method, path)]
+        if budget.bucket is not None:
+            await budget.bucket.acquire_async()
+        await budget.concurrency.acquire_async()
+        return budget
+
+    @staticmethod
+    def release(budget, status=None, retry_after=None):
+        """
+        Frees the slot of a request
+
+        :param budget: the budget returned by acquire
+        :param status: status code of the response, None if the request failed without one (a connection error
+                       or a timeout), which is counted as overload as well
+        :param retry_after: the delay requested by the server in seconds; the whole class waits for it,
+                            since the quota is shared by all its requests
+        """
+        overloaded = status is None or status in OVERLOAD_STATUSES
+        budget.concurrency.release(overloaded=overloaded, pause=retry_after if overloaded else None)
+
+    def snapshot(self):
+        """
+        Returns the current concurrency limits and the requests in flight of every class
+        """
+        return {name: {'limit': round(budget.concurrency.limit, 2), 'in_flight': budget.concurrency.in_flight}
+                for name, budget in self.budgets.items()}
+
+
+_shared_limiters = {}
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(oauth_token, budgets=None):
+    """
+    Returns the RateLimiter shared by everything using the OAuth token, since the quotas of the API
+    are counted per token. The budgets are only applied when the limiter is created
+
+    :param oauth_token: Yandex.Toloka token
+    :param budgets: budgets of a new limiter, see RateLimiter
+    """
+    key = hashlib.sha256(oauth_token.encode('utf-8')).hexdigest()
+    with _shared_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = _shared_limiters[key] = RateLimiter(budgets)
+        return limiter
+
+
+def worker_count(session, name, default=8):
+    """
+    Returns the number of workers to use for a class of requests: the maximum concurrency of the session's
+    limiter, which then adapts the actual concurrency, or the default if the session has no limiter
+    """
+    limiter = getattr(session, 'limiter', None)
+    return limiter.max_concurrency(name) if limiter is not None else default
@@ -0,0 +1,160 @@
+import base64
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from autotoloka.transport import TolokaSession
+
+
+RECORDED_HEADERS = ('Content-Type', 'Retry-After', 'ETag')
+
+
+def request_key(method, path, params=None, json_body=None):
+    """
+    Returns a canonical string identifying a request, used to match replayed requests to recorded ones
+
+    :param method: HTTP method
+    :param path: path relative to the API root
+    :param params: query parameters
+    :param json_body: json-like body of the request
+    """
+    query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None))
+    body = json.dumps(json_body, sort_keys=True, ensure_ascii=False) if json_body is not None else ''
+    return f'{method.upper()} {path}?{query} {body}'
+
+
+def _relative_path(session, path):
+    return path[len(session.base_url):] if path.startswith(session.base_url) else path
+
+
+class RecordingSession(TolokaSession):
+    """
+    Creates a TolokaSession which writes every request and the received response into a JSON lines file,
+    so that a session against the real API can be replayed offline with ReplaySession
+    """
+    def __init__(self, base_url, record_path, **kwargs):
+        """
+        Instantiates a RecordingSession class
+
+        :param base_url: root URL of the API
+        :param record_path: path of the file the records are appended to
+        :param kwargs: keyword arguments for TolokaSession
+        """
+        super().__init__(base_url, **kwargs)
+        self.record_path = record_path
+        self._lock = threading.Lock()
+        self._file = open(record_path, 'a', encoding='utf-8')
+
+    def request(self, method, path, **kwargs):
+        started = time.perf_counter()
+        response = super().request(method, path, **kwargs)
+        # Reading the content makes streamed downloads buffered, which is fine for recording
+        record = {
+            'method': method.upper(),
+            'path': _relative_path(self, path),
+            'params': kwargs.get('params'),
+            'json': kwargs.get('json'),
+            'status': response.status_code,
+            'headers': {k: response.headers[k] for k in RECORDED_HEADERS if k in response.headers},
+            'body': base64.b64encode(response.content).decode('ascii'),
+            'elapsed': round(time.perf_counter() - started, 6),
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            self._file.flush()
+        return response
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._file.close()
+
+
+class ReplaySession:
+    """
+    Creates a stand-in for TolokaSession answering requests with the responses of a recording.
+    Repeated identical requests get the recorded responses in the recorded order
+    """
+    def __init__(self, record_path, base_url='https://replay.invalid/api/v1/', strict=True, delay=False):
+        """
+        Instantiates a ReplaySession class
+
+        :param record_path: path of a file written by RecordingSession
+        :param base_url: root URL reported by the session
+        :param strict: if set to True, requests missing from the recording raise KeyError,
+                       otherwise they are answered with 404
+        :param delay: if set to True, every response is delayed by the recorded response time
+        """
+        self.base_url = base_url
+        self.strict = strict
+        self.delay = delay
+        self.metrics = None
+        self._lock = threading.Lock()
+        self._records = defaultdict(deque)
+        # The last record of a request is kept to answer requests repeated more times than recorded (e.g. polling)
+        self._last = {}
+        with open(record_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    key = request_key(record['method'], record['path'], record.get('params'), record.get('json'))
+                    self._records[key].append(record)
+                    self._last[key] = record
+
+    def url_for(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.base_url + path
+
+    def request(self, method, path, params=None, json=None, **kwargs):
+        path = _relative_path(self, path)
+        key = request_key(method, path, params, json)
+        with self._lock:
+            queue = self._records.get(key)
+            record = queue.popleft() if queue else self._last.get(key)
+        if record is None:
+            if self.strict:
+                raise KeyError(f'The request is not in the recording: {key}')
+            record = {'status': 404, 'headers': {'Content-Type': 'application/json'},
+                      'body': base64.b64encode(b'{"code": "NOT_FOUND"}').decode('ascii')}
+        if self.delay and record.get('elapsed'):
+            time.sleep(record['elapsed'])
+        return self._response(method, self.url_for(path), record)
+
+    @staticmethod
+    def _response(method, url, record):
+        response = requests.Response()
+        response.status_code = record['status']
+        response.headers = CaseInsensitiveDict(record.get('headers') or {})
+        response._content = base64.b64decode(record.get('body') or '')
+        response._content_consumed = True
+        response.url = url
+        response.encoding = 'utf-8'
+        response.request = requests.Request(method.upper(), url).prepare()
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,129 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from autotoloka.ratelimit import TokenBucket, WRITE, worker_count
+
+
+OK = 'ok'
+ALREADY_PROCESSED = 'already_processed'
+FAILED = 'failed'
+
+ASSIGNMENT_STATUSES = {'accept': 'ACCEPTED', 'reject': 'REJECTED'}
+DEFAULT_COMMENT = 'generic comment'
+
+ReviewResult = namedtuple('ReviewResult', ['assignment_id', 'action', 'status', 'status_code', 'error'])
+
+
+def review_assignment(session, assignment_id, action='accept', public_comment=DEFAULT_COMMENT):
+    """
+    Accepts or rejects the assignment by its ID
+
+    :param session: TolokaSession the request is sent through
+    :param assignment_id: ID of the assignment
+    :param action: either 'accept' or 'reject'
+    :param public_comment: public comment for the user whose task is accepted/rejected
+    :return: ReviewResult with the status 'ok', 'already_processed' or 'failed'
+    """
+    if action not in ASSIGNMENT_STATUSES:
+        raise ValueError(f'Unknown action {action!r}, expected one of {sorted(ASSIGNMENT_STATUSES)}')
+    patch_params = {'status': ASSIGNMENT_STATUSES[action], 'public_comment': public_comment}
+    try:
+        response = session.patch(f'assignments/{assignment_id}', json=patch_params)
+    except requests.RequestException as error:
+        return ReviewResult(assignment_id, action, FAILED, None, str(error))
+    if response.ok:
+        return ReviewResult(assignment_id, action, OK, response.status_code, None)
+    try:
+        error = response.json()
+    except ValueError:
+        error = {'code': None, 'message': response.text}
+    if response.status_code == 409 and error.get('code') == 'INAPPROPRIATE_STATUS':
+        return ReviewResult(assignment_id, action, ALREADY_PROCESSED, response.status_code, error)
+    return ReviewResult(assignment_id, action, FAILED, response.status_code, error)
+
+
+class BulkReviewer:
+    """
+    Creates a class to accept and reject many assignments concurrently
+    """
+    def __init__(self, session, max_workers=None, requests_per_second=None, journal=None):
+        """
+        Instantiates a BulkReviewer class
+
+        :param session: TolokaSession the requests are sent through
+        :param max_workers: the number of concurrent requests; by default the write concurrency bound
+                            of the session's RateLimiter, which then adapts the concurrency, or 8 without one
+        :param requests_per_second: the maximum rate of requests, if None - the rate is not limited
+        :param journal: RunJournal the sent reviews are recorded in; assignments recorded there with the same
+                        action are not reviewed again, their recorded results are returned instead
+        """
+        self.session = session
+        self.max_workers = max_workers or worker_count(session, WRITE)
+        self.limiter = TokenBucket(requests_per_second) if requests_per_second else None
+        self.journal = journal
+
+    def _review(self, item):
+        assignment_id, action = item[0], item[1]
+        public_comment = item[2] if len(item) > 2 and item[2] is not None else DEFAULT_COMMENT
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return review_assignment(self.session, assignment_id, action, public_comment)
+
+    def iter_review(self, items):
+        """
+        Reviews the assignments, yielding the results as soon as they are ready.
+        The items are consumed lazily, so generators of any length can be given
+
+        :param items: an iterable of (assignment ID, action, public comment) tuples, the comment may be omitted
+        :return: a generator of ReviewResult
+        """
+        # Bounding the number of submitted futures keeps memory flat on huge inputs
+        slots = threading.BoundedSemaphore(self.max_workers * 2)
+        results = []
+        ready = threading.Condition()
+
+        def done(future, item):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = ReviewResult(item[0], item[1], FAILED, None, str(error))
+            if self.journal is not None:
+                self.journal.record_review(result)
+            with ready:
+                results.append(result)
+                ready.notify()
+            slots.release()
+
+        submitted = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item in items:
+                recorded = self.journal.review_result(item[0], item[1]) if self.journal is not None else None
+                if recorded is not None:
+                    yield recorded
+                    continue
+                slots.acquire()
+                executor.submit(self._review, item).add_done_callback(lambda future, item=item: done(future, item))
+                submitted += 1
+                with ready:
+                    finished, results[:] = results[:], []
+                submitted -= len(finished)
+                yield from finished
+            while submitted:
+                with ready:
+                    while not results:
+                        ready.wait()
+                    finished, results[:] = results[:], []
+                submitted -= len(finished)
+                yield from finished
+
+    def review(self, items):
+        """
+        Reviews the assignments and returns all the results
+
+        :param items: an iterable of (assignment ID, action, public comment) tuples, the comment may be omitted
+        :return: a list of ReviewResult in the order of completion
+        """
+        return list(self.iter_review(items))
@@ -0,0 +1,244 @@
+import logging
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from autotoloka.create_pool import PoolCreator
+from autotoloka.json_data import to_plain
+
+
+logger = logging.getLogger(__name__)
+
+Change = namedtuple('Change', ['path', 'old', 'new'])
+Action = namedtuple('Action', ['kind', 'object_type', 'object_id', 'name', 'changes', 'body'])
+SyncResult = namedtuple('SyncResult', ['action', 'status', 'object_id', 'error'])
+
+CREATE = 'create'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+OK = 'ok'
+FAILED = 'failed'
+
+# Fields set by the API, they are never compared or sent back
+READ_ONLY_FIELDS = frozenset({'id', 'owner', 'created', 'status', 'last_started', 'last_stopped',
+                              'last_close_reason', 'type'})
+DATETIME = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2})(:\d{2})?(\.\d+)?$')
+
+
+def normalize(value):
+    """
+    Returns the value in the form the API returns it: 'true'/'false' strings become booleans,
+    whole floats become integers and datetimes get seconds without fractions
+    """
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        if value in ('true', 'false'):
+            return value == 'true'
+        match = DATETIME.match(value)
+        if match:
+            return match.group(1) + (match.group(2) or ':00')
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def same_value(new, old):
+    """
+    Compares two json-like values after normalization; IDs are given as numbers by some sources
+    and as strings by others, so numbers and strings are compared as strings
+    """
+    new, old = normalize(new), normalize(old)
+    if isinstance(new, str) and _is_number(old) or _is_number(new) and isinstance(old, str):
+        return str(new) == str(old)
+    return new == old
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def diff_config(desired, current, path=''):
+    """
+    Compares the desired configuration with the current one. Only the keys present in the desired configuration
+    are compared, nested dictionaries key by key and lists as a whole
+
+    :param desired: a json-like dictionary with the wanted values
+    :param current: a json-like dictionary returned by the API
+    :param path: prefix of the reported paths
+    :return: a list of Change(path, old, new)
+    """
+    changes = []
+    for key, new in desired.items():
+        if key in READ_ONLY_FIELDS and not path:
+            continue
+        old = current.get(key) if isinstance(current, dict) else None
+        key_path = f'{path}.{key}' if path else key
+        if isinstance(new, dict) and isinstance(old, dict):
+            changes.extend(diff_config(new, old, key_path))
+        elif not same_value(new, old):
+            changes.append(Change(key_path, old, new))
+    return changes
+
+
+def merge_config(current, desired, top=True):
+    """
+    Returns the current configuration with the desired values put over it, nested dictionaries are merged.
+    The read-only fields of the object are left out
+    """
+    skipped = READ_ONLY_FIELDS if top else ()
+    merged = {key: value for key, value in current.items() if key not in skipped}
+    for key, value in desired.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value, top=False)
+        elif key not in skipped:
+            merged[key] = value
+    return merged
+
+
+def as_config(config):
+    """
+    Returns a plain dictionary of a json-like configuration or a PoolCreator
+    """
+    if isinstance(config, PoolCreator):
+        return to_plain(config.pool)
+    return to_plain(config)
+
+
+class SyncPlan:
+    """
+    Creates a list of the actions needed to bring the objects to the desired state
+    """
+    def __init__(self, actions):
+        self.actions = actions
+
+    @property
+    def pending(self):
+        return [action for action in self.actions if action.kind != UNCHANGED]
+
+    def describe(self):
+        """
+        Returns a human-readable description of the plan, one line per action and one per changed field
+        """
+        symbols = {CREATE: '+', UPDATE: '~', UNCHANGED: '='}
+        lines = []
+        for action in self.actions:
+            object_id = f' {action.object_id}' if action.object_id is not None else ''
+            lines.append(f'{symbols[action.kind]} {action.object_type}{object_id} {action.name!r} ({action.kind})')
+            for change in action.changes:
+                lines.append(f'    {change.path}: {change.old!r} -> {change.new!r}')
+        counts = {kind: sum(action.kind == kind for action in self.actions) for kind in (CREATE, UPDATE, UNCHANGED)}
+        lines.append(f'{counts[CREATE]} to create, {counts[UPDATE]} to update, {counts[UNCHANGED]} unchanged')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.describe()
+
+
+class ConfigSync:
+    """
+    Creates a class to bring a project and its pools to the configurations described by templates,
+    sending only the requests which change something
+    """
+    def __init__(self, handler, max_workers=8, pool_key='private_name'):
+        """
+        Instantiates a ConfigSync class
+
+        :param handler: TolokaProjectHandler of the project
+        :param max_workers: the number of updates sent at the same time
+        :param pool_key: field identifying a desired pool among the existing ones
+        """
+        self.handler = handler
+        self.max_workers = max_workers
+        self.pool_key = pool_key
+
+    def plan(self, project=None, pools=()):
+        """
+        Compares the desired configurations with the current ones. The project is requested once
+        and all the unarchived pools of the project are listed at once
+
+        :param project: a json-like project configuration, None leaves the project as it is
+        :param pools: json-like pool configurations or PoolCreator instances, matched to the existing pools
+                      by the pool_key field
+        :return: SyncPlan
+        """
+        actions = []
+        project_id = self.handler.project_id
+        if project is not None:
+            desired = as_config(project)
+            current = self.handler.get_project(project_id)
+            changes = diff_config(desired, current)
+            actions.append(Action(UPDATE if changes else UNCHANGED, 'project', project_id,
+                                  current.get('public_name'), changes, merge_config(current, desired)))
+
+        pools = [dict(as_config(pool), project_id=project_id) for pool in pools]
+        if pools:
+            existing = {}
+            for pool in self.handler.iter_pools(project_id=project_id, status=['OPEN', 'CLOSED']):
+                existing.setdefault(pool.get(self.pool_key), pool)
+            for desired in pools:
+                name = desired.get(self.pool_key)
+                current = existing.get(name)
+                if current is None:
+                    actions.append(Action(CREATE, 'pool', None, name, [], desired))
+                    continue
+                changes = diff_config(desired, current)
+                actions.append(Action(UPDATE if changes else UNCHANGED, 'pool', current['id'], name, changes,
+                                      merge_config(current, desired)))
+        return SyncPlan(actions)
+
+    def _apply_action(self, action):
+        if action.kind == CREATE:
+            response = self.handler.session.post(f'{action.object_type}s', json=action.body)
+        else:
+            response = self.handler.session.put(f'{action.object_type}s/{action.object_id}', json=action.body)
+        if not response.ok:
+            return SyncResult(action, FAILED, action.object_id, response.text)
+        body = response.json()
+        self.handler._cache_written(f'{action.object_type}s/{body["id"]}', response, body)
+        return SyncResult(action, OK, body['id'], None)
+
+    def _apply_safely(self, action):
+        try:
+            return self._apply_action(action)
+        except (requests.RequestException, ValueError, KeyError) as error:
+            return SyncResult(action, FAILED, action.object_id, str(error))
+
+    def apply(self, plan):
+        """
+        Sends the creations and updates of the plan concurrently
+
+        :param plan: SyncPlan returned by plan
+        :return: a list of SyncResult in the order of the plan's pending actions
+        """
+        pending = plan.pending
+        if not pending:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._apply_safely, pending))
+        failed = [result for result in results if result.status != OK]
+        logger.info('Sync applied: %s succeeded, %s failed', len(results) - len(failed), len(failed))
+        for result in failed:
+            logger.warning('%s %s %r failed: %s', result.action.kind, result.action.object_type,
+                           result.action.name, result.error)
+        return results
+
+    def sync(self, project=None, pools=(), dry_run=False):
+        """
+        Plans the changes, logs the plan and applies it unless it is a dry run
+
+        :param project: a json-like project configuration, None leaves the project as it is
+        :param pools: json-like pool configurations or PoolCreator instances
+        :param dry_run: if set to True, nothing is changed
+        :return: a pair of the SyncPlan and the list of SyncResult (empty for a dry run)
+        """
+        plan = self.plan(project, pools)
+        logger.info('%s', plan)
+        if dry_run:
+            return plan, []
+        return plan, self.apply(plan)
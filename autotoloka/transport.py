@@ -0,0 +1,189 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from autotoloka.metrics import endpoint_name
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# POST creates objects, so it is only repeated when the server surely has not processed it
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+def backoff_delay(attempt, backoff_factor, max_backoff):
+    """
+    Returns a "full jitter" delay in seconds for the given attempt number
+    """
+    return random.uniform(0, min(max_backoff, backoff_factor * 2 ** attempt))
+
+
+def retry_after_delay(headers):
+    """
+    Returns the delay in seconds requested by the Retry-After header, or None if there is none
+    """
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class TolokaSession:
+    """
+    Creates a shared HTTP transport for the Toloka API: a keep-alive connection pool,
+    default timeouts and retries with jittered exponential backoff
+    """
+    def __init__(self, base_url, headers=None, timeout=(5, 60), max_retries=5, backoff_factor=0.5,
+                 max_backoff=60, pool_maxsize=32, metrics=None, limiter=None):
+        """
+        Instantiates a TolokaSession class
+
+        :param base_url: root URL of the API, every request path is joined to it
+        :param headers: headers sent with every request (e.g. authorization)
+        :param timeout: default (connect, read) timeout in seconds, or a single number for both
+        :param max_retries: how many times a request is repeated on connection errors and retryable statuses
+        :param backoff_factor: base delay in seconds, the n-th retry waits up to backoff_factor * 2 ** n
+        :param max_backoff: upper bound of a single delay in seconds
+        :param pool_maxsize: number of keep-alive connections kept open, should match the expected concurrency
+        :param metrics: Metrics every finished request is recorded into, None disables the recording
+        :param limiter: RateLimiter every attempt goes through, e.g. shared_limiter(oauth_token);
+                        the slot of a streamed request is held until its response is closed
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.metrics = metrics
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        if headers is not None:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url_for(self, path):
+        """
+        Returns an absolute URL for the path, absolute URLs are left untouched
+
+        :param path: path relative to the API root or an absolute URL
+        """
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.base_url + path
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request, retrying connection errors and retryable statuses (429 and 5xx).
+        Non-idempotent requests are only repeated on 429 and connect timeouts
+
+        :param method: HTTP method
+        :param path: path relative to the API root or an absolute URL
+        :param kwargs: keyword arguments for requests.Session.request
+        :return: the last received response; the last connection error is raised if no response was received
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url_for(path)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_errors = (requests.ConnectionError, requests.Timeout) if idempotent else requests.ConnectTimeout
+        retry_statuses = RETRY_STATUSES if idempotent else {429}
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            budget = self.limiter.acquire(method, path) if self.limiter is not None else None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except retry_errors:
+                # No response is released as an overload: refused and timed out connections cut the concurrency
+                self._release(budget, None)
+                if attempt >= self.max_retries:
+                    self._record(method, path, None, started, attempt, kwargs)
+                    raise
+            except requests.RequestException:
+                self._release(budget, None)
+                self._record(method, path, None, started, attempt, kwargs)
+                raise
+            else:
+                if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                    if budget is not None and kwargs.get('stream'):
+                        self._release_on_close(response, budget)
+                    else:
+                        self._release(budget, response.status_code)
+                    self._record(method, path, response, started, attempt, kwargs)
+                    return response
+                delay = retry_after_delay(response.headers)
+                self._release(budget, response.status_code, delay)
+                if delay is not None:
+                    response.close()
+                    time.sleep(min(delay, self.max_backoff))
+                    attempt += 1
+                    continue
+                response.close()
+            time.sleep(backoff_delay(attempt, self.backoff_factor, self.max_backoff))
+            attempt += 1
+
+    def _release(self, budget, status, retry_after=None):
+        if budget is not None:
+            self.limiter.release(budget, status, retry_after)
+
+    def _release_on_close(self, response, budget):
+        # A streamed body is still being transferred, so the slot is held until the response is closed
+        close, released = response.close, []
+
+        def release_and_close():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    self.limiter.release(budget, response.status_code)
+
+        response.close = release_and_close
+
+    def _record(self, method, path, response, started, retries, kwargs):
+        if self.metrics is None:
+            return
+        seconds = time.perf_counter() - started
+        if response is None:
+            self.metrics.record_request(method, endpoint_name(path, self.base_url), 'error', seconds, retries=retries)
+            return
+        body = response.request.body if response.request is not None else None
+        received = response.headers.get('Content-Length')
+        if received is None:
+            # The size of a streamed body is unknown until it is read by the caller
+            received = 0 if kwargs.get('stream') else len(response.content)
+        self.metrics.record_request(method, endpoint_name(path, self.base_url), response.status_code, seconds,
+                                    bytes_sent=len(body) if body else 0, bytes_received=int(received),
+                                    retries=retries)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
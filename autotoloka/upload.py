@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from autotoloka.create_task import TaskSuiteCreator
+from autotoloka.utils import iter_chunks
+
+
+BatchResult = namedtuple('BatchResult', ['batch_number', 'suites', 'tasks', 'status', 'operation_id',
+                                         'task_suite_ids', 'error'])
+
+SUCCESS = 'SUCCESS'
+FAIL = 'FAIL'
+FINISHED_STATUSES = (SUCCESS, FAIL)
+
+
+class TaskSuiteUploader:
+    """
+    Creates a class to upload any number of tasks in size-capped batches of task-suites,
+    several batches at a time, using the asynchronous operations of the API
+    """
+    def __init__(self, session, tasks_on_suite=10, suites_per_batch=500, max_in_flight=4, async_mode=True,
+                 poll_interval=1, max_poll_interval=10):
+        """
+        Instantiates a TaskSuiteUploader class
+
+        :param session: TolokaSession the requests are sent through
+        :param tasks_on_suite: the number of tasks on one suite
+        :param suites_per_batch: the number of task-suites sent in one request
+        :param max_in_flight: the number of batches uploaded at the same time; together with suites_per_batch
+                              it bounds the number of tasks held in memory
+        :param async_mode: if set to True, batches are created as asynchronous operations which are polled
+        :param poll_interval: the first delay between operation status requests in seconds
+        :param max_poll_interval: the longest delay between operation status requests in seconds
+        """
+        self.session = session
+        self.tasks_on_suite = tasks_on_suite
+        self.suites_per_batch = suites_per_batch
+        self.max_in_flight = max_in_flight
+        self.async_mode = async_mode
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    def wait_for_operation(self, operation):
+        """
+        Polls the operation until it is finished
+
+        :param operation: json-like operation returned by the API
+        :return: the finished operation
+        """
+        interval = self.poll_interval
+        while operation.get('status') not in FINISHED_STATUSES:
+            time.sleep(interval)
+            interval = min(self.max_poll_interval, interval * 1.5)
+            response = self.session.get(f'operations/{operation["id"]}')
+            response.raise_for_status()
+            operation = response.json()
+        return operation
+
+    def operation_suite_ids(self, operation_id):
+        """
+        Returns IDs of the task-suites created by the operation, read from the operation's log
+        """
+        response = self.session.get(f'operations/{operation_id}/log')
+        response.raise_for_status()
+        task_suite_ids = []
+        for entry in response.json():
+            output = entry.get('output') or {}
+            if entry.get('success') and output.get('task_suite_id') is not None:
+                task_suite_ids.append(output['task_suite_id'])
+        return task_suite_ids
+
+    def upload_batch(self, batch_number, task_suites):
+        """
+        Creates a batch of task-suites
+
+        :param batch_number: sequential number of the batch, starting from 0
+        :param task_suites: a list of json-like task-suites
+        :return: BatchResult
+        """
+        suites, tasks = len(task_suites), sum(len(suite['tasks']) for suite in task_suites)
+        params = {'allow_defaults': 'true'}
+        if self.async_mode:
+            params['async_mode'] = 'true'
+        try:
+            response = self.session.post('task-suites', params=params, json=task_suites)
+            if not response.ok:
+                return BatchResult(batch_number, suites, tasks, FAIL, None, [], response.text)
+            body = response.json()
+            if not self.async_mode:
+                created = [item['id'] for _, item in sorted(body.get('items', {}).items(), key=lambda kv: int(kv[0]))]
+                status = SUCCESS if not body.get('validation_errors') else FAIL
+                return BatchResult(batch_number, suites, tasks, status, None, created,
+                                   body.get('validation_errors'))
+            operation = self.wait_for_operation(body)
+            created = self.operation_suite_ids(operation['id'])
+            return BatchResult(batch_number, suites, tasks, operation['status'], operation['id'], created,
+                               operation.get('details') if operation['status'] == FAIL else None)
+        except (requests.RequestException, ValueError, KeyError) as error:
+            return BatchResult(batch_number, suites, tasks, FAIL, None, [], str(error))
+
+    def iter_batches(self, pool_id, input_values):
+        """
+        Lazily groups the input values into batches of task-suites
+        """
+        suites = (TaskSuiteCreator(pool_id, chunk).task_suite
+                  for chunk in iter_chunks(input_values, self.tasks_on_suite))
+        return iter_chunks(suites, self.suites_per_batch)
+
+    def iter_upload(self, pool_id, input_values):
+        """
+        Uploads the tasks, yielding the result of every batch in the order of the batches.
+        The input values are consumed lazily, so generators of any length can be given
+
+        :param pool_id: ID of the pool
+        :param input_values: an iterable of dictionaries with a certain key-value structure
+        :return: a generator of BatchResult
+        """
+        slots = threading.Semaphore(self.max_in_flight)
+        pending = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            for batch_number, batch in enumerate(self.iter_batches(pool_id, input_values)):
+                slots.acquire()
+                future = executor.submit(self.upload_batch, batch_number, batch)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append(future)
+                while pending and pending[0].done():
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def upload(self, pool_id, input_values):
+        """
+        Uploads the tasks and returns the results of all the batches
+
+        :param pool_id: ID of the pool
+        :param input_values: an iterable of dictionaries with a certain key-value structure
+        :return: a list of BatchResult
+        """
+        return list(self.iter_upload(pool_id, input_values))
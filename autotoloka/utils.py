@@ -1,6 +1,6 @@
 import json
+import itertools
 from autotoloka.json_data import json_data_path
-from imagededup.methods import PHash
 import os
 
 
@@ -34,6 +34,48 @@ def get_chunks(array, chunk_number=0, by_length=False, chunk_length=0):
     return chunks
 
 
+def iter_chunks(iterable, chunk_length):
+    """
+    Lazily splits any iterable into lists of chunk_length items, the last chunk may be shorter
+
+    :param iterable: an iterable of items, e.g. a generator
+    :param chunk_length: the number of items in a chunk
+    :return: a generator of lists
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_length))
+        if not chunk:
+            return
+        yield chunk
+
+
+def unique_file_names(file_names):
+    """
+    Makes the file names unique by adding a counter to repeated names, keeping their extensions
+
+    :param file_names: an iterable of file names
+    :return: a list of unique file names in the same order, e.g. ['a.png', 'a_2.png', 'b.jpeg']
+    """
+    file_names = list(file_names)
+    taken = set(file_names)
+    counters = {}
+    result = []
+    for file_name in file_names:
+        if file_name not in counters:
+            counters[file_name] = 1
+            result.append(file_name)
+            continue
+        stem, extension = os.path.splitext(file_name)
+        new_file_name = file_name
+        while new_file_name in taken:
+            counters[file_name] += 1
+            new_file_name = f'{stem}_{counters[file_name]}{extension}'
+        taken.add(new_file_name)
+        result.append(new_file_name)
+    return result
+
+
 def print_json(item, indent=4):
     """
     Pretty-prints the mutable item
@@ -53,35 +95,31 @@ def write_config_to_json_files(config_data: dict, file_name: str):
     """
     if file_name is None or file_name[-5:] == '.json':
         raise ValueError('Please, provide the file_name without specifying the format')
-    with open(f'{json_data_path}/{file_name}.json', 'w') as file:
-        json.dump(config_data, file, indent=4)
+    with open(os.path.join(json_data_path, 'json_files', f'{file_name}.json'), 'w', encoding='utf-8') as file:
+        json.dump(config_data, file, indent=4, ensure_ascii=False)
 
 
-def check_for_duplicates(image_folder):
-    phasher = PHash()
-    encodings = phasher.encode_images(image_dir=image_folder)
-    duplicates = phasher.find_duplicates(encoding_map=encodings)
+def check_for_duplicates(image_folder, hash_index_path=None, max_distance_threshold=10):
+    """
+    Finds near-duplicate images in a folder and deletes them, keeping the first image (by name) of every group.
+    With a persistent index the images are also checked against everything collected in earlier runs
 
-    to_delete = {}
+    :param image_folder: folder with the images
+    :param hash_index_path: path of the HashIndex file, if None - only the folder itself is checked
+    :param max_distance_threshold: the maximum Hamming distance between hashes of duplicates
+    :return: a list of names of the deleted duplicates
+    """
+    from autotoloka.hash_index import HashIndex
 
-    for k, v in duplicates.items():
-        if v:
-            to_delete[k] = v
+    with HashIndex(hash_index_path or ':memory:') as index:
+        duplicates = index.check_folder(image_folder, max_distance=max_distance_threshold)
 
-    to_delete_keys = list(to_delete.keys())
     images_to_reject = []
-
-    while to_delete_keys:
-        first = to_delete_keys.pop(0)
-        first_values = to_delete[first]
-        for value in first_values:
-            try:
-                os.remove(os.path.join(image_folder, value))
-                to_delete_keys.remove(value)
-                images_to_reject.append(value)
-            except FileNotFoundError:
-                pass
-            except ValueError:
-                pass
+    for file_name in duplicates:
+        try:
+            os.remove(os.path.join(image_folder, file_name))
+            images_to_reject.append(file_name)
+        except FileNotFoundError:
+            pass
 
     return images_to_reject
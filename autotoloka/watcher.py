@@ -0,0 +1,120 @@
+import time
+from collections import Counter
+
+
+SUBMITTED_STATUSES = ('SUBMITTED', 'ACCEPTED', 'REJECTED')
+# Fields recording when an assignment got the status, the changes since the previous poll are requested by them
+TRANSITION_FIELDS = {'SUBMITTED': 'submitted', 'ACCEPTED': 'accepted', 'REJECTED': 'rejected'}
+
+
+class PoolWatcher:
+    """
+    Creates a class to watch a pool until it is completed, fetching only the assignments submitted, accepted
+    or rejected since the previous poll and polling less often while nothing is submitted
+    """
+    def __init__(self, handler, pool_id, min_interval=1, max_interval=30, backoff=1.5, stop_reasons=('COMPLETED',),
+                 page_size=1000):
+        """
+        Instantiates a PoolWatcher class
+
+        :param handler: TolokaProjectHandler the requests are sent through
+        :param pool_id: ID of the pool
+        :param min_interval: delay between polls in seconds right after new submissions
+        :param max_interval: the longest delay between polls in seconds
+        :param backoff: factor the delay is multiplied by after every poll without new submissions
+        :param stop_reasons: close reasons of the pool which finish the watching
+        :param page_size: the number of assignments requested per page
+        """
+        self.handler = handler
+        self.pool_id = pool_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stop_reasons = stop_reasons
+        self.page_size = page_size
+
+        self.interval = min_interval
+        self.cursors = {}
+        self.statuses = {}
+        self.counts = Counter()
+        self.pool = None
+
+    @property
+    def submitted(self):
+        """
+        The number of assignments submitted so far, including the already accepted and rejected ones
+        """
+        return sum(self.counts[status] for status in SUBMITTED_STATUSES)
+
+    @property
+    def finished(self):
+        return self.pool is not None and self.pool.get('status') != 'OPEN' \
+               and self.pool.get('last_close_reason') in self.stop_reasons
+
+    def poll(self):
+        """
+        Fetches the pool's state and the assignments which got one of the submitted statuses since the previous
+        poll, so the counts of the statuses follow the reviews as well
+
+        The times are not unique: the assignments are paged by time and then id, and every poll starts at the last
+        time seen (*_gte), the assignments already counted there are told apart by their statuses.
+
+        :return: a list of newly submitted assignments (json-like dictionaries)
+        """
+        response = self.handler.session.get(f'pools/{self.pool_id}')
+        response.raise_for_status()
+        self.pool = response.json()
+
+        new = []
+        for status in SUBMITTED_STATUSES:
+            field = TRANSITION_FIELDS[status]
+            cursor = self.cursors.get(status)
+            filters = {} if cursor is None else {f'{field}_gte': cursor}
+            for assignment in self.handler.iter_assignments(self.pool_id, status=status, page_size=self.page_size,
+                                                            cursor_field=field, **filters):
+                previous = self.statuses.get(assignment['id'])
+                if previous != assignment['status']:
+                    if previous is not None:
+                        self.counts[previous] -= 1
+                    self.counts[assignment['status']] += 1
+                    self.statuses[assignment['id']] = assignment['status']
+                    if previous is None:
+                        new.append(assignment)
+                cursor = max(cursor or assignment[field], assignment[field])
+            self.cursors[status] = cursor
+
+        if new:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return new
+
+    def iter_submissions(self, on_tick=None):
+        """
+        Polls the pool until it is finished, yielding every submitted assignment once
+
+        :param on_tick: function called with the watcher after every poll, e.g. for drawing a progress bar
+        :return: a generator of assignments (json-like dictionaries)
+        """
+        while True:
+            new = self.poll()
+            if on_tick is not None:
+                on_tick(self)
+            yield from new
+            # The poll after closing has already picked up the last submissions
+            if self.finished:
+                return
+            time.sleep(self.interval)
+
+    def watch(self, on_submission=None, on_tick=None):
+        """
+        Polls the pool until it is finished
+
+        :param on_submission: function called with every newly submitted assignment
+        :param on_tick: function called with the watcher after every poll
+        :return: counts of the assignments' statuses
+        """
+        for assignment in self.iter_submissions(on_tick=on_tick):
+            if on_submission is not None:
+                on_submission(assignment)
+        return self.counts
@@ -0,0 +1,85 @@
+"""
+Compares the images/sec of autotoloka.hashing.hash_images with imagededup's PHash().encode_images
+on a generated corpus of JPEG photos. The baseline needs the benchmarks extra: pip install autotoloka[benchmarks]
+
+    python benchmarks/bench_hashing.py --images 500 --width 2048 --height 1536
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from autotoloka.hashing import hash_images
+
+
+def generate_corpus(folder, number_of_images, width, height, seed=0):
+    """
+    Writes random smooth "photos" (gradients with blobs and noise) into a folder as JPEG files
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    paths = []
+    for i in range(number_of_images):
+        channels = []
+        for _ in range(3):
+            cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(width / 8, width / 2)
+            blob = np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * r ** 2))
+            gradient = rng.uniform(-1, 1) * x / width + rng.uniform(-1, 1) * y / height
+            channels.append(blob + gradient)
+        pixels = np.stack(channels, axis=-1)
+        pixels = (pixels - pixels.min()) / (np.ptp(pixels) + 1e-9) * 255
+        pixels += rng.normal(0, 8, pixels.shape)
+        path = os.path.join(folder, f'image_{i:06d}.jpg')
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def bench_imagededup(folder):
+    from imagededup.methods import PHash
+
+    started = time.perf_counter()
+    PHash().encode_images(image_dir=folder)
+    return time.perf_counter() - started
+
+
+def bench_hash_images(paths, max_workers):
+    started = time.perf_counter()
+    hash_images(paths, max_workers=max_workers)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--width', type=int, default=2048)
+    parser.add_argument('--height', type=int, default=1536)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--folder', default=None, help='reuse an existing corpus instead of generating one')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.folder or tmp
+        if args.folder:
+            paths = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+        else:
+            print(f'Generating {args.images} images {args.width}x{args.height} ...')
+            paths = generate_corpus(folder, args.images, args.width, args.height)
+
+        results = {'hash_images (1 process)': bench_hash_images(paths, max_workers=1),
+                   f'hash_images ({args.workers or os.cpu_count()} processes)':
+                       bench_hash_images(paths, max_workers=args.workers)}
+        try:
+            results['imagededup PHash().encode_images'] = bench_imagededup(folder)
+        except ImportError:
+            print('imagededup is not installed, skipping the baseline')
+
+        for name, seconds in results.items():
+            print(f'{name:<40} {len(paths) / seconds:10.1f} images/sec ({seconds:.2f} s)')
+
+
+if __name__ == '__main__':
+    main()
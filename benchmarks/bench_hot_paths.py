@@ -0,0 +1,162 @@
+"""
+Measures the throughput of the handler's hot paths against a local FakeTolokaServer, for every combination
+of dataset size and concurrency, and stores the results per version of the package
+
+    python benchmarks/bench_hot_paths.py --sizes 100 1000 --workers 1 8 --latency 0.005
+    python benchmarks/bench_hot_paths.py --compare benchmarks/results/0.0.20-1a2b3c4.json
+
+Stages:
+    build     - grouping the tasks with get_chunks and building TaskSuiteCreator suites (no requests)
+    upload    - create_task_suite of all the tasks, one task per suite
+    download  - get_files_from_pool, one attachment per assignment
+    dedup     - check_for_duplicates of the downloaded folder
+    review    - process_all_tasks accepting every assignment
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from autotoloka.create_task import TaskSuiteCreator
+from autotoloka.fake_api import FakeToloka, FakeTolokaServer
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.utils import get_chunks, check_for_duplicates
+from autotoloka.watcher import PoolWatcher
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(ROOT, 'benchmarks', 'results')
+STAGES = ('build', 'upload', 'download', 'dedup', 'review')
+
+
+def package_version():
+    """
+    Returns the version of setup.py followed by the short hash of the checked out commit
+    """
+    with open(os.path.join(ROOT, 'setup.py'), 'r', encoding='utf-8') as file:
+        match = re.search(r"version='([^']+)'", file.read())
+    version = match.group(1) if match else 'unknown'
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return version
+    return f'{version}-{commit}'
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Hides the prints and progress bars of the measured code
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def timed(results, stage, items, function, *args, **kwargs):
+    started = time.perf_counter()
+    with quiet():
+        value = function(*args, **kwargs)
+    seconds = time.perf_counter() - started
+    results[stage] = {'seconds': round(seconds, 4), 'items': items, 'per_second': round(items / seconds, 1)}
+    return value
+
+
+def run_case(size, workers, latency, tasks_on_suite=1):
+    """
+    Runs all the stages on a fresh fake server
+
+    :param size: the number of tasks, every task gets one assignment with one attachment
+    :param workers: the concurrency of the downloads and the reviews, also the size of the connection pool
+    :param latency: seconds the fake server adds to every response
+    :param tasks_on_suite: the number of tasks on one suite
+    :return: a dictionary {stage: {seconds, items, per_second}}
+    """
+    results = {}
+    input_values = [{'image': f'https://example.com/images/{i}.jpg'} for i in range(size)]
+    with FakeTolokaServer(toloka=FakeToloka(seed=size), latency=latency) as server, \
+            tempfile.TemporaryDirectory() as folder:
+        with quiet():
+            handler = TolokaProjectHandler('benchmark', project_id=0, api_url=server.url, verbose=False,
+                                           pool_maxsize=max(workers, 4))
+            handler.project_id = handler.session.post('projects', json={'public_name': 'benchmark'}).json()['id']
+            pool_id = handler.session.post('pools', json={'project_id': handler.project_id}).json()['id']
+
+        timed(results, 'build', size, lambda: [TaskSuiteCreator(pool_id, chunk).task_suite for chunk in
+                                               get_chunks(input_values, by_length=True,
+                                                          chunk_length=tasks_on_suite)])
+        timed(results, 'upload', size, handler.create_task_suite, pool_id, input_values,
+              tasks_on_suite=tasks_on_suite)
+
+        with quiet():
+            handler.session.post(f'pools/{pool_id}/open')
+            PoolWatcher(handler, pool_id, min_interval=0.05, max_interval=0.5).watch()
+
+        download_folder = os.path.join(folder, 'images')
+        timed(results, 'download', size, handler.get_files_from_pool, pool_id, download_folder, max_workers=workers)
+        timed(results, 'dedup', len(os.listdir(download_folder)), check_for_duplicates, download_folder)
+        timed(results, 'review', size, handler.process_all_tasks, pool_id, 'accept', max_workers=workers)
+        handler.session.close()
+    return results
+
+
+def compare(cases, previous_path):
+    """
+    Prints the change of the throughput against an earlier results file
+    """
+    with open(previous_path, 'r', encoding='utf-8') as file:
+        previous = json.load(file)
+    before = {(case['size'], case['workers'], case['latency'], case['stage']): case['per_second']
+              for case in previous['cases']}
+    print(f'\nCompared with {previous["version"]}:')
+    for case in cases:
+        key = (case['size'], case['workers'], case['latency'], case['stage'])
+        if key in before and before[key]:
+            change = case['per_second'] / before[key] - 1
+            print(f'{case["stage"]:<9} size {case["size"]:<7} workers {case["workers"]:<4} '
+                  f'{before[key]:10.1f} -> {case["per_second"]:10.1f} items/sec ({change:+.1%})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added to every response')
+    parser.add_argument('--tasks-on-suite', type=int, default=1)
+    parser.add_argument('--output', default=None,
+                        help='results file, benchmarks/results/<version>.json by default')
+    parser.add_argument('--compare', default=None, help='an earlier results file to compare with')
+    args = parser.parse_args()
+
+    cases = []
+    for size in args.sizes:
+        for workers in args.workers:
+            results = run_case(size, workers, args.latency, args.tasks_on_suite)
+            for stage in STAGES:
+                cases.append(dict(results[stage], size=size, workers=workers, latency=args.latency, stage=stage))
+                print(f'{stage:<9} size {size:<7} workers {workers:<4} {results[stage]["per_second"]:10.1f} '
+                      f'items/sec ({results[stage]["seconds"]:.2f} s)')
+
+    version = package_version()
+    output = args.output or os.path.join(RESULTS_FOLDER, f'{version}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({'version': version, 'created': datetime.now().isoformat(timespec='seconds'),
+                   'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count(),
+                   'cases': cases}, file, indent=4)
+    print(f'Results written into {output}')
+
+    if args.compare:
+        compare(cases, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures the startup cost of the package with `python -X importtime`
+
+    python benchmarks/bench_import.py --statement "from autotoloka import TolokaProjectHandler" --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ('numpy', 'PIL', 'yadisk', 'tqdm', 'imagededup', 'pandas', 'aiohttp')
+
+
+def import_times(statement):
+    """
+    Runs the statement in a fresh interpreter and parses the -X importtime report
+
+    :param statement: python code to run, e.g. 'import autotoloka'
+    :return: the wall time of the statement in microseconds, a dictionary {module: cumulative microseconds}
+             and the list of imported heavy modules
+    """
+    probe = (f'import time\nstarted = time.perf_counter()\n{statement}\n'
+             f'elapsed = int((time.perf_counter() - started) * 1e6)\nimport sys\n'
+             f'print(elapsed, ",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                             capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        # A module can be listed more than once, only its first (real) import counts
+        cumulative.setdefault(module, int(cumulative_us))
+    elapsed, _, heavy = process.stdout.strip().partition(' ')
+    return int(elapsed), cumulative, [module for module in heavy.split(',') if module]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--statement', default='import autotoloka')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='the number of the slowest modules to print')
+    parser.add_argument('--output', default=None, help='write the results into a json file')
+    args = parser.parse_args()
+
+    runs = [import_times(args.statement) for _ in range(args.repeat)]
+    totals = [elapsed for elapsed, _, _ in runs]
+    _, cumulative, heavy = runs[-1]
+
+    print(f'{args.statement!r}: median {statistics.median(totals) / 1000:.1f} ms '
+          f'(min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms, {args.repeat} runs)')
+    print(f'Heavy modules imported: {", ".join(heavy) or "none"}')
+    for module, microseconds in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{microseconds / 1000:10.1f} ms  {module}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'statement': args.statement, 'median_us': statistics.median(totals), 'runs_us': totals,
+                       'heavy_modules': heavy}, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
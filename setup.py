@@ -12,9 +12,11 @@ INSTALL_REQUIRES = ['requests==2.25.1',
                     'Pillow==8.3.2',
                     'pandas==1.2.4',
                     'yadisk==1.2.14',
-                    'imagededup==0.0.2',
                     'tqdm']
 
+# imagededup is only the baseline of benchmarks/bench_hashing.py
+EXTRAS_REQUIRE = {'async': ['aiohttp>=3.7'], 'parquet': ['pyarrow>=3.0'], 'benchmarks': ['imagededup==0.0.2']}
+
 # Reading the contents of the README.md file
 this_directory = os.path.abspath(os.path.dirname(__file__))
 with open(os.path.join(this_directory, 'README.md'), encoding='utf-8') as file:
@@ -29,15 +31,17 @@ setup(
     description=DESCRIPTION,
     long_description=long_description,
     long_description_content_type='text/markdown',
-    packages=find_packages(),
+    packages=find_packages(exclude=('tests', 'tests.*')),
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
+    python_requires='>=3.7',
     keywords=['python'],
     classifiers=[
         "Development Status :: 1 - Planning",
         "Intended Audience :: Developers",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Operating System :: OS Independent",
     ],
     include_package_data=True
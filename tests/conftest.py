@@ -0,0 +1,44 @@
+import pytest
+
+from autotoloka.fake_api import FakeTolokaServer
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.json_data import json_data
+from autotoloka.watcher import PoolWatcher
+
+
+@pytest.fixture
+def server(request):
+    """
+    A local FakeTolokaServer, stopped after the test; a FakeToloka may be given by indirect parametrization
+    """
+    with FakeTolokaServer(toloka=getattr(request, 'param', None)) as server:
+        yield server
+
+
+@pytest.fixture
+def handler(server):
+    """
+    A TolokaProjectHandler of a new collecting-images project on the fake server, without rate limiting
+    """
+    handler = TolokaProjectHandler('token', project_id=0, api_url=server.url, verbose=False, rate_limiter=False)
+    handler.project_id = handler.create_toloka_project(json_data['collecting_images'])
+    yield handler
+    handler.session.close()
+
+
+@pytest.fixture
+def completed_pool(handler):
+    """
+    A function creating a pool of one-task suites and waiting until the simulated workers complete it,
+    returns the pool's ID
+    """
+    def create(number_of_tasks, overlap=1, name='Tests'):
+        pool_id = handler.create_toloka_pool(private_name=name,
+                                             defaults={'default_overlap_for_new_task_suites': overlap})
+        handler.upload_task_suites(pool_id, [{'product_title': f'title-{i}', 'description': 'Any photo'}
+                                             for i in range(number_of_tasks)], tasks_on_suite=1)
+        handler.open_close_pool(pool_id)
+        PoolWatcher(handler, pool_id, min_interval=0.01, max_interval=0.05).watch()
+        return pool_id
+
+    return create
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from autotoloka.aggregation import (encode, answers_from_assignments, answers_from_frame, aggregate, majority_vote,
+                                    weighted_majority, dawid_skene, to_frames)
+from autotoloka.fake_api import FakeToloka
+
+
+def simulated_answers(n_tasks=300, accuracies=(0.95, 0.9, 0.85, 0.4, 0.35), n_labels=3, seed=0):
+    """
+    Every worker labels every task, correctly with the worker's accuracy and uniformly wrong otherwise
+    """
+    rng = np.random.default_rng(seed)
+    truth = rng.integers(0, n_labels, n_tasks)
+    tasks, workers, labels = [], [], []
+    for worker, accuracy in enumerate(accuracies):
+        correct = rng.random(n_tasks) < accuracy
+        wrong = (truth + rng.integers(1, n_labels, n_tasks)) % n_labels
+        tasks += [f'task-{i}' for i in range(n_tasks)]
+        workers += [f'worker-{worker}'] * n_tasks
+        labels += [f'label-{label}' for label in np.where(correct, truth, wrong)]
+    return encode(tasks, workers, labels), {f'task-{i}': f'label-{label}' for i, label in enumerate(truth)}
+
+
+def accuracy(result, truth):
+    return np.mean([label == truth[task] for task, label in zip(result.tasks, result.labels)])
+
+
+def test_majority_vote_breaks_ties_by_the_smallest_label():
+    answers = encode(['a', 'a', 'a', 'b', 'b'], ['x', 'y', 'z', 'x', 'y'], ['cat', 'cat', 'dog', 'dog', 'cat'])
+    result = majority_vote(answers)
+    assert dict(zip(result.tasks, result.labels)) == {'a': 'cat', 'b': 'cat'}
+    assert result.confidence.tolist() == pytest.approx([2 / 3, 0.5])
+    assert dict(zip(result.workers, result.skills)) == pytest.approx({'x': 0.5, 'y': 1.0, 'z': 0.0})
+
+
+@pytest.mark.parametrize('method', [weighted_majority, dawid_skene])
+def test_skilled_workers_outvote_the_majority(method):
+    answers, truth = simulated_answers()
+    result = method(answers)
+    assert accuracy(result, truth) > accuracy(majority_vote(answers), truth)
+    skills = dict(zip(result.workers, result.skills))
+    assert min(skills[f'worker-{worker}'] for worker in range(3)) > max(skills['worker-3'], skills['worker-4'])
+    assert np.allclose(result.posteriors.sum(axis=1), 1)
+
+
+def test_encoding_rejects_missing_values():
+    with pytest.raises(ValueError):
+        encode([], [], [])
+    with pytest.raises(ValueError):
+        encode(['a', None], ['x', 'y'], [1, 2])
+    with pytest.raises(ValueError):
+        aggregate(encode(['a'], ['x'], [1]), 'unknown')
+
+
+def test_answers_of_frames_and_assignments_agree():
+    rows = [('a', 'x', 'cat'), ('a', 'y', 'dog'), ('b', 'x', None), ('b', 'y', 'dog')]
+    from_frame = answers_from_frame(pd.DataFrame(rows, columns=['task_id', 'user_id', 'OUTPUT:label']), 'label')
+    assignments = [{'user_id': user, 'tasks': [{'id': task}], 'solutions': [{'output_values': {'label': label}}]}
+                   for task, user, label in rows]
+    from_assignments = answers_from_assignments(assignments, 'label')
+    assert len(from_frame.label_codes) == len(from_assignments.label_codes) == 3
+    assert to_frames(majority_vote(from_frame))[0].equals(to_frames(majority_vote(from_assignments))[0])
+
+
+def label_solution(task, worker_number, rng):
+    # Most workers answer 'yes', every fifth one 'no'
+    return {'label': 'no' if worker_number % 5 == 4 else 'yes'}, None
+
+
+@pytest.mark.parametrize('server', [FakeToloka(solution_factory=label_solution)], indirect=True)
+def test_handler_aggregates_overlapping_answers(handler, completed_pool):
+    pool_id = completed_pool(4, overlap=5)
+    result = handler.aggregate_answers(pool_id, 'label', method='majority_vote')
+    assert len(result.tasks) == 4
+    assert set(result.labels) == {'yes'}
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids[:5]])
+    # A single status is a status, not a list of its characters
+    accepted = handler.aggregate_answers(pool_id, 'label', method='majority_vote', status='ACCEPTED')
+    assert 1 <= len(accepted.tasks) <= 4
+    assert len(accepted.workers) == len({item['user_id'] for item in handler.iter_assignments(pool_id)
+                                         if item['id'] in ids[:5]})
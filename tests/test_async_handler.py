@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+import pytest
+
+from autotoloka import async_handler
+from autotoloka.async_handler import AsyncTolokaProjectHandler
+from autotoloka.fake_api import FakeTolokaServer
+from autotoloka.ratelimit import RateLimiter, READ, shared_limiter
+from autotoloka.review import OK, ALREADY_PROCESSED, FAILED
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_handler(server, **kwargs):
+    return AsyncTolokaProjectHandler('token', api_url=server.url, **dict({'rate_limiter': False}, **kwargs))
+
+
+async def completed_pool(handler, number_of_tasks):
+    """
+    Creates a project and a pool of one-task suites, opens it and waits until the simulated workers complete it
+    """
+    await handler.create_project({'public_name': 'Async tests'})
+    pool = await handler.create_pool(private_name='Async tests')
+    await handler.create_task_suite(pool['id'], [{'image': f'image-{i}'} for i in range(number_of_tasks)],
+                                    tasks_on_suite=1)
+    await handler.open_pool(pool['id'])
+    while (await handler.get_pool(pool['id']))['status'] == 'OPEN':
+        await asyncio.sleep(0.01)
+    return pool['id']
+
+
+def test_server_errors_are_retried():
+    async def scenario(server, project_id):
+        async with make_handler(server, backoff_factor=0.001) as handler:
+            return [await handler.get_project(project_id) for _ in range(20)]
+
+    with FakeTolokaServer(error_rate=0.3, seed=1) as server:
+        # POST is not repeated on 500, so the project is created without going through the server
+        _, project = server.toloka.create_project({'public_name': 'Retries'})
+        projects = run(scenario(server, project['id']))
+        assert {item['id'] for item in projects} == {project['id']}
+        assert server.requests > 20
+
+
+def test_retry_after_is_waited_instead_of_backoff(monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        if delay:
+            delays.append(delay)
+        await sleep(delay)
+
+    monkeypatch.setattr(async_handler.asyncio, 'sleep', recording_sleep)
+
+    async def scenario(server):
+        async with make_handler(server, backoff_factor=100) as handler:
+            project = await handler.create_project({'public_name': 'Throttled'})
+            return [await handler.get_project(project['id']) for _ in range(15)]
+
+    with FakeTolokaServer(requests_per_second=10, retry_after=0.1) as server:
+        projects = run(scenario(server))
+    assert len(projects) == 15
+    assert delays and set(delays) == {0.1}
+
+
+def test_retries_give_up_after_max_retries():
+    async def scenario(server):
+        async with make_handler(server, max_retries=2, backoff_factor=0.001) as handler:
+            await handler.get_project('1')
+
+    with FakeTolokaServer(error_rate=1.0) as server:
+        with pytest.raises(aiohttp.ClientResponseError) as error:
+            run(scenario(server))
+        assert error.value.status == 500
+        assert server.requests == 3
+
+
+def test_iter_items_follows_the_id_cursor(server):
+    async def scenario():
+        async with make_handler(server) as handler:
+            await handler.create_project({'public_name': 'Pagination'})
+            pool = await handler.create_pool(private_name='Pagination')
+            await handler.create_task_suite(pool['id'], [{'image': str(i)} for i in range(25)], tasks_on_suite=1)
+            requests_before = server.requests
+            suites = [suite async for suite in handler.iter_task_suites(pool['id'], page_size=10)]
+            return suites, server.requests - requests_before
+
+    suites, pages = run(scenario())
+    ids = [suite['id'] for suite in suites]
+    assert len(ids) == 25
+    assert ids == sorted(set(ids))
+    assert pages == 3
+
+
+def test_review_of_processed_assignment_is_not_a_failure(server):
+    async def scenario():
+        async with make_handler(server) as handler:
+            pool_id = await completed_pool(handler, 3)
+            ids = sorted([assignment['id'] async for assignment in handler.iter_assignments(pool_id)])
+            first = await handler.review_assignments([(ids[0], 'accept'), (ids[1], 'reject', 'Bad photo')])
+            second = await handler.review_assignments([(ids[0], 'accept'), (ids[1], 'reject'),
+                                                       ('missing', 'accept')])
+            return first, second
+
+    first, second = run(scenario())
+    assert [result.status for result in first] == [OK, OK]
+    assert [result.status for result in second] == [ALREADY_PROCESSED, ALREADY_PROCESSED, FAILED]
+    assert second[0].status_code == 409
+    assert second[0].error['code'] == 'INAPPROPRIATE_STATUS'
+    assert second[2].status_code == 404
+
+
+def test_reviews_are_taken_lazily_by_a_bounded_number_of_workers(server, monkeypatch):
+    in_flight, peak, finished, ahead = [0], [0], [0], []
+
+    async def review_assignment(self, assignment_id, action='accept', public_comment=None):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0)
+        in_flight[0] -= 1
+        finished[0] += 1
+        return assignment_id
+
+    def items():
+        for index in range(1000):
+            ahead.append(index - finished[0])
+            yield str(index), 'accept'
+
+    monkeypatch.setattr(AsyncTolokaProjectHandler, 'review_assignment', review_assignment)
+    results = run(make_handler(server).review_assignments(items(), max_workers=4))
+    assert results == [str(index) for index in range(1000)]
+    assert peak[0] == 4
+    # An item is taken only when one of the four workers is free
+    assert max(ahead) <= 4
+
+
+def test_unknown_action_is_a_value_error(server):
+    async def scenario():
+        async with make_handler(server) as handler:
+            with pytest.raises(ValueError):
+                await handler.review_assignment('1', 'approve')
+            return await handler.review_assignments([('1', 'approve')])
+
+    [result] = run(scenario())
+    assert result.status == FAILED
+    assert 'approve' in result.error
+
+
+def test_download_attachment_renames_a_complete_file(server, tmp_path):
+    async def scenario():
+        async with make_handler(server) as handler:
+            pool_id = await completed_pool(handler, 1)
+            attachment = [item async for item in handler.iter_attachments(pool_id)][0]
+            path = str(tmp_path / 'photo.jpg')
+            size = await handler.download_attachment(attachment['id'], path, chunk_size=256)
+            repeated = await handler.download_attachment(attachment['id'], path)
+            return attachment['id'], path, size, repeated
+
+    attachment_id, path, size, repeated = run(scenario())
+    data = server.toloka.attachment_data[attachment_id]
+    with open(path, 'rb') as file:
+        assert file.read() == data
+    assert size == len(data)
+    assert repeated == 0
+    assert os.listdir(tmp_path) == ['photo.jpg']
+
+
+def test_failed_download_leaves_no_file(server, tmp_path):
+    async def scenario():
+        async with make_handler(server, max_retries=0) as handler:
+            await handler.download_attachment('missing', str(tmp_path / 'photo.jpg'))
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        run(scenario())
+    assert os.listdir(tmp_path) == []
+
+
+def test_the_limiter_of_the_token_is_shared_with_sync_handlers(server):
+    assert AsyncTolokaProjectHandler('shared', api_url=server.url).limiter is shared_limiter('shared')
+
+    async def scenario(handler, project_id):
+        async with handler:
+            return await asyncio.gather(*(handler.get_project(project_id) for _ in range(30)))
+
+    _, project = server.toloka.create_project({'public_name': 'Limited'})
+    limiter = RateLimiter({READ: {'requests_per_second': 50, 'burst': 10}})
+    started = time.monotonic()
+    projects = run(scenario(make_handler(server, rate_limiter=limiter), project['id']))
+    assert len(projects) == 30
+    assert time.monotonic() - started >= 0.35
+    assert limiter.snapshot()[READ]['in_flight'] == 0
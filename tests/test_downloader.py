@@ -0,0 +1,52 @@
+import os
+
+from autotoloka.downloader import AttachmentDownloader, DOWNLOADED, SKIPPED, MANIFEST_NAME
+
+
+def downloads(handler):
+    requests = handler.metrics.snapshot()['requests'].get('GET attachments/{id}/download', {})
+    return sum(counts['count'] for counts in requests.values())
+
+
+def attachment_jobs(handler, pool_id):
+    return [(attachment['id'], f'{index}.jpg')
+            for index, attachment in enumerate(handler.iter_attachments(pool_id))]
+
+
+def test_download_streams_every_attachment(handler, completed_pool, server, tmp_path):
+    jobs = attachment_jobs(handler, completed_pool(6)) + [('missing', 'missing.jpg')]
+    report = AttachmentDownloader(handler.session, max_workers=3).download(jobs, str(tmp_path), progress=False)
+    assert (report.downloaded, report.failed) == (6, 1)
+    for attachment_id, file_name in jobs[:-1]:
+        with open(tmp_path / file_name, 'rb') as file:
+            assert file.read() == server.toloka.attachment_data[attachment_id]
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST_NAME] + [name for _, name in jobs[:-1]])
+
+
+def test_download_resumes_by_attachment_id(handler, completed_pool, tmp_path):
+    jobs = attachment_jobs(handler, completed_pool(5))
+    downloader = AttachmentDownloader(handler.session, max_workers=2)
+    downloader.download(jobs[:3], str(tmp_path), progress=False)
+    report = downloader.download(jobs, str(tmp_path), progress=False)
+    statuses = {result.attachment_id: result.status for result in report.results}
+    assert [statuses[attachment_id] for attachment_id, _ in jobs] == [SKIPPED] * 3 + [DOWNLOADED] * 2
+    assert downloads(handler) == 5
+
+    # A file of the same name from another attachment is not taken for a downloaded one
+    report = downloader.download([(jobs[4][0], jobs[0][1])], str(tmp_path), progress=False)
+    assert [result.status for result in report.results] == [DOWNLOADED]
+    with open(tmp_path / jobs[0][1], 'rb') as replaced, open(tmp_path / jobs[4][1], 'rb') as original:
+        assert replaced.read() == original.read()
+
+
+def test_collect_files_checks_and_reviews_every_image(handler, completed_pool, server, tmp_path):
+    # Some of the simulated workers upload an image of an earlier one
+    pool_id = completed_pool(40)
+    photo_data, reviews = handler.collect_files_from_pool(pool_id, str(tmp_path / 'photos'), max_workers=4,
+                                                          progress=False)
+    duplicates = {key for key, item in photo_data.items() if item['is_duplicate']}
+    statuses = {key: server.toloka.assignments[key]['status'] for key in photo_data}
+    assert len(reviews) == 40
+    assert duplicates
+    assert {key for key, status in statuses.items() if status == 'REJECTED'} == duplicates
+    assert len([name for name in os.listdir(tmp_path / 'photos') if name != MANIFEST_NAME]) == 40 - len(duplicates)
@@ -0,0 +1,94 @@
+import json
+
+import pandas as pd
+import pytest
+
+from autotoloka.export import AssignmentExporter, default_cursor_field
+from autotoloka.watcher import PoolWatcher
+
+
+def add_tasks(handler, pool_id, number_of_tasks):
+    handler.upload_task_suites(pool_id, [{'product_title': f'more-{i}'} for i in range(number_of_tasks)],
+                               tasks_on_suite=1)
+    # open_close_pool leaves completed pools closed
+    handler.session.post(f'pools/{pool_id}/open').raise_for_status()
+    PoolWatcher(handler, pool_id, min_interval=0.01, max_interval=0.05).watch()
+
+
+def test_dataframe_is_typed_by_the_task_spec(handler, completed_pool):
+    pool_id = completed_pool(7)
+    frame = handler.export_answers(pool_id, chunk_size=3)
+    assert len(frame) == 7
+    assert frame['assignment_id'].is_unique
+    assert str(frame['OUTPUT:no_image'].dtype) == 'boolean'
+    assert str(frame['task_index'].dtype) == 'Int64'
+    assert pd.api.types.is_datetime64_any_dtype(frame['submitted'])
+    assert set(frame['INPUT:product_title']) == {f'title-{i}' for i in range(7)}
+    assert frame['OUTPUT:image'].notna().all()
+
+
+def test_parquet_export_continues_from_the_last_assignment(handler, completed_pool, tmp_path):
+    pool_id = completed_pool(5)
+    path = str(tmp_path / 'answers')
+    first = handler.export_answers(pool_id, path=path, chunk_size=2)
+    assert (first.assignments, first.rows) == (5, 5)
+    assert handler.export_answers(pool_id, path=path).file is None
+
+    add_tasks(handler, pool_id, 3)
+    second = handler.export_answers(pool_id, path=path)
+    assert second.assignments == 3
+    frame = pd.read_parquet(path)
+    assert len(frame) == 8
+    assert frame['assignment_id'].is_unique
+    with open(tmp_path / 'answers' / '_export_state.json') as file:
+        state = json.load(file)
+    assert state['parts'] == ['part-00000.parquet', 'part-00001.parquet']
+    assert state['cursor_field'] == 'id'
+
+
+def test_status_export_picks_up_later_reviews(handler, completed_pool, tmp_path):
+    pool_id = completed_pool(6)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    path = str(tmp_path / 'accepted')
+    handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids[3:]])
+    assert handler.export_answers(pool_id, path=path, status='ACCEPTED').assignments == 3
+    handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids[:3]])
+    assert handler.export_answers(pool_id, path=path, status='ACCEPTED').assignments == 3
+    assert sorted(pd.read_parquet(path)['assignment_id']) == ids
+
+
+def test_equal_status_times_at_page_and_run_boundaries_are_exported(handler, completed_pool, server, tmp_path):
+    pool_id = completed_pool(30)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    path = str(tmp_path / 'accepted')
+
+    def accept(assignment_ids, times):
+        handler.review_assignments([(assignment_id, 'accept') for assignment_id in assignment_ids])
+        for assignment_id, second in zip(assignment_ids, times):
+            server.toloka.assignments[assignment_id]['accepted'] = f'2026-01-01T00:00:{second:02d}.000'
+
+    # The second export starts inside the last run of equal times of the first one, with smaller IDs among them
+    accept(ids[1::2], [0] * 6 + [1] * 9)
+    first = AssignmentExporter(handler, pool_id, status='ACCEPTED', page_size=4).to_parquet(path)
+    accept(ids[0::2], [1] * 5 + [2] * 10)
+    second = AssignmentExporter(handler, pool_id, status='ACCEPTED', page_size=4).to_parquet(path)
+    assert (first.assignments, second.assignments) == (15, 15)
+    assert sorted(pd.read_parquet(path)['assignment_id']) == ids
+
+
+def test_incremental_status_export_by_id_is_rejected(handler, completed_pool, tmp_path):
+    pool_id = completed_pool(1)
+    with pytest.raises(ValueError):
+        handler.export_answers(pool_id, path=str(tmp_path / 'answers'), status='ACCEPTED', cursor_field='id')
+    handler.export_answers(pool_id, path=str(tmp_path / 'answers'))
+    with pytest.raises(ValueError):
+        AssignmentExporter(handler, pool_id, cursor_field='submitted').to_parquet(str(tmp_path / 'answers'))
+
+
+def test_default_cursor_field():
+    assert default_cursor_field() == 'id'
+    assert default_cursor_field('ACCEPTED') == 'accepted'
+    assert default_cursor_field(['REJECTED']) == 'rejected'
+    assert default_cursor_field(['SUBMITTED', 'ACCEPTED', 'REJECTED']) == 'submitted'
+    assert default_cursor_field(['ACCEPTED', 'REJECTED']) is None
+    assert default_cursor_field(['ACTIVE']) is None
@@ -0,0 +1,86 @@
+import threading
+
+from autotoloka.hash_index import HashIndex, BKTree, hamming_distance
+
+
+def test_bk_tree_finds_everything_within_the_radius():
+    values = [0b0, 0b1, 0b11, 0b111, 0b1111000, 2 ** 63 + 1]
+    tree = BKTree()
+    for value in values:
+        tree.add(value, value)
+    for query in (0, 0b101, 2 ** 63):
+        found = sorted(key for _, key in tree.query(query, 2))
+        assert found == sorted(value for value in values if hamming_distance(value, query) <= 2)
+
+
+def test_check_reports_near_duplicates_once():
+    with HashIndex() as index:
+        assert index.check('a', 0b1111, 'first.jpg') is None
+        assert index.check('b', 0b0111, 'second.jpg', max_distance=1) == 'first.jpg'
+        assert index.check('c', 2 ** 40, 'third.jpg', max_distance=1) is None
+        # The same content checked again from its own source is not a duplicate of itself
+        assert index.check('a', 0b1111, 'first.jpg') is None
+        assert index.check('a', 0b1111, 'copy.jpg') == 'first.jpg'
+        assert len(index) == 2
+
+
+def test_index_persists_and_loads_the_tree_lazily(tmp_path):
+    path = str(tmp_path / 'hashes.sqlite')
+    with HashIndex(path) as index:
+        for number in range(50):
+            index.add(f'digest-{number}', number << 20, f'{number}.jpg')
+    with HashIndex(path) as index:
+        assert len(index) == 50
+        assert index.check('digest-7', 7 << 20, 'other.jpg') == '7.jpg'
+        assert index._tree is None
+        assert index.find((7 << 20) | 1, max_distance=1) == [(1, 'digest-7', '7.jpg')]
+        assert index._tree is not None
+        index.add('digest-new', 2 ** 62, 'new.jpg')
+        assert index.find(2 ** 62, max_distance=0) == [(0, 'digest-new', 'new.jpg')]
+
+
+def test_repeated_digest_is_ignored(tmp_path):
+    path = str(tmp_path / 'hashes.sqlite')
+    with HashIndex(path) as first, HashIndex(path) as second:
+        first.add('same', 1, 'first.jpg')
+        first.commit()
+        second.add('same', 1, 'second.jpg')
+        second.commit()
+        assert len(second) == 1
+
+
+def test_shared_index_sees_images_of_other_threads():
+    index = HashIndex()
+    results = []
+    threads = [threading.Thread(target=lambda number=number: results.append(index.check(f'd{number}', 12345,
+                                                                                       f'{number}.jpg')))
+               for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(None) == 1
+    assert len(index) == 1
+    index.close()
+
+
+def test_check_folder_encodes_only_new_content(tmp_path):
+    encoded = []
+
+    def encoder(path):
+        encoded.append(path)
+        with open(path, 'rb') as file:
+            return int.from_bytes(file.read()[:8].ljust(8, b'\0'), 'big')
+
+    (tmp_path / 'a.jpg').write_bytes(b'\x00' * 8)
+    (tmp_path / 'b.jpg').write_bytes(b'\x00' * 8)
+    (tmp_path / 'c.png').write_bytes(b'\xff' * 8)
+    (tmp_path / 'notes.txt').write_bytes(b'\x00' * 8)
+    with HashIndex(str(tmp_path / 'hashes.sqlite'), encoder=encoder) as index:
+        assert index.check_folder(str(tmp_path)) == {'b.jpg': str(tmp_path / 'a.jpg')}
+        assert len(encoded) == 2
+    (tmp_path / 'd.jpg').write_bytes(b'\xff' * 7 + b'\xfe')
+    with HashIndex(str(tmp_path / 'hashes.sqlite'), encoder=encoder) as index:
+        duplicates = index.check_folder(str(tmp_path))
+    assert duplicates == {'b.jpg': str(tmp_path / 'a.jpg'), 'd.jpg': str(tmp_path / 'c.png')}
+    assert len(encoded) == 3
@@ -0,0 +1,141 @@
+import functools
+import os
+
+from autotoloka import pipeline
+from autotoloka.downloader import DownloadResult, DOWNLOADED, DUPLICATE, FAILED, SKIPPED
+from autotoloka.journal import RunJournal
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.review import ReviewResult, OK, ALREADY_PROCESSED
+
+
+def downloads(handler):
+    requests = handler.metrics.snapshot()['requests'].get('GET attachments/{id}/download', {})
+    return sum(counts['count'] for counts in requests.values())
+
+
+def test_steps_run_once_across_runs(tmp_path):
+    path = str(tmp_path / 'run.sqlite')
+    calls = []
+    with RunJournal(path) as journal:
+        assert journal.once('pool', lambda: calls.append(1) or {'id': '12'}) == {'id': '12'}
+        journal.set('project_id', 7)
+    with RunJournal(path) as journal:
+        assert journal.once('pool', lambda: calls.append(2) or {'id': '13'}) == {'id': '12'}
+        assert journal.get('project_id') == 7
+        assert journal.get('collected') is None
+    assert calls == [1]
+
+
+def test_failed_steps_are_repeated(tmp_path):
+    def fail():
+        raise RuntimeError('interrupted')
+
+    with RunJournal(str(tmp_path / 'run.sqlite')) as journal:
+        try:
+            journal.once('upload', fail)
+        except RuntimeError:
+            pass
+        assert journal.once('upload', lambda: 'done') == 'done'
+
+
+def test_only_finished_work_is_recorded(tmp_path):
+    path = str(tmp_path / 'run.sqlite')
+    with RunJournal(path) as journal:
+        journal.record_download(DownloadResult('a1', '1.jpg', DOWNLOADED, 10, None))
+        journal.record_download(DownloadResult('a2', '2.jpg', DUPLICATE, 10, None, '/photos/1.jpg'))
+        journal.record_download(DownloadResult('a3', '3.jpg', FAILED, 0, 'timeout'))
+        journal.record_review(ReviewResult('r1', 'accept', OK, 200, None))
+        journal.record_review(ReviewResult('r2', 'reject', ALREADY_PROCESSED, 409, {}))
+        journal.record_review(ReviewResult('r3', 'accept', 'failed', 500, {}))
+    with RunJournal(path) as journal:
+        assert journal.counts() == {'steps': 0, 'downloads': 2, 'reviews': 2}
+        assert journal.download_result('a1').status == SKIPPED
+        assert journal.download_result('a2').duplicate_of == '/photos/1.jpg'
+        assert journal.download_result('a3') is None
+        assert journal.review_result('r2').action == 'reject'
+        assert journal.review_result('r1', 'accept').status == OK
+        assert journal.review_result('r1', 'reject') is None
+        assert journal.review_result('r3') is None
+
+
+def test_journal_skips_recorded_reviews(handler, completed_pool, server):
+    pool_id = completed_pool(5)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    handler.journal = RunJournal()
+    first = handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids])
+    requests_before = server.requests
+    second = handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids])
+    assert {result.status for result in first} == {OK}
+    assert {result.status for result in second} == {OK}
+    assert server.requests == requests_before
+    assert handler.journal.counts()['reviews'] == 5
+
+
+def test_journal_resumes_an_interrupted_collection(handler, completed_pool, server, tmp_path):
+    pool_id = completed_pool(8)
+    handler.journal = RunJournal(str(tmp_path / 'run.sqlite'))
+    folder = str(tmp_path / 'photos')
+    first_data, first_reviews = handler.collect_files_from_pool(pool_id, folder, progress=False,
+                                                                hash_index_path=str(tmp_path / 'hashes.sqlite'))
+    requests_before = downloads(handler)
+    handler.journal.close()
+    handler.journal = RunJournal(str(tmp_path / 'run.sqlite'))
+    second_data, second_reviews = handler.collect_files_from_pool(pool_id, folder, progress=False,
+                                                                  hash_index_path=str(tmp_path / 'hashes.sqlite'))
+    assert downloads(handler) == requests_before
+    assert second_data == first_data
+    assert sorted(result.assignment_id for result in second_reviews) == \
+           sorted(result.assignment_id for result in first_reviews)
+    assert {result.status for result in second_reviews} <= {OK, ALREADY_PROCESSED}
+    patches = handler.metrics.snapshot()['requests']['PATCH assignments/{id}']
+    assert sum(counts['count'] for counts in patches.values()) == len(first_reviews)
+
+
+def test_a_changed_decision_is_sent(handler, completed_pool):
+    pool_id = completed_pool(2)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    handler.journal = RunJournal()
+    handler.review_assignments([(assignment_id, 'accept') for assignment_id in ids])
+    results = {result.assignment_id: result
+               for result in handler.review_assignments([(ids[0], 'reject', 'Blurry'), (ids[1], 'accept')])}
+    assert (results[ids[0]].status, results[ids[0]].status_code) == (ALREADY_PROCESSED, 409)
+    assert (results[ids[1]].status, results[ids[1]].status_code) == (OK, None)
+
+
+def test_resumed_check_keeps_the_deleted_duplicates(handler, completed_pool, server, tmp_path):
+    # Some of the simulated workers upload an image of an earlier one
+    pool_id = completed_pool(40)
+    path, folder = str(tmp_path / 'run.sqlite'), str(tmp_path / 'photos')
+    reviews = []
+    for _ in range(2):
+        handler.journal = RunJournal(path)
+        photo_data = handler.get_files_from_pool(pool_id, folder)
+        reviews.append(handler.check_photos_for_duplicates(folder, reject_duplicates=True, accept_uniques=True,
+                                                           photo_data=photo_data))
+        handler.journal.close()
+        if len(reviews) == 1:
+            requests_before = downloads(handler)
+    rejected = {result.assignment_id for result in reviews[0] if result.action == 'reject'}
+    assert rejected
+    assert downloads(handler) == requests_before
+    assert {result.assignment_id for result in reviews[1] if result.action == 'reject'} == rejected
+    assert {key for key, item in server.toloka.assignments.items() if item['status'] == 'REJECTED'} == rejected
+
+
+def test_pipeline_completes_an_interrupted_upload_and_closes_the_journal(handler, server, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, 'TolokaProjectHandler',
+                        functools.partial(TolokaProjectHandler, api_url=server.url, rate_limiter=False))
+    path = str(tmp_path / 'run.sqlite')
+    pool_id = handler.create_toloka_pool(private_name='Interrupted')
+    handler.create_task_suite(pool_id, [{'product_title': 'Photo', 'description': 'Any'}] * 2, tasks_on_suite=1)
+    with RunJournal(path) as journal:
+        journal.set('project_id', handler.project_id)
+        journal.set('pool_id', pool_id)
+
+    pipeline.pipeline_for_collecting_images(oauth_token='token', number_of_images=6, journal_path=path,
+                                            check_for_duplicates=False)
+    assert len(list(handler.iter_task_suites(pool_id))) == 6
+    assert not os.path.exists(f'{path}-wal')
+    pipeline.pipeline_for_collecting_images(oauth_token='token', journal_path=path)
+    assert not os.path.exists(f'{path}-wal')
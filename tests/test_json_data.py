@@ -0,0 +1,25 @@
+import json
+import os
+
+from autotoloka.json_data import ConfigRegistry, json_data
+
+
+def test_templates_are_plain_independent_dicts():
+    config = json_data['collecting_images']
+    assert type(config) is dict
+    assert json.loads(json.dumps(config)) == config
+    config['public_name'] = 'Changed'
+    config['task_spec']['input_spec'].clear()
+    assert json_data['collecting_images']['public_name'] != 'Changed'
+    assert json_data['collecting_images']['task_spec']['input_spec']
+
+
+def test_templates_are_parsed_once_until_changed(tmp_path):
+    path = tmp_path / 'template.json'
+    path.write_text('{"name": "first"}')
+    registry = ConfigRegistry([tmp_path])
+    assert registry.load('template') is registry.load('template')
+    path.write_text('{"name": "second"}')
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+    assert registry['template'] == {'name': 'second'}
+    assert 'template' in registry and 'missing' not in registry
@@ -0,0 +1,17 @@
+import logging
+
+from autotoloka import log
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.log import configure_logging, LOGGER_NAME
+
+
+def test_handlers_leave_the_configured_level_alone(server, monkeypatch):
+    logger = logging.getLogger(LOGGER_NAME)
+    monkeypatch.setattr(logger, 'handlers', [])
+    monkeypatch.setattr(logger, 'level', logger.level)
+    monkeypatch.setattr(log, '_configured', False)
+    configure_logging(verbose=True, force=True)
+    for verbose in (True, False):
+        TolokaProjectHandler('token', project_id=0, api_url=server.url, verbose=verbose,
+                             rate_limiter=False).session.close()
+    assert logger.level == logging.DEBUG
@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from autotoloka import orchestrator as orchestrator_module
+from autotoloka.downloader import MANIFEST_NAME
+from autotoloka.hash_index import HashIndex
+from autotoloka.orchestrator import CollectionOrchestrator, Campaign, DONE, FAILED
+
+
+def test_campaigns_share_the_hash_index(handler, server, tmp_path):
+    index_path = str(tmp_path / 'hashes.sqlite')
+    # The simulated workers of both pools upload the same images
+    campaigns = [Campaign(f'Campaign {number}', handler.project_id,
+                          [{'product_title': f'{number}-{i}'} for i in range(10)],
+                          str(tmp_path / f'photos-{number}'), hash_index_path=index_path) for number in range(2)]
+    campaigns.append(Campaign('Missing project', 'missing', [{'product_title': 'x'}], str(tmp_path / 'missing')))
+    orchestrator = CollectionOrchestrator('token', api_url=server.url, min_interval=0.01, max_interval=0.05)
+    states = orchestrator.run(campaigns)
+
+    assert [state.stage for state in states] == [DONE, DONE, FAILED]
+    assert orchestrator.hash_indexes == {}
+    downloaded = sum(state.downloaded for state in states[:2])
+    assert downloaded + sum(state.duplicates for state in states[:2]) == 20
+    assert states[0].duplicates + states[1].duplicates >= 10
+    with HashIndex(index_path) as index:
+        assert len(index) == downloaded
+    assert all(state.reviewed == 10 for state in states[:2])
+
+
+class LosingAttachments(dict):
+    """
+    Attachment data of the fake API which loses the first images, so that their downloads fail
+    """
+    def __init__(self, lost):
+        super().__init__()
+        self.lost = lost
+
+    def __setitem__(self, key, value):
+        if self.lost:
+            self.lost -= 1
+            return
+        super().__setitem__(key, value)
+
+
+def test_failed_downloads_are_not_counted_as_downloaded(handler, server, tmp_path):
+    server.toloka.attachment_data = LosingAttachments(3)
+    folder = tmp_path / 'photos'
+    campaign = Campaign('Lossy', handler.project_id, [{'product_title': str(i)} for i in range(10)], str(folder))
+    orchestrator = CollectionOrchestrator('token', api_url=server.url, min_interval=0.01, max_interval=0.05)
+    [state] = orchestrator.run([campaign])
+    assert state.stage == DONE
+    assert state.downloaded + state.duplicates == 7
+    assert state.downloaded == len([name for name in os.listdir(folder) if name != MANIFEST_NAME])
+
+
+def test_concurrent_stages_share_one_handler_per_project(server, monkeypatch):
+    def slow_handler(*args, **kwargs):
+        time.sleep(0.01)
+        return object()
+
+    monkeypatch.setattr(orchestrator_module, 'TolokaProjectHandler', slow_handler)
+    orchestrator = CollectionOrchestrator('token', api_url=server.url)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        handlers = list(executor.map(orchestrator.handler_for, ['1'] * 16 + ['2'] * 16))
+    assert len({id(handler) for handler in handlers[:16]}) == 1
+    assert len({id(handler) for handler in handlers[16:]}) == 1
+    assert set(orchestrator.handlers) == {'1', '2'}
@@ -0,0 +1,44 @@
+import pytest
+
+from autotoloka.pagination import iter_items
+
+
+def test_iter_items_follows_the_cursor_page_by_page(handler, server):
+    pool_id = handler.create_toloka_pool(private_name='Pagination')
+    handler.upload_task_suites(pool_id, [{'product_title': str(i)} for i in range(25)], tasks_on_suite=1)
+    requests_before = server.requests
+    suites = list(iter_items(handler.session, 'task-suites', {'pool_id': pool_id}, page_size=10))
+    ids = [suite['id'] for suite in suites]
+    assert len(ids) == 25
+    assert ids == sorted(set(ids))
+    assert server.requests - requests_before == 3
+
+
+def test_prefetch_yields_the_same_items(handler, completed_pool):
+    pool_id = completed_pool(12)
+    plain = [item['id'] for item in handler.iter_assignments(pool_id, page_size=5)]
+    prefetched = [item['id'] for item in handler.iter_assignments(pool_id, page_size=5, prefetch=True)]
+    assert len(plain) == 12
+    assert prefetched == plain
+
+
+def test_filters_and_status_lists_are_sent(handler, completed_pool):
+    pool_id = completed_pool(6)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    handler.review_assignments([(ids[0], 'accept'), (ids[1], 'reject', 'Blurry')])
+    assert [item['id'] for item in handler.iter_assignments(pool_id, status='ACCEPTED')] == ids[:1]
+    reviewed = handler.iter_assignments(pool_id, status=['ACCEPTED', 'REJECTED'], page_size=1)
+    assert sorted(item['id'] for item in reviewed) == ids[:2]
+    assert [item['id'] for item in handler.iter_assignments(pool_id, id_gt=ids[3])] == ids[4:]
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_cursor_on_a_non_unique_field_loses_no_items(handler, completed_pool, server, prefetch):
+    pool_id = completed_pool(60)
+    # Runs of equal times longer and shorter than a page, so that pages end inside them
+    times = [0] * 4 + [1] * 17 + [2] * 3 + [3] * 30 + [4] * 6
+    for assignment, second in zip(sorted(server.toloka.assignments.values(), key=lambda item: item['id']), times):
+        assignment['submitted'] = f'2026-01-01T00:00:{second:02d}.000'
+    items = list(handler.iter_assignments(pool_id, page_size=7, prefetch=prefetch, cursor_field='submitted'))
+    assert len(items) == 60
+    assert [item['id'] for item in items] == sorted(server.toloka.assignments)
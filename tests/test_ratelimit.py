@@ -0,0 +1,9 @@
+from autotoloka.ratelimit import RateLimiter, READ, WRITE, DOWNLOAD
+
+
+def test_rates_are_limited_only_when_asked():
+    limiter = RateLimiter({WRITE: {'requests_per_second': 20}})
+    assert limiter.budgets[READ].bucket is None
+    assert limiter.budgets[DOWNLOAD].bucket is None
+    assert limiter.budgets[WRITE].bucket.rate == 20
+    assert limiter.max_concurrency(READ) == 64
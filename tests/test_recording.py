@@ -0,0 +1,38 @@
+import pytest
+
+from autotoloka.handler import TolokaProjectHandler
+from autotoloka.recording import RecordingSession, ReplaySession
+from autotoloka.review import OK
+
+
+def read_pool(handler, pool_id):
+    suites = [suite['id'] for suite in handler.iter_task_suites(pool_id, page_size=2)]
+    assignment = next(handler.iter_assignments(pool_id))
+    image = handler.session.get(f'attachments/{assignment["solutions"][0]["output_values"]["image"]}/download')
+    review = handler.process_task(assignment['id'], 'accept')
+    return suites, image.content, review.status
+
+
+def test_replay_answers_like_the_recorded_server(handler, completed_pool, server, tmp_path):
+    pool_id = completed_pool(5)
+    record_path = str(tmp_path / 'session.jsonl')
+    recording = RecordingSession(server.url, record_path)
+    recorded = read_pool(TolokaProjectHandler('token', project_id=handler.project_id, api_url=server.url,
+                                              verbose=False, session=recording), pool_id)
+    recording.close()
+    server.stop()
+
+    replay = ReplaySession(record_path, base_url=server.url)
+    replayed = read_pool(TolokaProjectHandler('token', project_id=handler.project_id, api_url=server.url,
+                                              verbose=False, session=replay), pool_id)
+    assert replayed == recorded
+    assert len(recorded[0]) == 5
+    assert recorded[2] == OK
+
+
+def test_unrecorded_requests(tmp_path):
+    record_path = tmp_path / 'empty.jsonl'
+    record_path.write_text('')
+    with pytest.raises(KeyError):
+        ReplaySession(str(record_path)).get('pools/1')
+    assert ReplaySession(str(record_path), strict=False).get('pools/1').status_code == 404
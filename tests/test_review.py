@@ -0,0 +1,25 @@
+from autotoloka.review import OK, ALREADY_PROCESSED, FAILED
+
+
+def test_bulk_review_reports_every_assignment(handler, completed_pool, server):
+    pool_id = completed_pool(10)
+    ids = [item['id'] for item in handler.iter_assignments(pool_id)]
+    items = [(assignment_id, 'accept') for assignment_id in ids[:6]] + \
+            [(assignment_id, 'reject', 'Not a photo') for assignment_id in ids[6:]] + [('missing', 'accept')]
+    results = {result.assignment_id: result for result in handler.review_assignments(items, max_workers=4)}
+    assert len(results) == 11
+    assert all(results[assignment_id].status == OK for assignment_id in ids)
+    assert results['missing'].status == FAILED
+    assert results['missing'].status_code == 404
+    statuses = {item['id']: item['status'] for item in server.toloka.assignments.values()}
+    assert [statuses[assignment_id] for assignment_id in ids] == ['ACCEPTED'] * 6 + ['REJECTED'] * 4
+    assert server.toloka.assignments[ids[6]]['public_comment'] == 'Not a photo'
+
+
+def test_processed_assignments_are_not_failures(handler, completed_pool):
+    pool_id = completed_pool(4)
+    results = handler.process_all_tasks(pool_id, 'accept')
+    assert [result.status for result in results] == [OK] * 4
+    again = handler.review_assignments([(result.assignment_id, 'reject') for result in results])
+    assert {result.status for result in again} == {ALREADY_PROCESSED}
+    assert {result.status_code for result in again} == {409}
@@ -0,0 +1,49 @@
+from autotoloka.create_pool import PoolCreator
+from autotoloka.sync import ConfigSync, diff_config, CREATE, UPDATE, UNCHANGED, OK
+
+
+def writes(handler):
+    requests = handler.metrics.snapshot()['requests']
+    return sum(counts['count'] for endpoint, statuses in requests.items()
+               if endpoint.split()[0] in ('POST', 'PUT') for counts in statuses.values())
+
+
+def test_diff_normalizes_values_the_api_rewrites():
+    current = {'id': '5', 'project_id': '12', 'will_expire': '2030-01-01T13:00:00.000', 'reward_per_assignment': 1,
+               'defaults': {'default_overlap_for_new_task_suites': 3, 'default_overlap_for_new_tasks': 3}}
+    desired = {'id': 6, 'project_id': 12, 'will_expire': '2030-01-01T13:00', 'reward_per_assignment': 1.0,
+               'defaults': {'default_overlap_for_new_task_suites': 5}}
+    changes = diff_config(desired, current)
+    assert [(change.path, change.old, change.new) for change in changes] == \
+           [('defaults.default_overlap_for_new_task_suites', 3, 5)]
+
+
+def test_sync_sends_only_the_needed_requests(handler):
+    sync = ConfigSync(handler, max_workers=4)
+    pools = [PoolCreator(handler.project_id, private_name=f'Pool {number}') for number in range(3)]
+    plan, results = sync.sync(pools=pools)
+    assert [action.kind for action in plan.actions] == [CREATE] * 3
+    assert {result.status for result in results} == {OK}
+
+    before = writes(handler)
+    plan, results = sync.sync(pools=pools)
+    assert [action.kind for action in plan.actions] == [UNCHANGED] * 3
+    assert results == []
+    assert writes(handler) == before
+
+    changed = dict(pools[1].pool, reward_per_assignment=0.05)
+    plan, results = sync.sync(pools=[pools[0], changed])
+    assert [action.kind for action in plan.actions] == [UNCHANGED, UPDATE]
+    assert [change.path for change in plan.actions[1].changes] == ['reward_per_assignment']
+    assert writes(handler) == before + 1
+    assert handler.get_pool(results[0].object_id)['reward_per_assignment'] == 0.05
+
+
+def test_dry_run_changes_nothing(handler):
+    before = writes(handler)
+    project = dict(handler.get_project(handler.project_id), public_description='New description')
+    plan, results = ConfigSync(handler).sync(project=project, pools=[{'private_name': 'New pool'}], dry_run=True)
+    assert [action.kind for action in plan.actions] == [UPDATE, CREATE]
+    assert 'public_description' in plan.describe()
+    assert results == []
+    assert writes(handler) == before
@@ -0,0 +1,41 @@
+from autotoloka.watcher import PoolWatcher
+
+
+def test_watcher_yields_every_submission_once(handler):
+    pool_id = handler.create_toloka_pool(private_name='Watched')
+    handler.upload_task_suites(pool_id, [{'product_title': str(i)} for i in range(6)], tasks_on_suite=1)
+    handler.open_close_pool(pool_id)
+    watcher = PoolWatcher(handler, pool_id, min_interval=0.01, max_interval=0.05)
+    submitted = [assignment['id'] for assignment in watcher.iter_submissions()]
+    assert len(submitted) == len(set(submitted)) == 6
+    assert watcher.finished
+    assert watcher.submitted == 6
+
+
+def test_counts_follow_the_reviews(handler, completed_pool):
+    pool_id = completed_pool(5)
+    watcher = PoolWatcher(handler, pool_id)
+    watcher.poll()
+    ids = sorted(watcher.statuses)
+    handler.review_assignments([(ids[0], 'accept'), (ids[1], 'accept'), (ids[2], 'reject', 'Blurry')])
+    assert watcher.poll() == []
+    assert dict(watcher.counts) == {'SUBMITTED': 2, 'ACCEPTED': 2, 'REJECTED': 1}
+    handler.review_assignments([(ids[2], 'accept')])
+    watcher.poll()
+    assert dict(watcher.counts) == {'SUBMITTED': 2, 'ACCEPTED': 3, 'REJECTED': 0}
+    assert watcher.submitted == 5
+
+
+def test_equal_times_at_page_boundaries_are_all_counted(handler, completed_pool, server):
+    pool_id = completed_pool(50)
+    # Runs of equal times longer and shorter than a page, so that pages end inside them
+    assignments = sorted(server.toloka.assignments.values(), key=lambda item: item['id'])
+    for index, assignment in enumerate(assignments):
+        assignment['submitted'] = f'2026-01-01T00:00:{min(index // 12, 2):02d}.000'
+    watcher = PoolWatcher(handler, pool_id, page_size=5)
+    assert len(watcher.poll()) == 50
+    handler.review_assignments([(assignment['id'], 'accept') for assignment in assignments[:33]])
+    for assignment in assignments[:33]:
+        assignment['accepted'] = '2026-01-01T00:01:00.000'
+    assert watcher.poll() == []
+    assert dict(watcher.counts) == {'SUBMITTED': 17, 'ACCEPTED': 33}